@@ -0,0 +1,87 @@
+import random
+import time
+from collections import deque
+from typing import List, Tuple
+
+from stock_market_research_kit.asset import new_empty_asset
+from stock_market_research_kit.candle import InnerCandle, candle_series, as_1_candle
+from utils.date_utils import epoch_to_date_str, to_epoch, log_info_ny
+
+# one fronttest tick asks Triad.actual_smt_psp for ~126 ranges (3 assets x SMT levels x PSP timeframes)
+CALLS_PER_TICK = 126
+# 90m, 6h, 1d, 1w, 1month and 1 year quarter lengths in 15m candles
+RANGE_LENGTHS = [6, 24, 96, 672, 2880, 8736]
+
+
+def random_candles(n: int, start: str) -> List[InnerCandle]:
+    rnd = random.Random(1)
+    price, start_epoch, res = 100.0, to_epoch(start), []
+    for i in range(n):
+        close = max(1.0, price + rnd.gauss(0, 0.6))
+        res.append((price, max(price, close) + rnd.random(), min(price, close) - rnd.random(), close,
+                    round(rnd.random() * 100, 3), epoch_to_date_str(start_epoch + i * 15 * 60)))
+        price = close
+    return res
+
+
+def tick_ranges(candles: List[InnerCandle], ticks: int) -> List[List[Tuple[str, str]]]:
+    rnd = random.Random(2)
+    last = to_epoch(candles[-1][5]) + 15 * 60
+    res = []
+    for _ in range(ticks):
+        ranges = []
+        for _ in range(CALLS_PER_TICK):
+            length = rnd.choice(RANGE_LENGTHS)
+            to = last - rnd.randrange(0, length) * 15 * 60
+            ranges.append((epoch_to_date_str(to - length * 15 * 60), epoch_to_date_str(to)))
+        res.append(ranges)
+    return res
+
+
+def legacy_range(candles: deque, from_: str, to: str) -> List[InnerCandle]:
+    first_date, from_date, to_date = to_epoch(candles[0][5]), to_epoch(from_), to_epoch(to)
+    segments_15m = (to_date - from_date) // (15 * 60)
+    first_index = (from_date - first_date) // (15 * 60)
+    return list(candles)[first_index:first_index + segments_15m]
+
+
+def bench(years: int, ticks: int):
+    candles = random_candles(years * 365 * 96, "2023-09-01 00:00")
+    ranges = tick_ranges(candles, ticks)
+
+    legacy = deque(candles)
+    asset = new_empty_asset("BENCH")
+    asset.candles_15m = candle_series(candles)
+
+    started = time.perf_counter()
+    legacy_len = sum(len(legacy_range(legacy, f, t)) for tick in ranges for f, t in tick)
+    legacy_took = (time.perf_counter() - started) / ticks
+
+    started = time.perf_counter()
+    view_len = sum(len(asset.get_15m_candles_range(f, t)) for tick in ranges for f, t in tick)
+    view_took = (time.perf_counter() - started) / ticks
+    assert legacy_len == view_len
+
+    # calculate_psps folds every previous-candle range with as_1_candle
+    started = time.perf_counter()
+    legacy_candles = [as_1_candle(legacy_range(legacy, f, t)) for tick in ranges for f, t in tick]
+    legacy_as_1_took = (time.perf_counter() - started) / ticks
+
+    started = time.perf_counter()
+    view_candles = [as_1_candle(asset.get_15m_candles_range(f, t)) for tick in ranges for f, t in tick]
+    view_as_1_took = (time.perf_counter() - started) / ticks
+    assert legacy_candles == view_candles
+
+    log_info_ny(f"{len(candles)} candles, {CALLS_PER_TICK} ranges per tick, ms/tick: "
+                f"range list(deque) {legacy_took * 1000:.3f}, CandleSeries view {view_took * 1000:.3f} "
+                f"({legacy_took / view_took:.0f}x); "
+                f"range + as_1_candle list(deque) {legacy_as_1_took * 1000:.3f}, "
+                f"CandleSeries view {view_as_1_took * 1000:.3f} ({legacy_as_1_took / view_as_1_took:.0f}x)")
+
+
+if __name__ == "__main__":
+    try:
+        bench(2, 50)
+    except KeyboardInterrupt:
+        print(f"KeyboardInterrupt, exiting ...")
+        quit(0)
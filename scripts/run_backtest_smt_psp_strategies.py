@@ -1,20 +1,44 @@
+import argparse
+import json
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timedelta
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Optional, TypeAlias, Iterable
 
-from scripts.run_smt_psp_fronttester import fronttest
-from stock_market_research_kit.asset import Candles15mGenerator, TriadCandles15mGenerator
+from scripts.run_smt_psp_fronttester import fronttest, replay
+from stock_market_research_kit.asset import TriadCandles15mGenerator
+from stock_market_research_kit.candle import InnerCandle
 from stock_market_research_kit.db_layer import select_full_days_candles_15m, select_candles_15m
-from stock_market_research_kit.smt_psp_strategy import strategy01, \
+from stock_market_research_kit.smt_psp_strategy import SmtPspStrategy, strategy01, \
     strategy02, strategy03, \
     strategy04, strategy06, \
     strategy05, \
     strategy07, strategy17, strategy19, strategy21, strategy23, strategy25, strategy27, strategy29, strategy31, \
     strategy09, strategy11, strategy13, strategy15, strategy30, strategy32, strategy10, strategy12, strategy14, \
     strategy16, strategy18
-from stock_market_research_kit.smt_psp_trade import json_from_smt_psp_trades
-from stock_market_research_kit.triad import new_triad
-from utils.date_utils import log_warn_ny, to_utc_datetime, now_utc_datetime
+from stock_market_research_kit.smt_psp_tape import smt_psp_tape_path
+from stock_market_research_kit.smt_psp_trade import json_from_smt_psp_trades, SmtPspTrade
+from stock_market_research_kit.triad import new_triad_from_history, Triad, triad_checkpoint_path, \
+    load_triad_checkpoint, save_triad_checkpoint
+from utils.date_utils import log_warn_ny, to_utc_datetime, now_utc_datetime, log_info_ny
+
+BACKTEST_JOBS_FOLDER = "./data/backtest_jobs/"
+
+BacktestJob: TypeAlias = Tuple[  # arguments of backtest_strategies
+    int,  # year
+    str,  # from_
+    str,  # to_
+    Tuple[str, str, str]  # symbols
+]
+
+BACKTEST_JOBS: List[BacktestJob] = [  # the years and triads of scripts/test_snapshots
+    (2023, '2023-01-01 00:00', '2024-01-01 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT')),
+    (2024, '2024-01-01 00:00', '2025-01-01 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT')),
+    (2024, '2024-01-01 00:00', '2025-01-01 00:00', ('BTCUSDT', 'ETHUSDT', 'TOTAL3')),
+    (2025, '2025-01-01 00:00', '2025-09-21 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT')),
+    (2025, '2025-01-01 00:00', '2025-09-21 00:00', ('BTCUSDT', 'ETHUSDT', 'TOTAL3')),
+]
 
 
 def snapshot_file(strategy: str, year: int, symbols: List[str]) -> str:
@@ -22,18 +46,12 @@ def snapshot_file(strategy: str, year: int, symbols: List[str]) -> str:
     return f"scripts/test_snapshots/strategy_{strategy}_{year}_{smb}.json"
 
 
-def candles_generator_reverse(symbol: str, from_year: int, to_year: int, to_: str) -> Candles15mGenerator:
+def candles_history(symbol: str, from_year: int, to_year: int, to_: str) -> List[InnerCandle]:
     candles_year = select_full_days_candles_15m(from_year, symbol)
     first_candles_next = select_candles_15m(
         to_year, symbol, f'{to_year}-01-01 00:00', to_
     )
-    candles = candles_year + first_candles_next
-
-    index = len(candles) - 1
-
-    while True:
-        yield candles[index]
-        index = index - 1
+    return candles_year + first_candles_next
 
 
 def candles_generator(symbols: Tuple[str, str, str], year: int, from_: str, to_: str) -> TriadCandles15mGenerator:
@@ -68,16 +86,44 @@ def candles_generator(symbols: Tuple[str, str, str], year: int, from_: str, to_:
             index = index + 1
 
 
-def backtest_strategies(year: int, from_: str, to_: str, symbols: Tuple[str, str, str]):
-    triad = new_triad(
+def populated_triad(year: int, from_: str, symbols: Tuple[str, str, str]) -> Triad:
+    # the triad right before from_ is the same for every backtest starting there, populated once and checkpointed
+    checkpoint_path = triad_checkpoint_path(symbols, f"backtest_{from_}")
+    triad = load_triad_checkpoint(checkpoint_path, symbols)
+    if triad and triad.a1.snapshot_date_readable == from_:
+        return triad
+
+    triad = new_triad_from_history(
         symbols,
         (
-            candles_generator_reverse(symbols[0], year - 1, year, from_),
-            candles_generator_reverse(symbols[1], year - 1, year, from_),
-            candles_generator_reverse(symbols[2], year - 1, year, from_),
+            candles_history(symbols[0], year - 1, year, from_),
+            candles_history(symbols[1], year - 1, year, from_),
+            candles_history(symbols[2], year - 1, year, from_),
         )
     )
+    save_triad_checkpoint(triad, checkpoint_path)
+    return triad
+
+
+def taped_fronttest(
+        year: int, from_: str, to_: str, symbols: Tuple[str, str, str], strategies: List[SmtPspStrategy]
+) -> Dict[str, List[SmtPspTrade]]:
+    # the triad goes through the candles once, recording a tape, later runs replay it in a fraction of the time
+    tape_path = smt_psp_tape_path(symbols, from_, to_)
+    if os.path.exists(tape_path):
+        log_info_ny(f"replaying {tape_path}")
+        return replay(tape_path, strategies, to_)
+    return fronttest(
+        populated_triad(year, from_, symbols),
+        strategies,
+        candles_generator(symbols, year, from_, to_),
+        to_,
+        tape_path
+    )
+
 
+def backtest_strategies(year: int, from_: str, to_: str,
+                        symbols: Tuple[str, str, str]) -> Dict[str, List[SmtPspTrade]]:
     strategies = [
         strategy01,
         strategy02,
@@ -107,25 +153,86 @@ def backtest_strategies(year: int, from_: str, to_: str, symbols: Tuple[str, str
         strategy32,
     ]
 
-    closed_trades = fronttest(
-        triad,
-        strategies,
-        candles_generator(symbols, year, from_, to_),
-        to_
-    )
+    closed_trades = taped_fronttest(year, from_, to_, symbols, strategies)
 
     for s_name in closed_trades:
         with open(snapshot_file(s_name[0:2], year, list(symbols)), "w", encoding="utf-8") as f:
             f.write(json_from_smt_psp_trades(closed_trades[s_name]))
 
+    return closed_trades
 
-if __name__ == "__main__":
+
+def job_label(job: BacktestJob) -> str:
+    return f"{job[0]} {'-'.join(job[3])} {job[1]} - {job[2]}"
+
+
+def job_done_file(job: BacktestJob) -> str:
+    year, from_, to_, symbols = job
+    smb = '_'.join([x.replace('USDT', '').lower() for x in symbols])
+    return f"{BACKTEST_JOBS_FOLDER}job_{year}_{smb}_{from_[:10]}_{to_[:10]}.json"
+
+
+def run_backtest_job(job: BacktestJob) -> Tuple[BacktestJob, float, int, float, Optional[str]]:
+    # one (year, triad) backtest in a worker process: its own candles, its own snapshot files, then a done file
+    started = time.perf_counter()
     try:
-        # backtest_strategies(2023, '2023-01-01 00:00', '2024-01-01 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT'))
-        # backtest_strategies(2024, '2024-01-01 00:00', '2025-01-01 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT'))
-        backtest_strategies(2025, '2025-01-01 00:00', '2025-09-21 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT'))
-        print('results!')
+        closed_trades = backtest_strategies(*job)
+    except Exception as e:  # the job stays unfinished and runs again next time, the other jobs go on
+        return job, time.perf_counter() - started, 0, 0, repr(e)
+    took = time.perf_counter() - started
+
+    trades = [t for s_name in closed_trades for t in closed_trades[s_name]]
+    pnl = sum([t.pnl_usd - t.entry_position_fee - t.close_position_fee for t in trades])
+    os.makedirs(BACKTEST_JOBS_FOLDER, exist_ok=True)
+    done_file = job_done_file(job)
+    with open(f"{done_file}.tmp", "w", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "year": job[0], "from": job[1], "to": job[2], "symbols": job[3], "took": round(took, 3),
+            "trades": {s_name: len(closed_trades[s_name]) for s_name in closed_trades}
+        }, indent=2))
+    os.replace(f"{done_file}.tmp", done_file)
+    return job, took, len(trades), pnl, None
+
+
+def run_backtest_jobs(jobs: List[BacktestJob], n_jobs: int, force: bool = False) -> List[BacktestJob]:
+    pending = [x for x in jobs if force or not os.path.exists(job_done_file(x))]
+    n_jobs = max(1, min(n_jobs, len(pending)))
+    log_info_ny(f"{len(jobs) - len(pending)} of {len(jobs)} backtest jobs already finished, "
+                f"running {len(pending)} on {n_jobs} processes")
+
+    started = time.perf_counter()
+    failed = []
+
+    def log_results(results: Iterable[Tuple[BacktestJob, float, int, float, Optional[str]]]):
+        for i, (job, took, n_trades, pnl, error) in enumerate(results):
+            if error:
+                failed.append(job)
+                log_warn_ny(f"[{i + 1}/{len(pending)}] {job_label(job)} failed after {took:.0f}s: {error}")
+            else:
+                log_info_ny(f"[{i + 1}/{len(pending)}] {job_label(job)} done in {took:.0f}s: {n_trades} trades, "
+                            f"pnl {pnl:.2f}. Elapsed {time.perf_counter() - started:.0f}s")
+
+    if n_jobs == 1:
+        log_results(map(run_backtest_job, pending))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(run_backtest_job, x) for x in pending]
+            log_results(x.result() for x in as_completed(futures))
+
+    log_info_ny(f"{len(pending) - len(failed)} backtest jobs done, {len(failed)} failed, "
+                f"took {time.perf_counter() - started:.0f}s")
+    return failed
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="backtest smt/psp strategies for every (year, triad) job")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--years", type=int, nargs="*", help="only the jobs of these years")
+    parser.add_argument("--force", action="store_true", help="run finished jobs again")
+    args = parser.parse_args()
+
+    try:
+        run_backtest_jobs([x for x in BACKTEST_JOBS if not args.years or x[0] in args.years], args.jobs, args.force)
     except KeyboardInterrupt:
         print(f"KeyboardInterrupt, exiting ...")
         quit(0)
@@ -1,44 +1,26 @@
+import os
 import time
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple, Optional, TypeAlias
 
 from stock_market_research_kit.asset import TriadCandles15mGenerator
-from stock_market_research_kit.smt_psp_strategy import SmtPspStrategy
+from stock_market_research_kit.smt_psp_strategy import SmtPspStrategy, TickSignals, TrueOpens, SmtPspChange, \
+    TargetChange, TradeBook
+from stock_market_research_kit.smt_psp_tape import TapeTriad, tape_tick, write_tape_header, write_tape_tick, \
+    read_tape
 from stock_market_research_kit.smt_psp_trade import SmtPspTrade
-from stock_market_research_kit.triad import Triad, new_smt_found, smt_dict_old_smt_cancelled, targets_reached, \
-    targets_new_appeared, calc_psp_changed
-from utils.date_utils import to_utc_datetime, log_info_ny, log_warn_ny
+from stock_market_research_kit.triad import Triad, smt_psp_changes, targets_reached, targets_new_appeared
+from utils.date_utils import log_info_ny, log_warn_ny, time_core
 
+StrategiesTick: TypeAlias = Tuple[Triad | TapeTriad, TrueOpens, SmtPspChange, TargetChange]
 
-def fronttest(
-        triad: Triad,
-        strategies: List[SmtPspStrategy],
-        candles_gen: TriadCandles15mGenerator,
-        stop_after: str
-) -> Dict[str, List[SmtPspTrade]]:
-    symbols = (triad.a1.symbol, triad.a2.symbol, triad.a3.symbol)
-    closed_trades: Dict[str, List[SmtPspTrade]] = {}
-    active_trades: Dict[str, List[SmtPspTrade]] = {}
-
-    _tc_pnl = []
-    for s in strategies:
-        _tc_pnl.append((int(s.name[0:2]), 0, 0, 0))
-        closed_trades[s.name] = []
-        active_trades[s.name] = []
 
+def triad_ticks(triad: Triad, candles_gen: TriadCandles15mGenerator) -> Iterator[StrategiesTick]:
+    symbols = (triad.a1.symbol, triad.a2.symbol, triad.a3.symbol)
     prev_smt_psp = triad.actual_smt_psp()
     prev_long_targets = triad.long_targets()
     prev_short_targets = triad.short_targets()
 
-    _prev_handle_day_time = time.perf_counter()
-    _counter = 0
-    while True:
-        a1_candle, a2_candle, a3_candle = next(candles_gen)
-        if _counter % (4 * 24 * 1) == 0:
-            log_info_ny(
-                f"candle {a1_candle[5]}, handled {_counter // (4 * 24)} days, strategies: {'; '.join([f'{x[0]}) {x[1]}/{x[2]}/{round(x[3], 2)}' for x in _tc_pnl])}. Took {(time.perf_counter() - _prev_handle_day_time):.3f} seconds")
-            _prev_handle_day_time = time.perf_counter()
-        _counter += 1
-
+    for a1_candle, a2_candle, a3_candle in candles_gen:  # ends with the candles, run_strategies warns before stop_after
         _plus_15m_time = time.perf_counter()
         triad.a1.plus_15m(a1_candle)
         triad.a2.plus_15m(a2_candle)
@@ -62,9 +44,7 @@ def fronttest(
         # log_info_ny(f"targets_tos_time took {(time.perf_counter() - _targets_tos_time):.6f} seconds")
 
         # _smts_psps_change_time = time.perf_counter()
-        new_smts = new_smt_found(prev_smt_psp, smt_psp)
-        cancelled_smts = smt_dict_old_smt_cancelled(prev_smt_psp, smt_psp)
-        psp_changed = calc_psp_changed(symbols, prev_smt_psp, smt_psp)
+        new_smts, cancelled_smts, psp_changed = smt_psp_changes(symbols, prev_smt_psp, smt_psp)
         # log_info_ny(f"smts_psps_change_time took {(time.perf_counter() - _smts_psps_change_time):.6f} seconds")
 
         # _targets_change_time = time.perf_counter()
@@ -83,17 +63,51 @@ def fronttest(
         # if _smt_psp_targets_time_took > 0.7:
         #     log_warn_ny(f"smt_psp_targets_time took {_smt_psp_targets_time_took:.6f} seconds")
 
+        spc = (prev_smt_psp, smt_psp, new_smts, cancelled_smts, psp_changed)
+        tc = (
+            prev_long_targets, prev_short_targets, long_targets, short_targets,
+            reached_long_targets, reached_short_targets, new_long_targets, new_short_targets
+        )
+        yield triad, tos, spc, tc
+
+        prev_smt_psp = smt_psp
+        prev_long_targets = long_targets
+        prev_short_targets = short_targets
+
+
+def run_strategies(
+        ticks: Iterator[StrategiesTick],
+        strategies: List[SmtPspStrategy],
+        stop_after: str
+) -> Dict[str, List[SmtPspTrade]]:
+    closed_trades: Dict[str, List[SmtPspTrade]] = {}
+    active_trades: Dict[str, TradeBook] = {}
+
+    _tc_pnl = []
+    _cpu_times: Dict[str, float] = {"": 0}  # strategy name -> cpu seconds, the shared signals under ""
+    for s in strategies:
+        _cpu_times[s.name] = 0
+        _tc_pnl.append((s.name.split('.')[0], 0, 0, 0))
+        closed_trades[s.name] = []
+        active_trades[s.name] = TradeBook()
+
+    _prev_handle_day_time = time.perf_counter()
+    _counter = 0
+    for triad, tos, spc, tc in ticks:
+        if _counter % (4 * 24 * 1) == 0:
+            log_info_ny(
+                f"candle {triad.a1.prev_15m_candle[5]}, handled {_counter // (4 * 24)} days, strategies: {'; '.join([f'{x[0]}) {x[1]}/{x[2]}/{round(x[3], 2)}' for x in _tc_pnl])}. Took {(time.perf_counter() - _prev_handle_day_time):.3f} seconds")
+            _prev_handle_day_time = time.perf_counter()
+        _counter += 1
+
         _handle_strategies_time = time.perf_counter()
+        signals = TickSignals(triad, spc, tc)
         for i, s in enumerate(strategies):
+            _strategy_cpu_time, _signals_cpu_time = time.process_time(), signals.cpu_time
             active_trades[s.name], s_closed_trades = s.trades_handler(
                 stop_after,
                 active_trades[s.name],
-                triad, tos,
-                (prev_smt_psp, smt_psp, new_smts, cancelled_smts, psp_changed),
-                (
-                    prev_long_targets, prev_short_targets, long_targets, short_targets,
-                    reached_long_targets, reached_short_targets, new_long_targets, new_short_targets
-                )
+                triad, tos, spc, tc
             )
             for t in s_closed_trades:
                 if t.limit_status == "CANCELLED":
@@ -107,23 +121,50 @@ def fronttest(
                     )
             closed_trades[s.name].extend(s_closed_trades)
 
-            if to_utc_datetime(triad.a1.snapshot_date_readable) >= to_utc_datetime(stop_after):
+            if time_core().parse(triad.a1.snapshot_date_readable) >= time_core().parse(stop_after):
+                cpu_times = [f"{x.split('.')[0]}) {_cpu_times[x]:.3f}" for x in _cpu_times if x]
+                log_info_ny(f"cpu seconds: shared signals {_cpu_times[''] + signals.cpu_time:.3f}, strategies: "
+                            f"{'; '.join(cpu_times)}")
                 return closed_trades
 
-            s_active_trades = s.trade_opener(
-                triad, tos,
-                (prev_smt_psp, smt_psp, new_smts, cancelled_smts, psp_changed),
-                (
-                    prev_long_targets, prev_short_targets, long_targets, short_targets,
-                    reached_long_targets, reached_short_targets, new_long_targets, new_short_targets
-                )
-            )
+            s_active_trades = s.trade_opener(triad, tos, spc, tc, signals)
             active_trades[s.name].extend(s_active_trades)
+            # the shared signals this strategy happened to compute first are not its own cost
+            _cpu_times[s.name] += time.process_time() - _strategy_cpu_time - (signals.cpu_time - _signals_cpu_time)
+        _cpu_times[""] += signals.cpu_time
 
         _handle_strategies_took = time.perf_counter() - _handle_strategies_time
         # if _handle_strategies_took > 0.02:
         #     log_warn_ny(f"handle_strategies took {_handle_strategies_took:.6f} seconds")
 
-        prev_smt_psp = smt_psp
-        prev_long_targets = long_targets
-        prev_short_targets = short_targets
+    log_warn_ny(f"ticks ended before {stop_after}, {sum([len(x) for x in active_trades.values()])} trades left active")
+    return closed_trades
+
+
+def fronttest(
+        triad: Triad,
+        strategies: List[SmtPspStrategy],
+        candles_gen: TriadCandles15mGenerator,
+        stop_after: str,
+        tape_path: Optional[str] = None
+) -> Dict[str, List[SmtPspTrade]]:
+    if tape_path is None:
+        return run_strategies(triad_ticks(triad, candles_gen), strategies, stop_after)
+
+    # every tick strategies see is recorded as well, replay runs any strategies on it without the triad
+    def recorded(ticks: Iterator[StrategiesTick]) -> Iterator[StrategiesTick]:
+        for tick in ticks:
+            write_tape_tick(f, tape_tick(*tick))
+            yield tick
+
+    os.makedirs(os.path.dirname(tape_path), exist_ok=True)
+    tmp_path = f"{tape_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_tape_header(f, (triad.a1.symbol, triad.a2.symbol, triad.a3.symbol))
+        closed_trades = run_strategies(recorded(triad_ticks(triad, candles_gen)), strategies, stop_after)
+    os.replace(tmp_path, tape_path)  # only a tape of the whole run, a crash or ctrl+c leaves no tape
+    return closed_trades
+
+
+def replay(tape_path: str, strategies: List[SmtPspStrategy], stop_after: str) -> Dict[str, List[SmtPspTrade]]:
+    return run_strategies(read_tape(tape_path), strategies, stop_after)
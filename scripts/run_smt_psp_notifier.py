@@ -1,16 +1,18 @@
 import time
 from datetime import datetime, timedelta
-from typing import Generator, List, Tuple
+from typing import Generator, List, Tuple, Optional
 from zoneinfo import ZoneInfo
 
 from scripts.run_series_raw_loader import update_candle_from_binance
-from stock_market_research_kit.db_layer import last_candle_15m, select_full_days_candles_15m, select_candles_15m
+from stock_market_research_kit.candle import InnerCandle
+from stock_market_research_kit.db_layer import last_candle_15m, select_full_days_candles_15m, select_candles_15m, \
+    select_multiyear_candles_15m
 from stock_market_research_kit.tg_notifier import TelegramThrottler
-from stock_market_research_kit.triad import Candles15mGenerator, new_triad, Triad, new_smt_found, \
-    calc_psp_changed, smt_dict_readable, smt_readable, smt_dict_old_smt_cancelled, \
-    targets_readable, targets_reached, true_opens_readable, targets_new_appeared
-from utils.date_utils import log_info_ny, now_ny_datetime, now_utc_datetime, to_ny_datetime, to_utc_datetime, \
-    to_date_str, ny_zone, to_ny_date_str
+from stock_market_research_kit.triad import new_triad_from_history, Triad, smt_psp_changes, \
+    smt_dict_readable, smt_readable, targets_readable, targets_reached, true_opens_readable, targets_new_appeared, \
+    triad_checkpoint_path, load_triad_checkpoint, save_triad_checkpoint, catch_up_triad
+from utils.date_utils import log_info_ny, log_warn_ny, now_ny_datetime, now_utc_datetime, to_ny_datetime, \
+    to_utc_datetime, to_date_str, ny_zone, to_ny_date_str
 
 
 def update_candles(symbols, last_date_utc):
@@ -36,9 +38,7 @@ def handle_new_candle(triad: Triad):
     long_targets = triad.long_targets()
     short_targets = triad.short_targets()
 
-    new_smts = new_smt_found(prev_smt_psp, smt_psp)
-    cancelled_smts = smt_dict_old_smt_cancelled(prev_smt_psp, smt_psp)
-    psp_changes = calc_psp_changed(symbols, prev_smt_psp, smt_psp)
+    new_smts, cancelled_smts, psp_changes = smt_psp_changes(symbols, prev_smt_psp, smt_psp)
     reached_short_targets = targets_reached(
         (triad.a1.prev_15m_candle, triad.a2.prev_15m_candle, triad.a3.prev_15m_candle),
         prev_short_targets, short_targets)
@@ -196,36 +196,48 @@ def time_15m_generator(start_date: datetime) -> Generator[datetime, None, None]:
         yield current_date
 
 
-def reverse_candles_generator(symbol, last_date_utc: datetime) -> Candles15mGenerator:
+def candles_history(symbol, last_date_utc: datetime) -> List[InnerCandle]:
     candles_prev_year = select_full_days_candles_15m(last_date_utc.year - 1, symbol)
     candles_this_year = select_candles_15m(
         last_date_utc.year, symbol,
         to_date_str(last_date_utc.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)),
         to_date_str(last_date_utc + timedelta(minutes=15)),
     )
-    candles = candles_prev_year + candles_this_year
+    return candles_prev_year + candles_this_year
 
-    index = len(candles) - 1
 
-    while True:
-        yield candles[index]
-        index = index - 1
+def warm_start_triad(symbols: Tuple[str, str, str], checkpoint_path: str, last_candle_date: str) -> Optional[Triad]:
+    # the triad of the last handled tick, caught up with the candles loaded since then
+    triad = load_triad_checkpoint(checkpoint_path, symbols)
+    to = to_date_str(to_utc_datetime(last_candle_date) + timedelta(minutes=15))
+    if not triad or triad.a1.snapshot_date_readable > to:
+        return None
+    missing_candles = tuple(select_multiyear_candles_15m(x, triad.a1.snapshot_date_readable, to) for x in symbols)
+    if not catch_up_triad(triad, missing_candles):
+        log_warn_ny(f"candles since {triad.a1.snapshot_date_readable} have gaps, populating the triad")
+        return None
+    log_info_ny(f"warm started from {checkpoint_path}, {len(missing_candles[0])} candles caught up")
+    return triad
 
 
-def run_notifier(a1, a2, a3: str, last_date_utc: datetime):
+def run_notifier(a1, a2, a3: str, last_date_utc: datetime, warm_start: bool = True):
     log_info_ny(f"Starting SMT/PSP Notifier for triad: {a1}-{a2}-{a3}")
     start_time = time.perf_counter()
     update_candles([a1, a2, a3], last_date_utc)
     last_a1_candle = last_candle_15m(last_date_utc.year, a1)
-
-    triad = new_triad(
-        (a1, a2, a3),
-        (
-            reverse_candles_generator(a1, to_utc_datetime(last_a1_candle[5])),
-            reverse_candles_generator(a2, to_utc_datetime(last_a1_candle[5])),
-            reverse_candles_generator(a3, to_utc_datetime(last_a1_candle[5])),
+    checkpoint_path = triad_checkpoint_path((a1, a2, a3), "notifier")
+
+    triad = warm_start_triad((a1, a2, a3), checkpoint_path, last_a1_candle[5]) if warm_start else None
+    if not triad:
+        triad = new_triad_from_history(
+            (a1, a2, a3),
+            (
+                candles_history(a1, to_utc_datetime(last_a1_candle[5])),
+                candles_history(a2, to_utc_datetime(last_a1_candle[5])),
+                candles_history(a3, to_utc_datetime(last_a1_candle[5])),
+            )
         )
-    )
+        save_triad_checkpoint(triad, checkpoint_path)
 
     gen = time_15m_generator(
         # datetime(2025, 5, 20, 6, 58, tzinfo=ZoneInfo("America/New_York")).astimezone(ZoneInfo("UTC")),
@@ -241,6 +253,7 @@ def run_notifier(a1, a2, a3: str, last_date_utc: datetime):
         handling_start = time.perf_counter()
         update_candles([a1, a2, a3], next_dt_utc)
         handle_new_candle(triad)
+        save_triad_checkpoint(triad, checkpoint_path)
 
         log_info_ny(f"next_dt_utc handling took {(time.perf_counter() - handling_start):.6f} seconds")
 
@@ -0,0 +1,70 @@
+import json
+import os
+from typing import Tuple, List, TypeAlias, Dict
+
+from scripts.run_backtest_smt_psp_strategies import taped_fronttest
+from stock_market_research_kit.smt_psp_strategy import SweepParams, SWEEP_GRID, sweep_grid_params, sweep_strategies, \
+    sweep_params_readable
+from stock_market_research_kit.smt_psp_trade import SmtPspTrade, json_from_smt_psp_trades
+from utils.date_utils import log_info_ny
+
+SWEEPS_FOLDER = "./data/sweeps/"
+
+SweepStat: TypeAlias = Tuple[
+    str,  # strategy name
+    int,  # filled trades
+    int,  # cancelled limit orders
+    int,  # wins
+    int,  # losses
+    float,  # win rate
+    float,  # pnl in usd, fees included
+]
+
+
+def sweep_stat(name: str, trades: List[SmtPspTrade]) -> SweepStat:
+    filled = [x for x in trades if x.limit_status != "CANCELLED"]
+    pnls = [x.pnl_usd - x.entry_position_fee - x.close_position_fee for x in filled]
+    wins = len([x for x in pnls if x > 0])
+    return name, len(filled), len(trades) - len(filled), wins, len(pnls) - wins, \
+        wins / len(pnls) if pnls else 0, sum(pnls)
+
+
+def sweep_folder(year: int, symbols: Tuple[str, str, str]) -> str:
+    smb = '_'.join([x.replace('USDT', '').lower() for x in symbols])
+    return f"{SWEEPS_FOLDER}{year}_{smb}/"
+
+
+def run_sweep(
+        year: int, from_: str, to_: str, symbols: Tuple[str, str, str], params_list: List[SweepParams]
+) -> List[SweepStat]:
+    # every params combination in one fronttest pass, then a trades snapshot per combination and a summary
+    strategies = sweep_strategies(params_list)
+    log_info_ny(f"sweeping {len(strategies)} strategy variants on {'-'.join(symbols)} {from_} - {to_}")
+    closed_trades = taped_fronttest(year, from_, to_, symbols, strategies)
+
+    folder = sweep_folder(year, symbols)
+    os.makedirs(folder, exist_ok=True)
+    params_d: Dict[str, SweepParams] = {s.name: params for s, params in zip(strategies, params_list)}
+    for s_name in closed_trades:
+        with open(f"{folder}{s_name.split('.')[0]}.json", "w", encoding="utf-8") as f:
+            f.write(json_from_smt_psp_trades(closed_trades[s_name]))
+
+    stats = sorted([sweep_stat(x, closed_trades[x]) for x in closed_trades], key=lambda x: x[6], reverse=True)
+    with open(f"{folder}summary.json", "w", encoding="utf-8") as f:
+        f.write(json.dumps([{
+            "name": x[0], "params": sweep_params_readable(params_d[x[0]]), "trades": x[1], "cancelled": x[2],
+            "wins": x[3], "losses": x[4], "win_rate": round(x[5], 4), "pnl": round(x[6], 2)
+        } for x in stats], indent=2))
+
+    for x in stats[:10]:
+        log_info_ny(f"{x[0]}: {x[1]} trades, wr {x[5]:.2f}, pnl {x[6]:.2f}")
+    return stats
+
+
+if __name__ == "__main__":
+    try:
+        run_sweep(2025, '2025-01-01 00:00', '2025-09-21 00:00', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT'),
+                  sweep_grid_params(SWEEP_GRID))
+    except KeyboardInterrupt:
+        print(f"KeyboardInterrupt, exiting ...")
+        quit(0)
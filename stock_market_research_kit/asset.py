@@ -1,20 +1,17 @@
-import math
-from collections import deque
-from dataclasses import dataclass
-from datetime import timedelta
-from typing import TypeAlias, Tuple, Optional, List, Generator, Deque
+from collections import defaultdict
+from dataclasses import dataclass, fields, asdict, replace
+from enum import Enum
+from functools import lru_cache
+from typing import TypeAlias, Tuple, Optional, Generator, List, Dict, Callable, DefaultDict, Iterable
+
+import numpy as np
 
 from stock_market_research_kit.candle import PriceDate, InnerCandle, as_1_candle, as_1d_candles, as_1h_candles, \
-    as_4h_candles
-from stock_market_research_kit.candle_trend import Trend, find_last_trend
+    as_4h_candles, CandleSeries, new_empty_candle_series, candle_series, candle_series_from_columns, resample_batch
+from stock_market_research_kit.candle_trend import Trend, TrendTracker
 from stock_market_research_kit.db_layer import select_multiyear_candles_15m
 from stock_market_research_kit.quarter import Quarter90m, DayQuarter, WeekDay, MonthWeek, YearQuarter
-from utils.date_utils import to_utc_datetime, to_date_str, get_prev_30m_from_to, get_current_30m_from_to, \
-    get_prev_1h_from_to, get_current_1h_from_to, get_prev_2h_from_to, get_current_2h_from_to, get_prev_4h_from_to, \
-    get_current_4h_from_to, get_prev_1d_from_to, get_current_1d_from_to, get_prev_1w_from_to, get_current_1w_from_to, \
-    get_prev_1month_from_to, get_current_1month_from_to, quarters90m_ranges, day_quarters_ranges, \
-    prev_year_ranges, weekday_ranges, month_week_quarters_ranges, year_quarters_ranges, quarters_by_time, \
-    current_year_ranges, log_info_ny
+from utils.date_utils import log_info_ny, time_core, to_epoch, epoch_time_core
 
 LiqSwept: TypeAlias = Tuple[float, bool]  # (price, is_swept)
 TargetPercent: TypeAlias = Tuple[float, float]  # (price, percent_from_current)
@@ -22,9 +19,67 @@ TargetPercent: TypeAlias = Tuple[float, float]  # (price, percent_from_current)
 QuarterLiq: TypeAlias = Tuple[str, str, bool, LiqSwept, LiqSwept, LiqSwept]
 Candles15mGenerator: TypeAlias = Generator[InnerCandle, None, None]
 TriadCandles15mGenerator: TypeAlias = Generator[Tuple[InnerCandle, InnerCandle, InnerCandle], None, None]
-
-
-@dataclass
+ASSET_CANDLE_FIELDS = ("candles_15m", "candles_1h", "candles_4h", "candles_1d")
+TREND_TIMEFRAMES = ("1d", "4h", "1h", "15m")
+TREND_LENGTHS = (120, 40, 15)  # windows of the Trends fields, trend_<timeframe>_<length>
+
+# in quarters_by_time order: TimeCore ranges fn, Asset field of each quarter, true open field
+QUARTER_KINDS: List[Tuple[str, Dict[Enum, str], str]] = [
+    ("year_quarters_ranges", {
+        YearQuarter.YQ1: "year_q1", YearQuarter.YQ2: "year_q2", YearQuarter.YQ3: "year_q3", YearQuarter.YQ4: "year_q4",
+    }, "true_yo"),
+    ("month_week_quarters_ranges", {
+        MonthWeek.MW1: "week1", MonthWeek.MW2: "week2", MonthWeek.MW3: "week3", MonthWeek.MW4: "week4",
+        MonthWeek.MW5: "week5",
+    }, "true_mo"),
+    ("weekday_ranges", {
+        WeekDay.Mon: "mon", WeekDay.Tue: "tue", WeekDay.Wed: "wed", WeekDay.Thu: "thu", WeekDay.MonThu: "mon_thu",
+        WeekDay.Fri: "fri", WeekDay.MonFri: "mon_fri", WeekDay.Sat: "sat",
+    }, "true_wo"),
+    ("day_quarters_ranges", {
+        DayQuarter.DQ1_Asia: "asia", DayQuarter.DQ2_London: "london", DayQuarter.DQ3_NYAM: "nyam",
+        DayQuarter.DQ4_NYPM: "nypm",
+    }, "true_do"),
+    ("quarters90m_ranges", {
+        Quarter90m.Q1_90m: "q1_90m", Quarter90m.Q2_90m: "q2_90m", Quarter90m.Q3_90m: "q3_90m",
+        Quarter90m.Q4_90m: "q4_90m",
+    }, "true_90m_open"),
+]
+# (kind, quarter that just ended) -> fields to reset, true open: True - opens at candle close, False - reset, None - kept
+QUARTER_ROLLS: Dict[Tuple[int, Enum], Tuple[Tuple[str, ...], Optional[bool]]] = {
+    (0, YearQuarter.YQ1): (("year_q4",), True),
+    (0, YearQuarter.YQ4): (("year_q1", "year_q2", "year_q3"), False),
+    (1, MonthWeek.MW1): (("week4", "week5"), True),
+    (1, MonthWeek.MW4): (("week1", "week2", "week3"), False),  # not when joker week MW5 follows
+    (1, MonthWeek.MW5): (("week1", "week2", "week3", "week4"), False),
+    (2, WeekDay.Mon): (("thu", "fri"), True),
+    (2, WeekDay.Fri): (("mon", "tue", "wed"), None),
+    (2, WeekDay.Sun): (("mon_thu", "mon_fri", "sat"), False),
+    (3, DayQuarter.DQ1_Asia): (("nypm",), True),
+    (3, DayQuarter.DQ4_NYPM): (("asia", "london", "nyam"), False),
+    (4, Quarter90m.Q1_90m): (("q4_90m",), True),
+    (4, Quarter90m.Q4_90m): (("q1_90m", "q2_90m", "q3_90m"), False),
+}
+
+_last_quarter_fields: List[Tuple[list, List[Tuple[str, any, any]]]] = [([], [])] * len(QUARTER_KINDS)
+
+
+def _quarter_fields(kind: int, ranges: list) -> List[Tuple[str, any, any]]:
+    # calendar ranges are the same list for all 15m slots of a quarter, so fields are looked up once per quarter
+    last_ranges, fields = _last_quarter_fields[kind]
+    if last_ranges is not ranges:
+        quarter_fields = QUARTER_KINDS[kind][1]
+        fields = [(quarter_fields[q], from_, to) for q, from_, to in ranges if q in quarter_fields]  # no sunday liq
+        _last_quarter_fields[kind] = ranges, fields
+    return fields
+
+
+@lru_cache(maxsize=64)
+def _range_dates(format_: Callable[[any], str], from_, to) -> Tuple[str, str]:  # same quarter for many ticks
+    return format_(from_), format_(to)
+
+
+@dataclass(frozen=True)  # a snapshot, recalc_trends replaces it, so trades keep references, not copies
 class Trends:
     trend_1d_120: Optional[Trend]
     trend_1d_40: Optional[Trend]
@@ -44,24 +99,20 @@ class Trends:
 
     @staticmethod
     def from_dict(d):
-        trends_ = new_empty_trends()
-        for key in d:
-            if d[key] is None:
-                continue
-            setattr(trends_, key, Trend.from_dict(d[key]))
-
-        return trends_
+        return replace(new_empty_trends(), **{key: Trend.from_dict(d[key]) for key in d if d[key] is not None})
 
 
 @dataclass
 class Asset:
     symbol: str
     snapshot_date_readable: str
-    candles_15m: Deque[InnerCandle]
-    candles_1h: List[InnerCandle]
-    candles_4h: List[InnerCandle]
-    candles_1d: List[InnerCandle]
+    candles_15m: CandleSeries
+    candles_1h: CandleSeries
+    candles_4h: CandleSeries
+    candles_1d: CandleSeries
 
+    # a property (Asset.trends after the class, on top of _trends): reading it first recalculates the timeframes
+    # plus_15m marked stale. A field still, so the constructor, fields(), asdict and == see it
     trends: Trends
 
     prev_year: Optional[QuarterLiq]
@@ -122,21 +173,27 @@ class Asset:
     current_1month_candle: Optional[InnerCandle]
     current_year_candle: Optional[InnerCandle]
 
-    def get_15m_candles_range(self, from_: str, to: str) -> List[InnerCandle]:
+    def __post_init__(self):
+        # not fields: kept out of asdict/json snapshots, rebuilt lazily after loading
+        self.trend_trackers: DefaultDict[str, TrendTracker] = defaultdict(TrendTracker)
+
+    def get_15m_candles_range(self, from_: str, to: str) -> CandleSeries:
+        # 15m candles are contiguous, so the range is an O(1) offset and a zero-copy slice of candles_15m
         if len(self.candles_15m) == 0:
-            return []
-        first_date, from_date, to_date = to_utc_datetime(self.candles_15m[0][5]), to_utc_datetime(
-            from_), to_utc_datetime(to)
+            return self.candles_15m[0:0]
+        first_date = self.candles_15m.epoch(0) if isinstance(self.candles_15m, CandleSeries) \
+            else to_epoch(self.candles_15m[0][5])
+        from_date, to_date = to_epoch(from_), to_epoch(to)
 
-        segments_15m = math.floor((to_date - from_date).total_seconds() / (15 * 60))
+        segments_15m = (to_date - from_date) // (15 * 60)
         if segments_15m < 1:
-            return []
+            return self.candles_15m[0:0]
 
-        first_index = math.floor((from_date - first_date).total_seconds() / (15 * 60))
+        first_index = (from_date - first_date) // (15 * 60)
         if first_index < 0:
-            return []
+            return self.candles_15m[0:0]
 
-        return list(self.candles_15m)[first_index:first_index + segments_15m]
+        return self.candles_15m[first_index:first_index + segments_15m]
 
     def yq_get(self, yq: YearQuarter) -> Optional[QuarterLiq]:
         match yq:
@@ -286,7 +343,7 @@ class Asset:
             self.candles_1d[-1] = as_1_candle([self.candles_1d[-1], c])
 
 
-    def recalc_trends(self):
+    def trend_windows(self) -> Dict[str, Tuple[CandleSeries, int]]:  # timeframe -> candles, last closed index + 1
         last_closed_1h_i = len(self.candles_1h) - 1
         last_closed_4h_i = len(self.candles_4h) - 1
         last_closed_1d_i = len(self.candles_1d) - 1
@@ -300,349 +357,199 @@ class Asset:
         elif self.snapshot_date_readable.endswith("00"):
             last_closed_1d_i = len(self.candles_1d)
 
-        if last_closed_1d_i >= 120:
-            self.trends.trend_1d_120 = find_last_trend(self.candles_1d[last_closed_1d_i - 120:last_closed_1d_i])
-        if last_closed_1d_i >= 40:
-            self.trends.trend_1d_40 = find_last_trend(self.candles_1d[last_closed_1d_i - 40:last_closed_1d_i])
-        if last_closed_1d_i >= 15:
-            self.trends.trend_1d_15 = find_last_trend(self.candles_1d[last_closed_1d_i - 15:last_closed_1d_i])
-
-        if last_closed_4h_i >= 120:
-            self.trends.trend_4h_120 = find_last_trend(self.candles_4h[last_closed_4h_i - 120:last_closed_4h_i])
-        if last_closed_4h_i >= 40:
-            self.trends.trend_4h_40 = find_last_trend(self.candles_4h[last_closed_4h_i - 40:last_closed_4h_i])
-        if last_closed_4h_i >= 15:
-            self.trends.trend_4h_15 = find_last_trend(self.candles_4h[last_closed_4h_i - 15:last_closed_4h_i])
-
-        if last_closed_1h_i >= 120:
-            self.trends.trend_1h_120 = find_last_trend(self.candles_1h[last_closed_1h_i - 120:last_closed_1h_i])
-        if last_closed_1h_i >= 40:
-            self.trends.trend_1h_40 = find_last_trend(self.candles_1h[last_closed_1h_i - 40:last_closed_1h_i])
-        if last_closed_1h_i >= 15:
-            self.trends.trend_1h_15 = find_last_trend(self.candles_1h[last_closed_1h_i - 15:last_closed_1h_i])
-
-        if last_closed_15m_i >= 120:
-            self.trends.trend_15m_120 = find_last_trend(
-                list(self.candles_15m)[last_closed_15m_i - 120:last_closed_15m_i])
-        if last_closed_15m_i >= 40:
-            self.trends.trend_15m_40 = find_last_trend(list(self.candles_15m)[last_closed_15m_i - 40:last_closed_15m_i])
-        if last_closed_15m_i >= 15:
-            self.trends.trend_15m_15 = find_last_trend(list(self.candles_15m)[last_closed_15m_i - 15:last_closed_15m_i])
+        return {
+            "1d": (self.candles_1d, last_closed_1d_i),
+            "4h": (self.candles_4h, last_closed_4h_i),
+            "1h": (self.candles_1h, last_closed_1h_i),
+            "15m": (self.candles_15m, last_closed_15m_i),
+        }
+
+    def recalc_trends(self, timeframes: Iterable[str] = TREND_TIMEFRAMES):
+        timeframes = set(timeframes)
+        changed = {}
+        for timeframe, (candles, last_closed_i) in self.trend_windows().items():
+            if timeframe not in timeframes:
+                continue
+            for length in TREND_LENGTHS:
+                if last_closed_i >= length:
+                    key = f"trend_{timeframe}_{length}"
+                    trend = self.trend_trackers[f"{timeframe}_{length}"].update(
+                        candles, last_closed_i - length, last_closed_i)
+                    if trend is not getattr(self._trends, key):
+                        changed[key] = trend
+        if changed:  # a new snapshot, the previous one may be referenced by trades
+            self._trends = replace(self._trends, **changed)
+        self.stale_trends -= timeframes
 
     def plus_15m(self, candle: InnerCandle):
-        prev_yq, prev_mw, prev_wd, prev_dq, prev_q90m = quarters_by_time(self.snapshot_date_readable)
+        tc = time_core()
+        prev_quarters = tc.quarters_by_time(tc.parse(self.snapshot_date_readable))
         self.candles_15m.append(candle)
         self.prev_15m_candle = candle
-        self.snapshot_date_readable = to_date_str(to_utc_datetime(self.prev_15m_candle[5]) + timedelta(minutes=15))
+        candle_t = tc.parse(candle[5])
+        snapshot_t = candle_t + tc.minutes(15)
+        self.snapshot_date_readable = tc.format(snapshot_t)
         self.recalc_htf_candles(candle)
-        self.recalc_trends()
-        new_yq, new_mw, new_wd, new_dq, new_q90m = quarters_by_time(self.snapshot_date_readable)
-
-        ranges_yq, tyo = year_quarters_ranges(self.snapshot_date_readable)
-        for i in range(len(ranges_yq)):
-            prev_yql = self.yq_get(ranges_yq[i][0])
-            if ranges_yq[i][1] <= to_utc_datetime(candle[5]) < ranges_yq[i][2]:
-                new_high, new_low = candle[1], candle[2]
-                if prev_yql:
-                    new_high, new_low = max(prev_yql[3][0], candle[1]), min(prev_yql[5][0], candle[2])
-                new_half = (new_high + new_low) / 2
-
-                self.yq_set(ranges_yq[i][0], (
-                    to_date_str(ranges_yq[i][1]), to_date_str(ranges_yq[i][2]),
-                    ranges_yq[i][2] < to_utc_datetime(self.snapshot_date_readable),
-                    (new_high, False),
-                    (new_half, False),
-                    (new_low, False)
-                ))
-            elif prev_yql:
-                self.yq_set(ranges_yq[i][0], (
-                    prev_yql[0], prev_yql[1], prev_yql[2],
-                    (prev_yql[3][0], prev_yql[3][1] or prev_yql[3][0] < candle[1]),
-                    (prev_yql[4][0], prev_yql[4][1] or candle[2] <= prev_yql[4][0] <= candle[1]),
-                    (prev_yql[5][0], prev_yql[5][1] or prev_yql[5][0] > candle[2])
-                ))
-
-        if prev_yq != new_yq:
-            if prev_yq == YearQuarter.YQ1:
-                self.year_q4 = None
-                self.true_yo = (candle[3], to_date_str(to_utc_datetime(candle[5]) + timedelta(minutes=15)))
-            elif prev_yq == YearQuarter.YQ4:
-                self.year_q1 = None
-                self.year_q2 = None
-                self.year_q3 = None
-                self.true_yo = None
-
-        ranges_mw, tmo = month_week_quarters_ranges(self.snapshot_date_readable)
-        for i in range(len(ranges_mw)):
-            prev_mwl = self.mw_get(ranges_mw[i][0])
-            if ranges_mw[i][1] <= to_utc_datetime(candle[5]) < ranges_mw[i][2]:
-                new_high, new_low = candle[1], candle[2]
-                if prev_mwl:
-                    new_high, new_low = max(prev_mwl[3][0], candle[1]), min(prev_mwl[5][0], candle[2])
-                new_half = (new_high + new_low) / 2
-
-                self.mw_set(ranges_mw[i][0], (
-                    to_date_str(ranges_mw[i][1]), to_date_str(ranges_mw[i][2]),
-                    ranges_mw[i][2] < to_utc_datetime(self.snapshot_date_readable),
-                    (new_high, False),
-                    (new_half, False),
-                    (new_low, False)
-                ))
-            elif prev_mwl:
-                self.mw_set(ranges_mw[i][0], (
-                    prev_mwl[0], prev_mwl[1], prev_mwl[2],
-                    (prev_mwl[3][0], prev_mwl[3][1] or prev_mwl[3][0] < candle[1]),
-                    (prev_mwl[4][0], prev_mwl[4][1] or candle[2] <= prev_mwl[4][0] <= candle[1]),
-                    (prev_mwl[5][0], prev_mwl[5][1] or prev_mwl[5][0] > candle[2])
-                ))
-
-        if prev_mw != new_mw:
-            if prev_mw == MonthWeek.MW1:
-                self.week4 = None
-                self.week5 = None
-                self.true_mo = (candle[3], to_date_str(to_utc_datetime(candle[5]) + timedelta(minutes=15)))
-            elif prev_mw == MonthWeek.MW4:
-                if new_mw != MonthWeek.MW5:
-                    self.week1 = None
-                    self.week2 = None
-                    self.week3 = None
-                    self.true_mo = None
-            elif prev_mw == MonthWeek.MW5:
-                self.week1 = None
-                self.week2 = None
-                self.week3 = None
-                self.week4 = None
-                self.true_mo = None
-
-        ranges_wd, two = weekday_ranges(self.snapshot_date_readable)
-        for i in range(len(ranges_wd)):
-            prev_wdl = self.wd_get(ranges_wd[i][0])
-            if ranges_wd[i][1] <= to_utc_datetime(candle[5]) < ranges_wd[i][2]:
-                new_high, new_low = candle[1], candle[2]
-                if prev_wdl:
-                    new_high, new_low = max(prev_wdl[3][0], candle[1]), min(prev_wdl[5][0], candle[2])
-                new_half = (new_high + new_low) / 2
-
-                self.wd_set(ranges_wd[i][0], (
-                    to_date_str(ranges_wd[i][1]), to_date_str(ranges_wd[i][2]),
-                    ranges_wd[i][2] < to_utc_datetime(self.snapshot_date_readable),
-                    (new_high, False),
-                    (new_half, False),
-                    (new_low, False)
-                ))
-            elif prev_wdl:
-                self.wd_set(ranges_wd[i][0], (
-                    prev_wdl[0], prev_wdl[1], prev_wdl[2],
-                    (prev_wdl[3][0], prev_wdl[3][1] or prev_wdl[3][0] < candle[1]),
-                    (prev_wdl[4][0], prev_wdl[4][1] or candle[2] <= prev_wdl[4][0] <= candle[1]),
-                    (prev_wdl[5][0], prev_wdl[5][1] or prev_wdl[5][0] > candle[2])
-                ))
-
-        if prev_wd != new_wd:
-            if prev_wd == WeekDay.Mon:
-                self.thu = None
-                self.fri = None
-                self.true_wo = (candle[3], to_date_str(to_utc_datetime(candle[5]) + timedelta(minutes=15)))
-            elif prev_wd == WeekDay.Fri:
-                self.mon = None
-                self.tue = None
-                self.wed = None
-            elif prev_wd == WeekDay.Sun:
-                self.mon_thu = None
-                self.mon_fri = None
-                self.sat = None
-                self.true_wo = None
-
-        ranges_dq, tdo = day_quarters_ranges(self.snapshot_date_readable)
-        for i in range(len(ranges_dq)):
-            prev_dql = self.dq_get(ranges_dq[i][0])
-            if ranges_dq[i][1] <= to_utc_datetime(candle[5]) < ranges_dq[i][2]:
-                new_high, new_low = candle[1], candle[2]
-                if prev_dql:
-                    new_high, new_low = max(prev_dql[3][0], candle[1]), min(prev_dql[5][0], candle[2])
-                new_half = (new_high + new_low) / 2
-
-                self.dq_set(ranges_dq[i][0], (
-                    to_date_str(ranges_dq[i][1]), to_date_str(ranges_dq[i][2]),
-                    ranges_dq[i][2] < to_utc_datetime(self.snapshot_date_readable),
-                    (new_high, False),
-                    (new_half, False),
-                    (new_low, False)
-                ))
-            elif prev_dql:
-                self.dq_set(ranges_dq[i][0], (
-                    prev_dql[0], prev_dql[1], prev_dql[2],
-                    (prev_dql[3][0], prev_dql[3][1] or prev_dql[3][0] < candle[1]),
-                    (prev_dql[4][0], prev_dql[4][1] or candle[2] <= prev_dql[4][0] <= candle[1]),
-                    (prev_dql[5][0], prev_dql[5][1] or prev_dql[5][0] > candle[2])
-                ))
-
-        if prev_dq != new_dq:
-            if prev_dq == DayQuarter.DQ1_Asia:
-                self.nypm = None
-                self.true_do = (candle[3], to_date_str(to_utc_datetime(candle[5]) + timedelta(minutes=15)))
-            elif prev_dq == DayQuarter.DQ4_NYPM:
-                self.asia = None
-                self.london = None
-                self.nyam = None
-                self.true_do = None
-
-        ranges_q90m, true_90m_open = quarters90m_ranges(self.snapshot_date_readable)
-        for i in range(len(ranges_q90m)):
-            prev_q90ml = self.q90m_get(ranges_q90m[i][0])
-            if ranges_q90m[i][1] <= to_utc_datetime(candle[5]) < ranges_q90m[i][2]:
-                new_high, new_low = candle[1], candle[2]
-                if prev_q90ml:
-                    new_high, new_low = max(prev_q90ml[3][0], candle[1]), min(prev_q90ml[5][0], candle[2])
-                new_half = (new_high + new_low) / 2
-
-                self.q90m_set(ranges_q90m[i][0], (
-                    to_date_str(ranges_q90m[i][1]), to_date_str(ranges_q90m[i][2]),
-                    ranges_q90m[i][2] < to_utc_datetime(self.snapshot_date_readable),
-                    (new_high, False),
-                    (new_half, False),
-                    (new_low, False)
-                ))
-            elif prev_q90ml:
-                self.q90m_set(ranges_q90m[i][0], (
-                    prev_q90ml[0], prev_q90ml[1], prev_q90ml[2],
-                    (prev_q90ml[3][0], prev_q90ml[3][1] or prev_q90ml[3][0] < candle[1]),
-                    (prev_q90ml[4][0], prev_q90ml[4][1] or candle[2] <= prev_q90ml[4][0] <= candle[1]),
-                    (prev_q90ml[5][0], prev_q90ml[5][1] or prev_q90ml[5][0] > candle[2])
-                ))
-
-        if prev_q90m != new_q90m:
-            if prev_q90m == Quarter90m.Q1_90m:
-                self.q4_90m = None
-                self.true_90m_open = (candle[3], to_date_str(to_utc_datetime(candle[5]) + timedelta(minutes=15)))
-            elif prev_q90m == Quarter90m.Q4_90m:
-                self.q1_90m = None
-                self.q2_90m = None
-                self.q3_90m = None
-                self.true_90m_open = None
-
-        if candle[5] == true_90m_open:
-            self.true_90m_open = (candle[0], true_90m_open)
-        if candle[5] == tdo:
-            self.true_do = (candle[0], tdo)
-        if candle[5] == two:
-            self.true_wo = (candle[0], two)
-        if candle[5] == tmo:
-            self.true_mo = (candle[0], tmo)
-        if candle[5] == tyo:
-            self.true_yo = (candle[0], tyo)
-
-        prev_30m_from, prev_30m_to = get_prev_30m_from_to(self.snapshot_date_readable)
-        current_30m_from, current_30m_to = get_current_30m_from_to(self.snapshot_date_readable)
-        prev_1h_from, prev_1h_to = get_prev_1h_from_to(self.snapshot_date_readable)
-        current_1h_from, current_1h_to = get_current_1h_from_to(self.snapshot_date_readable)
-        prev_2h_from, prev_2h_to = get_prev_2h_from_to(self.snapshot_date_readable)
-        current_2h_from, current_2h_to = get_current_2h_from_to(self.snapshot_date_readable)
-        prev_4h_from, prev_4h_to = get_prev_4h_from_to(self.snapshot_date_readable)
-        current_4h_from, current_4h_to = get_current_4h_from_to(self.snapshot_date_readable)
-        prev_1d_from, prev_1d_to = get_prev_1d_from_to(self.snapshot_date_readable)
-        current_1d_from, current_1d_to = get_current_1d_from_to(self.snapshot_date_readable)
-        prev_1w_from, prev_1w_to = get_prev_1w_from_to(self.snapshot_date_readable)
-        current_1w_from, current_1w_to = get_current_1w_from_to(self.snapshot_date_readable)
-        prev_1month_from, prev_1month_to = get_prev_1month_from_to(self.snapshot_date_readable)
-        current_1month_from, current_1month_to = get_current_1month_from_to(self.snapshot_date_readable)
-
-        prev_year_from, prev_year_to = prev_year_ranges(self.snapshot_date_readable)
-        current_year_from, current_year_to = current_year_ranges(self.snapshot_date_readable)
-
-        if current_30m_from <= to_utc_datetime(candle[5]) < current_30m_to:
+        # trends are recalculated when read (Asset.trends), only for the timeframes whose windows may have moved
+        self.stale_trends.add("15m")
+        if candle[5].endswith("00") or self.snapshot_date_readable.endswith("00"):  # a 1h/4h/1d bar opened or closed
+            self.stale_trends.update(("1h", "4h", "1d"))
+        if any(last_closed_i in TREND_LENGTHS for _, last_closed_i in self.trend_windows().values()):
+            self.recalc_trends(self.stale_trends)  # a window that is just long enough may be too short next tick
+        new_quarters = tc.quarters_by_time(snapshot_t)
+
+        self.plus_15m_quarters(candle, candle_t, snapshot_t, prev_quarters, new_quarters)
+
+        prev_30m_from, prev_30m_to = tc.get_prev_30m_from_to(snapshot_t)
+        current_30m_from, current_30m_to = tc.get_current_30m_from_to(snapshot_t)
+        prev_1h_from, prev_1h_to = tc.get_prev_1h_from_to(snapshot_t)
+        current_1h_from, current_1h_to = tc.get_current_1h_from_to(snapshot_t)
+        prev_2h_from, prev_2h_to = tc.get_prev_2h_from_to(snapshot_t)
+        current_2h_from, current_2h_to = tc.get_current_2h_from_to(snapshot_t)
+        prev_4h_from, prev_4h_to = tc.get_prev_4h_from_to(snapshot_t)
+        current_4h_from, current_4h_to = tc.get_current_4h_from_to(snapshot_t)
+        prev_1d_from, prev_1d_to = tc.get_prev_1d_from_to(snapshot_t)
+        current_1d_from, current_1d_to = tc.get_current_1d_from_to(snapshot_t)
+        prev_1w_from, prev_1w_to = tc.get_prev_1w_from_to(snapshot_t)
+        current_1w_from, current_1w_to = tc.get_current_1w_from_to(snapshot_t)
+        prev_1month_from, prev_1month_to = tc.get_prev_1month_from_to(snapshot_t)
+        current_1month_from, current_1month_to = tc.get_current_1month_from_to(snapshot_t)
+
+        prev_year_from, prev_year_to = tc.prev_year_ranges(snapshot_t)
+        current_year_from, current_year_to = tc.current_year_ranges(snapshot_t)
+
+        if current_30m_from <= candle_t < current_30m_to:
             if not self.current_30m_candle:
                 self.current_30m_candle = candle
             else:
                 self.current_30m_candle = as_1_candle([self.current_30m_candle, candle])
-        elif prev_30m_from <= to_utc_datetime(candle[5]) < prev_30m_to:
-            if to_utc_datetime(self.current_30m_candle[5]) != current_30m_from:
+        elif prev_30m_from <= candle_t < prev_30m_to:
+            if tc.parse(self.current_30m_candle[5]) != current_30m_from:
                 self.prev_30m_candle = as_1_candle([self.current_30m_candle, candle])
                 self.current_30m_candle = None
 
-        if current_1h_from <= to_utc_datetime(candle[5]) < current_1h_to:
+        if current_1h_from <= candle_t < current_1h_to:
             if not self.current_1h_candle:
                 self.current_1h_candle = candle
             else:
                 self.current_1h_candle = as_1_candle([self.current_1h_candle, candle])
-        elif prev_1h_from <= to_utc_datetime(candle[5]) < prev_1h_to:
-            if to_utc_datetime(self.current_1h_candle[5]) != current_1h_from:
+        elif prev_1h_from <= candle_t < prev_1h_to:
+            if tc.parse(self.current_1h_candle[5]) != current_1h_from:
                 self.prev_1h_candle = as_1_candle([self.current_1h_candle, candle])
                 self.current_1h_candle = None
 
-        if current_2h_from <= to_utc_datetime(candle[5]) < current_2h_to:
+        if current_2h_from <= candle_t < current_2h_to:
             if not self.current_2h_candle:
                 self.current_2h_candle = candle
             else:
                 self.current_2h_candle = as_1_candle([self.current_2h_candle, candle])
-        elif prev_2h_from <= to_utc_datetime(candle[5]) < prev_2h_to:
-            if to_utc_datetime(self.current_2h_candle[5]) != current_2h_from:
+        elif prev_2h_from <= candle_t < prev_2h_to:
+            if tc.parse(self.current_2h_candle[5]) != current_2h_from:
                 self.prev_2h_candle = as_1_candle([self.current_2h_candle, candle])
                 self.current_2h_candle = None
 
-        if current_4h_from <= to_utc_datetime(candle[5]) < current_4h_to:
+        if current_4h_from <= candle_t < current_4h_to:
             if not self.current_4h_candle:
                 self.current_4h_candle = candle
             else:
                 self.current_4h_candle = as_1_candle([self.current_4h_candle, candle])
-        elif prev_4h_from <= to_utc_datetime(candle[5]) < prev_4h_to:
-            if to_utc_datetime(self.current_4h_candle[5]) != current_4h_from:
+        elif prev_4h_from <= candle_t < prev_4h_to:
+            if tc.parse(self.current_4h_candle[5]) != current_4h_from:
                 self.prev_4h_candle = as_1_candle([self.current_4h_candle, candle])
                 self.current_4h_candle = None
 
-        if current_1d_from <= to_utc_datetime(candle[5]) < current_1d_to:
+        if current_1d_from <= candle_t < current_1d_to:
             if not self.current_1d_candle:
                 self.current_1d_candle = candle
             else:
                 self.current_1d_candle = as_1_candle([self.current_1d_candle, candle])
-        elif prev_1d_from <= to_utc_datetime(candle[5]) < prev_1d_to:
-            if to_utc_datetime(self.current_1d_candle[5]) != current_1d_from:
+        elif prev_1d_from <= candle_t < prev_1d_to:
+            if tc.parse(self.current_1d_candle[5]) != current_1d_from:
                 self.prev_1d_candle = as_1_candle([self.current_1d_candle, candle])
                 self.current_1d_candle = None
 
-        if current_1w_from <= to_utc_datetime(candle[5]) < current_1w_to:
+        if current_1w_from <= candle_t < current_1w_to:
             if not self.current_1w_candle:
                 self.current_1w_candle = candle
             else:
                 self.current_1w_candle = as_1_candle([self.current_1w_candle, candle])
-        elif prev_1w_from <= to_utc_datetime(candle[5]) < prev_1w_to:
-            if to_utc_datetime(self.current_1w_candle[5]) != current_1w_from:
+        elif prev_1w_from <= candle_t < prev_1w_to:
+            if tc.parse(self.current_1w_candle[5]) != current_1w_from:
                 self.prev_1w_candle = as_1_candle([self.current_1w_candle, candle])
                 self.current_1w_candle = None
 
-        if current_1month_from <= to_utc_datetime(candle[5]) < current_1month_to:
+        if current_1month_from <= candle_t < current_1month_to:
             if not self.current_1month_candle:
                 self.current_1month_candle = candle
             else:
                 self.current_1month_candle = as_1_candle([self.current_1month_candle, candle])
-        elif prev_1month_from <= to_utc_datetime(candle[5]) < prev_1month_to:
-            if to_utc_datetime(self.current_1month_candle[5]) != current_1month_from:
+        elif prev_1month_from <= candle_t < prev_1month_to:
+            if tc.parse(self.current_1month_candle[5]) != current_1month_from:
                 self.prev_1month_candle = as_1_candle([self.current_1month_candle, candle])
                 self.current_1month_candle = None
 
-        if current_year_from <= to_utc_datetime(candle[5]) < current_year_to:
+        if current_year_from <= candle_t < current_year_to:
             if not self.current_year_candle:
                 self.current_year_candle = candle
             else:
                 self.current_year_candle = as_1_candle([self.current_year_candle, candle])
 
-            self.prev_year = (
-                self.prev_year[0], self.prev_year[1], self.prev_year[2],
-                (self.prev_year[3][0], self.prev_year[3][1] or self.prev_year[3][0] < candle[1]),
-                (self.prev_year[4][0], self.prev_year[4][1] or candle[2] <= self.prev_year[4][0] <= candle[1]),
-                (self.prev_year[5][0], self.prev_year[5][1] or self.prev_year[5][0] > candle[2])
-            )
-        elif prev_year_from <= to_utc_datetime(candle[5]) < prev_year_to:
-            if to_utc_datetime(self.current_year_candle[5]) != current_year_from:
+            py = self.prev_year
+            high_swept, half_swept, low_swept = \
+                py[3][1] or py[3][0] < candle[1], py[4][1] or candle[2] <= py[4][0] <= candle[1], \
+                py[5][1] or py[5][0] > candle[2]
+            if high_swept != py[3][1] or half_swept != py[4][1] or low_swept != py[5][1]:  # rebuild on a sweep
+                self.prev_year = (
+                    py[0], py[1], py[2], (py[3][0], high_swept), (py[4][0], half_swept), (py[5][0], low_swept)
+                )
+        elif prev_year_from <= candle_t < prev_year_to:
+            if tc.parse(self.current_year_candle[5]) != current_year_from:
                 current_year = as_1_candle([self.current_year_candle, candle])
                 self.prev_year = (
-                    to_date_str(prev_year_from), to_date_str(prev_year_to), True,
+                    tc.format(prev_year_from), tc.format(prev_year_to), True,
                     (current_year[1], False),
                     ((current_year[1] + current_year[2]) / 2, False),
                     (current_year[2], False)
                 )
                 self.current_year_candle = None
 
+    def plus_15m_quarters(self, candle: InnerCandle, candle_t, snapshot_t, prev_quarters, new_quarters):
+        tc = time_core()
+        high, low = candle[1], candle[2]
+        for kind, (ranges_fn, _, true_open_field) in enumerate(QUARTER_KINDS):
+            ranges, true_open = getattr(tc, ranges_fn)(snapshot_t)
+            for field, from_, to in _quarter_fields(kind, ranges):
+                ql = getattr(self, field)
+                if from_ <= candle_t < to:
+                    new_high, new_low = (max(ql[3][0], high), min(ql[5][0], low)) if ql else (high, low)
+                    date_start, date_end = _range_dates(tc.format, from_, to)
+                    if isinstance(ql, tuple) and ql[3] == (new_high, False) and ql[5] == (new_low, False) \
+                            and ql[4] == ((new_high + new_low) / 2, False) and ql[2] == (to < snapshot_t) \
+                            and ql[0] == date_start and ql[1] == date_end:
+                        continue  # inside the quarter's range so far, the same tuple (json loaded ones are lists)
+                    setattr(self, field, (
+                        date_start, date_end, to < snapshot_t,
+                        (new_high, False), ((new_high + new_low) / 2, False), (new_low, False)
+                    ))
+                elif ql and not (ql[3][1] and ql[4][1] and ql[5][1]):
+                    high_swept, half_swept, low_swept = \
+                        ql[3][1] or ql[3][0] < high, ql[4][1] or low <= ql[4][0] <= high, ql[5][1] or ql[5][0] > low
+                    if high_swept != ql[3][1] or half_swept != ql[4][1] or low_swept != ql[5][1]:  # rebuild on a sweep
+                        setattr(self, field, (
+                            ql[0], ql[1], ql[2], (ql[3][0], high_swept), (ql[4][0], half_swept), (ql[5][0], low_swept)
+                        ))
+
+            prev, new = prev_quarters[kind], new_quarters[kind]
+            if prev != new and (kind, prev) in QUARTER_ROLLS and (prev, new) != (MonthWeek.MW4, MonthWeek.MW5):
+                reset_fields, opens = QUARTER_ROLLS[(kind, prev)]
+                for field in reset_fields:
+                    setattr(self, field, None)
+                if opens is not None:
+                    setattr(self, true_open_field, (candle[3], self.snapshot_date_readable) if opens else None)
+
+            if candle_t == true_open:
+                setattr(self, true_open_field, (candle[0], candle[5]))
+
     def populate(self, reverse_15m_gen: Candles15mGenerator):
         self.prev_15m_candle = next(reverse_15m_gen)
         self.candles_15m.appendleft(self.prev_15m_candle)
@@ -650,143 +557,131 @@ class Asset:
         highest_sweep = self.prev_15m_candle[1]
         lowest_sweep = self.prev_15m_candle[2]
 
-        self.snapshot_date_readable = to_date_str(to_utc_datetime(self.prev_15m_candle[5]) + timedelta(minutes=15))
-
-        prev_30m_from, prev_30m_to = get_prev_30m_from_to(self.snapshot_date_readable)
-        current_30m_from, current_30m_to = get_current_30m_from_to(self.snapshot_date_readable)
-        prev_1h_from, prev_1h_to = get_prev_1h_from_to(self.snapshot_date_readable)
-        current_1h_from, current_1h_to = get_current_1h_from_to(self.snapshot_date_readable)
-        prev_2h_from, prev_2h_to = get_prev_2h_from_to(self.snapshot_date_readable)
-        current_2h_from, current_2h_to = get_current_2h_from_to(self.snapshot_date_readable)
-        prev_4h_from, prev_4h_to = get_prev_4h_from_to(self.snapshot_date_readable)
-        current_4h_from, current_4h_to = get_current_4h_from_to(self.snapshot_date_readable)
-        prev_1d_from, prev_1d_to = get_prev_1d_from_to(self.snapshot_date_readable)
-        current_1d_from, current_1d_to = get_current_1d_from_to(self.snapshot_date_readable)
-        prev_1w_from, prev_1w_to = get_prev_1w_from_to(self.snapshot_date_readable)
-        current_1w_from, current_1w_to = get_current_1w_from_to(self.snapshot_date_readable)
-        prev_1month_from, prev_1month_to = get_prev_1month_from_to(self.snapshot_date_readable)
-        current_1month_from, current_1month_to = get_current_1month_from_to(self.snapshot_date_readable)
-
-        prev_year_from, prev_year_to = prev_year_ranges(self.snapshot_date_readable)
-        current_year_from, current_year_to = current_year_ranges(self.snapshot_date_readable)
-
-        ranges_90m, t90mo = quarters90m_ranges(self.snapshot_date_readable)
+        tc = time_core()
+        last_t = tc.parse(self.prev_15m_candle[5])
+        snapshot_t = last_t + tc.minutes(15)
+        self.snapshot_date_readable = tc.format(snapshot_t)
+
+        prev_30m_from, prev_30m_to = tc.get_prev_30m_from_to(snapshot_t)
+        current_30m_from, current_30m_to = tc.get_current_30m_from_to(snapshot_t)
+        prev_1h_from, prev_1h_to = tc.get_prev_1h_from_to(snapshot_t)
+        current_1h_from, current_1h_to = tc.get_current_1h_from_to(snapshot_t)
+        prev_2h_from, prev_2h_to = tc.get_prev_2h_from_to(snapshot_t)
+        current_2h_from, current_2h_to = tc.get_current_2h_from_to(snapshot_t)
+        prev_4h_from, prev_4h_to = tc.get_prev_4h_from_to(snapshot_t)
+        current_4h_from, current_4h_to = tc.get_current_4h_from_to(snapshot_t)
+        prev_1d_from, prev_1d_to = tc.get_prev_1d_from_to(snapshot_t)
+        current_1d_from, current_1d_to = tc.get_current_1d_from_to(snapshot_t)
+        prev_1w_from, prev_1w_to = tc.get_prev_1w_from_to(snapshot_t)
+        current_1w_from, current_1w_to = tc.get_current_1w_from_to(snapshot_t)
+        prev_1month_from, prev_1month_to = tc.get_prev_1month_from_to(snapshot_t)
+        current_1month_from, current_1month_to = tc.get_current_1month_from_to(snapshot_t)
+
+        prev_year_from, prev_year_to = tc.prev_year_ranges(snapshot_t)
+        current_year_from, current_year_to = tc.current_year_ranges(snapshot_t)
+
+        ranges_90m, t90mo = tc.quarters90m_ranges(snapshot_t)
         sweeps_90m = []
         cum_90m_quarters = []
         for rng_90m in ranges_90m:
-            if rng_90m[1] <= to_utc_datetime(self.prev_15m_candle[5]) < rng_90m[2]:
+            if rng_90m[1] <= last_t < rng_90m[2]:
                 sweeps_90m.append(None)
                 cum_90m_quarters.append(self.prev_15m_candle)
             else:
                 cum_90m_quarters.append(None)
                 sweeps_90m.append((highest_sweep, lowest_sweep))
 
-        ranges_dq, tdo = day_quarters_ranges(self.snapshot_date_readable)
+        ranges_dq, tdo = tc.day_quarters_ranges(snapshot_t)
         sweeps_dq = []
         cum_dq_quarters = []
         for rng_dq in ranges_dq:
-            if rng_dq[1] <= to_utc_datetime(self.prev_15m_candle[5]) < rng_dq[2]:
+            if rng_dq[1] <= last_t < rng_dq[2]:
                 sweeps_dq.append(None)
                 cum_dq_quarters.append(self.prev_15m_candle)
             else:
                 cum_dq_quarters.append(None)
                 sweeps_dq.append((highest_sweep, lowest_sweep))
 
-        ranges_wd, two = weekday_ranges(self.snapshot_date_readable)
+        ranges_wd, two = tc.weekday_ranges(snapshot_t)
         sweeps_wd = []
         cum_wd_quarters = []
         for rng_wd in ranges_wd:
-            if rng_wd[1] <= to_utc_datetime(self.prev_15m_candle[5]) < rng_wd[2]:
+            if rng_wd[1] <= last_t < rng_wd[2]:
                 sweeps_wd.append(None)
                 cum_wd_quarters.append(self.prev_15m_candle)
             else:
                 cum_wd_quarters.append(None)
                 sweeps_wd.append((highest_sweep, lowest_sweep))
 
-        ranges_mw, tmo = month_week_quarters_ranges(self.snapshot_date_readable)
+        ranges_mw, tmo = tc.month_week_quarters_ranges(snapshot_t)
         sweeps_mw = []
         cum_mw_quarters = []
         for rng_mw in ranges_mw:
-            if rng_mw[1] <= to_utc_datetime(self.prev_15m_candle[5]) < rng_mw[2]:
+            if rng_mw[1] <= last_t < rng_mw[2]:
                 sweeps_mw.append(None)
                 cum_mw_quarters.append(self.prev_15m_candle)
             else:
                 cum_mw_quarters.append(None)
                 sweeps_mw.append((highest_sweep, lowest_sweep))
 
-        ranges_yq, tyo = year_quarters_ranges(self.snapshot_date_readable)
+        ranges_yq, tyo = tc.year_quarters_ranges(snapshot_t)
         sweeps_yq = []
         cum_yq_quarters = []
         for rng_yq in ranges_yq:
-            if rng_yq[1] <= to_utc_datetime(self.prev_15m_candle[5]) < rng_yq[2]:
+            if rng_yq[1] <= last_t < rng_yq[2]:
                 sweeps_yq.append(None)
                 cum_yq_quarters.append(self.prev_15m_candle)
             else:
                 cum_yq_quarters.append(None)
                 sweeps_yq.append((highest_sweep, lowest_sweep))
 
-        self.prev_30m_candle = self.prev_15m_candle if prev_30m_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_30m_to else None
-        self.current_30m_candle = self.prev_15m_candle if current_30m_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_30m_to else None
-
-        self.prev_1h_candle = self.prev_15m_candle if prev_1h_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_1h_to else None
-        self.current_1h_candle = self.prev_15m_candle if current_1h_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_1h_to else None
-
-        self.prev_2h_candle = self.prev_15m_candle if prev_2h_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_2h_to else None
-        self.current_2h_candle = self.prev_15m_candle if current_2h_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_2h_to else None
-
-        self.prev_4h_candle = self.prev_15m_candle if prev_4h_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_4h_to else None
-        self.current_4h_candle = self.prev_15m_candle if current_4h_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_4h_to else None
-
-        self.prev_1d_candle = self.prev_15m_candle if prev_1d_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_1d_to else None
-        self.current_1d_candle = self.prev_15m_candle if current_1d_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_1d_to else None
-
-        self.prev_1w_candle = self.prev_15m_candle if prev_1w_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_1w_to else None
-        self.current_1w_candle = self.prev_15m_candle if current_1w_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_1w_to else None
-
-        self.prev_1month_candle = self.prev_15m_candle if prev_1month_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < prev_1month_to else None
-        self.current_1month_candle = self.prev_15m_candle if current_1month_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_1month_to else None
-
-        if prev_year_from <= to_utc_datetime(self.prev_15m_candle[5]) < prev_year_to:
+        self.prev_30m_candle = self.prev_15m_candle if prev_30m_from <= last_t < prev_30m_to else None
+        self.current_30m_candle = self.prev_15m_candle if current_30m_from <= last_t < current_30m_to else None
+
+        self.prev_1h_candle = self.prev_15m_candle if prev_1h_from <= last_t < prev_1h_to else None
+        self.current_1h_candle = self.prev_15m_candle if current_1h_from <= last_t < current_1h_to else None
+
+        self.prev_2h_candle = self.prev_15m_candle if prev_2h_from <= last_t < prev_2h_to else None
+        self.current_2h_candle = self.prev_15m_candle if current_2h_from <= last_t < current_2h_to else None
+
+        self.prev_4h_candle = self.prev_15m_candle if prev_4h_from <= last_t < prev_4h_to else None
+        self.current_4h_candle = self.prev_15m_candle if current_4h_from <= last_t < current_4h_to else None
+
+        self.prev_1d_candle = self.prev_15m_candle if prev_1d_from <= last_t < prev_1d_to else None
+        self.current_1d_candle = self.prev_15m_candle if current_1d_from <= last_t < current_1d_to else None
+
+        self.prev_1w_candle = self.prev_15m_candle if prev_1w_from <= last_t < prev_1w_to else None
+        self.current_1w_candle = self.prev_15m_candle if current_1w_from <= last_t < current_1w_to else None
+
+        self.prev_1month_candle = self.prev_15m_candle if prev_1month_from <= last_t < prev_1month_to else None
+        self.current_1month_candle = self.prev_15m_candle if current_1month_from <= last_t < current_1month_to else None
+
+        if prev_year_from <= last_t < prev_year_to:
             prev_year_sweeps = None
             cum_prev_year = self.prev_15m_candle
         else:
             prev_year_sweeps = (highest_sweep, lowest_sweep)
             cum_prev_year = None
 
-        self.current_year_candle = self.prev_15m_candle if current_year_from <= to_utc_datetime(
-            self.prev_15m_candle[5]) < current_year_to else None
+        self.current_year_candle = self.prev_15m_candle if current_year_from <= last_t < current_year_to else None
 
         while True:
             prev_candle = next(reverse_15m_gen)
             self.candles_15m.appendleft(prev_candle)
             if len(self.candles_15m) % (4 * 24 * 90) == 0:
                 log_info_ny(f"populated {len(self.candles_15m) // (4 * 24)} days for {self.symbol}")
-            pc_date = to_utc_datetime(prev_candle[5])
-
-            if prev_candle[5] == t90mo:
-                self.true_90m_open = (prev_candle[0], t90mo)
-            if prev_candle[5] == tdo:
-                self.true_do = (prev_candle[0], tdo)
-            if prev_candle[5] == two:
-                self.true_wo = (prev_candle[0], two)
-            if prev_candle[5] == tmo:
-                self.true_mo = (prev_candle[0], tmo)
-            if prev_candle[5] == tyo:
-                self.true_yo = (prev_candle[0], tyo)
+            pc_date = tc.parse(prev_candle[5])
+
+            if pc_date == t90mo:
+                self.true_90m_open = (prev_candle[0], prev_candle[5])
+            if pc_date == tdo:
+                self.true_do = (prev_candle[0], prev_candle[5])
+            if pc_date == two:
+                self.true_wo = (prev_candle[0], prev_candle[5])
+            if pc_date == tmo:
+                self.true_mo = (prev_candle[0], prev_candle[5])
+            if pc_date == tyo:
+                self.true_yo = (prev_candle[0], prev_candle[5])
 
             if pc_date >= ranges_90m[0][1]:
                 for i in range(len(ranges_90m)):
@@ -798,8 +693,8 @@ class Asset:
                         if ranges_90m[i][1] == pc_date:
                             half = (cum_90m_quarters[i][1] + cum_90m_quarters[i][2]) / 2
                             self.q90m_set(ranges_90m[i][0], (
-                                cum_90m_quarters[i][5], to_date_str(ranges_90m[i][2]),
-                                ranges_90m[i][2] < to_utc_datetime(self.snapshot_date_readable),
+                                cum_90m_quarters[i][5], tc.format(ranges_90m[i][2]),
+                                ranges_90m[i][2] < snapshot_t,
                                 (cum_90m_quarters[i][1],
                                  False if not sweeps_90m[i] else cum_90m_quarters[i][1] < sweeps_90m[i][0]),
                                 (half, False if not sweeps_90m[i] else sweeps_90m[i][1] <= half <= sweeps_90m[i][0]),
@@ -817,8 +712,8 @@ class Asset:
                         if ranges_dq[i][1] == pc_date:
                             half = (cum_dq_quarters[i][1] + cum_dq_quarters[i][2]) / 2
                             self.dq_set(ranges_dq[i][0], (
-                                cum_dq_quarters[i][5], to_date_str(ranges_dq[i][2]),
-                                ranges_dq[i][2] < to_utc_datetime(self.snapshot_date_readable),
+                                cum_dq_quarters[i][5], tc.format(ranges_dq[i][2]),
+                                ranges_dq[i][2] < snapshot_t,
                                 (cum_dq_quarters[i][1],
                                  False if not sweeps_dq[i] else cum_dq_quarters[i][1] < sweeps_dq[i][0]),
                                 (half, False if not sweeps_dq[i] else sweeps_dq[i][1] <= half <= sweeps_dq[i][0]),
@@ -836,8 +731,8 @@ class Asset:
                         if ranges_wd[i][1] == pc_date:
                             half = (cum_wd_quarters[i][1] + cum_wd_quarters[i][2]) / 2
                             self.wd_set(ranges_wd[i][0], (
-                                cum_wd_quarters[i][5], to_date_str(ranges_wd[i][2]),
-                                ranges_wd[i][2] < to_utc_datetime(self.snapshot_date_readable),
+                                cum_wd_quarters[i][5], tc.format(ranges_wd[i][2]),
+                                ranges_wd[i][2] < snapshot_t,
                                 (cum_wd_quarters[i][1],
                                  False if not sweeps_wd[i] else cum_wd_quarters[i][1] < sweeps_wd[i][0]),
                                 (half, False if not sweeps_wd[i] else sweeps_wd[i][1] <= half <= sweeps_wd[i][0]),
@@ -855,8 +750,8 @@ class Asset:
                         if ranges_mw[i][1] == pc_date:
                             half = (cum_mw_quarters[i][1] + cum_mw_quarters[i][2]) / 2
                             self.mw_set(ranges_mw[i][0], (
-                                cum_mw_quarters[i][5], to_date_str(ranges_mw[i][2]),
-                                ranges_mw[i][2] < to_utc_datetime(self.snapshot_date_readable),
+                                cum_mw_quarters[i][5], tc.format(ranges_mw[i][2]),
+                                ranges_mw[i][2] < snapshot_t,
                                 (cum_mw_quarters[i][1],
                                  False if not sweeps_mw[i] else cum_mw_quarters[i][1] < sweeps_mw[i][0]),
                                 (half, False if not sweeps_mw[i] else sweeps_mw[i][1] <= half <= sweeps_mw[i][0]),
@@ -874,8 +769,8 @@ class Asset:
                         if ranges_yq[i][1] == pc_date:
                             half = (cum_yq_quarters[i][1] + cum_yq_quarters[i][2]) / 2
                             self.yq_set(ranges_yq[i][0], (
-                                cum_yq_quarters[i][5], to_date_str(ranges_yq[i][2]),
-                                ranges_yq[i][2] < to_utc_datetime(self.snapshot_date_readable),
+                                cum_yq_quarters[i][5], tc.format(ranges_yq[i][2]),
+                                ranges_yq[i][2] < snapshot_t,
                                 (cum_yq_quarters[i][1],
                                  False if not sweeps_yq[i] else cum_yq_quarters[i][1] < sweeps_yq[i][0]),
                                 (half, False if not sweeps_yq[i] else sweeps_yq[i][1] <= half <= sweeps_yq[i][0]),
@@ -926,17 +821,14 @@ class Asset:
                     self.current_1w_candle = prev_candle if not self.current_1w_candle else as_1_candle(
                         [prev_candle, self.current_1w_candle])
 
-                if prev_1month_from <= to_utc_datetime(
-                        prev_candle[5]) < prev_1month_to:
+                if prev_1month_from <= pc_date < prev_1month_to:
                     self.prev_1month_candle = prev_candle if not self.prev_1month_candle else as_1_candle(
                         [prev_candle, self.prev_1month_candle])
-                if current_1month_from <= to_utc_datetime(
-                        prev_candle[5]) < current_1month_to:
+                if current_1month_from <= pc_date < current_1month_to:
                     self.current_1month_candle = prev_candle if not self.current_1month_candle else as_1_candle(
                         [prev_candle, self.current_1month_candle])
 
-            if current_year_from <= to_utc_datetime(
-                    prev_candle[5]) < current_year_to:
+            if current_year_from <= pc_date < current_year_to:
                 self.current_year_candle = prev_candle if not self.current_year_candle else as_1_candle(
                     [prev_candle, self.current_year_candle])
 
@@ -948,8 +840,8 @@ class Asset:
                 if prev_year_from == pc_date:
                     half = (cum_prev_year[1] + cum_prev_year[2]) / 2
                     self.prev_year = (
-                        to_date_str(prev_year_from), to_date_str(prev_year_to),
-                        prev_year_to < to_utc_datetime(self.snapshot_date_readable),
+                        tc.format(prev_year_from), tc.format(prev_year_to),
+                        prev_year_to < snapshot_t,
                         (cum_prev_year[1], False if not prev_year_sweeps else cum_prev_year[1] < prev_year_sweeps[0]),
                         (half, False if not prev_year_sweeps else prev_year_sweeps[1] <= half <= prev_year_sweeps[0]),
                         (cum_prev_year[2], False if not prev_year_sweeps else cum_prev_year[2] > prev_year_sweeps[1])
@@ -960,12 +852,140 @@ class Asset:
 
             if pc_date <= prev_year_from:
                 break
-        self.candles_1h = as_1h_candles(list(self.candles_15m))
-        self.candles_4h = as_4h_candles(list(self.candles_15m))
-        self.candles_1d = as_1d_candles(list(self.candles_15m))
+        candles_15m = list(self.candles_15m)
+        self.candles_1h = candle_series(as_1h_candles(candles_15m))
+        self.candles_4h = candle_series(as_4h_candles(candles_15m))
+        self.candles_1d = candle_series(as_1d_candles(candles_15m))
         self.recalc_trends()
         log_info_ny(f"populated {len(self.candles_15m) // (4 * 24)} days for {self.symbol}")
 
+    def populate_from_history(self, history: List[InnerCandle]):
+        # same state as populate(reversed(history)), from the columns instead of a candle by candle walk back
+        history = candle_series(history)
+        tc = epoch_time_core
+        epochs = history.epochs
+        snapshot_t = int(epochs[-1]) + tc.minutes(15)
+        prev_year_from, prev_year_to = tc.prev_year_ranges(snapshot_t)
+
+        # populate stops walking back at the first candle not after the previous year start
+        first = max(int(np.searchsorted(epochs, prev_year_from, "right")) - 1, 0)
+        history = candle_series_from_columns(history.columns[:, first:], epochs[first:])
+        bootstrap = _Bootstrap(history, snapshot_t)
+
+        self.candles_15m = history
+        self.prev_15m_candle = history[-1]
+        self.snapshot_date_readable = tc.format(snapshot_t)
+
+        month_from = tc.get_prev_1month_from_to(snapshot_t)[0]  # populate folds htf candles from there only
+        self.prev_30m_candle = bootstrap.folded(*tc.get_prev_30m_from_to(snapshot_t), month_from)
+        self.current_30m_candle = bootstrap.folded(*tc.get_current_30m_from_to(snapshot_t), month_from)
+        self.prev_1h_candle = bootstrap.folded(*tc.get_prev_1h_from_to(snapshot_t), month_from)
+        self.current_1h_candle = bootstrap.folded(*tc.get_current_1h_from_to(snapshot_t), month_from)
+        self.prev_2h_candle = bootstrap.folded(*tc.get_prev_2h_from_to(snapshot_t), month_from)
+        self.current_2h_candle = bootstrap.folded(*tc.get_current_2h_from_to(snapshot_t), month_from)
+        self.prev_4h_candle = bootstrap.folded(*tc.get_prev_4h_from_to(snapshot_t), month_from)
+        self.current_4h_candle = bootstrap.folded(*tc.get_current_4h_from_to(snapshot_t), month_from)
+        self.prev_1d_candle = bootstrap.folded(*tc.get_prev_1d_from_to(snapshot_t), month_from)
+        self.current_1d_candle = bootstrap.folded(*tc.get_current_1d_from_to(snapshot_t), month_from)
+        self.prev_1w_candle = bootstrap.folded(*tc.get_prev_1w_from_to(snapshot_t), month_from)
+        self.current_1w_candle = bootstrap.folded(*tc.get_current_1w_from_to(snapshot_t), month_from)
+        self.prev_1month_candle = bootstrap.folded(*tc.get_prev_1month_from_to(snapshot_t), month_from)
+        self.current_1month_candle = bootstrap.folded(*tc.get_current_1month_from_to(snapshot_t), month_from)
+        self.current_year_candle = bootstrap.folded(*tc.current_year_ranges(snapshot_t))
+
+        for ranges_fn, ql_set, true_open_field in [
+            (tc.quarters90m_ranges, self.q90m_set, "true_90m_open"),
+            (tc.day_quarters_ranges, self.dq_set, "true_do"),
+            (tc.weekday_ranges, self.wd_set, "true_wo"),
+            (tc.month_week_quarters_ranges, self.mw_set, "true_mo"),
+            (tc.year_quarters_ranges, self.yq_set, "true_yo"),
+        ]:
+            ranges, true_open = ranges_fn(snapshot_t)
+            for quarter, ql in bootstrap.quarter_liqs(ranges):
+                ql_set(quarter, ql)
+            true_open_candle = bootstrap.true_open(true_open)
+            if true_open_candle:
+                setattr(self, true_open_field, true_open_candle)
+
+        for _, ql in bootstrap.quarter_liqs([(None, prev_year_from, prev_year_to)]):
+            self.prev_year = ql
+
+        self.candles_1h = resample_batch(history, "1h")
+        self.candles_4h = resample_batch(history, "4h")
+        self.candles_1d = resample_batch(history, "1d")
+        self.recalc_trends()
+        log_info_ny(f"populated {len(self.candles_15m) // (4 * 24)} days for {self.symbol}")
+
+
+class _Bootstrap:
+    # populate's walk back in columns: the candles after the i-th one are the ones it has walked over when at i
+    def __init__(self, history: CandleSeries, snapshot_t: int):
+        self.history, self.snapshot_t = history, snapshot_t
+        self.epochs, self.highs, self.lows = history.epochs, history.highs, history.lows
+        self.last = len(history) - 1
+        # highest/lowest sweep of populate: max/min of the candles after i, the last candle sees itself
+        self.highs_after = np.append(np.maximum.accumulate(self.highs[:0:-1])[::-1], self.highs[-1])
+        self.lows_after = np.append(np.minimum.accumulate(self.lows[:0:-1])[::-1], self.lows[-1])
+
+    def _index(self, t: int, side: str = "left") -> int:
+        return int(np.searchsorted(self.epochs, t, side))
+
+    def folded(self, from_: int, to: int, walk_from: Optional[int] = None) -> Optional[InnerCandle]:
+        # as_1_candle([candle, cum]) from the last candle in range back, rounding the volume on every step
+        a, b = self._index(from_ if walk_from is None else max(from_, walk_from)), self._index(to)
+        if a >= b:
+            return None
+        volume = float(self.history.volumes[b - 1])
+        for v in self.history.volumes[a:b - 1][::-1].tolist():
+            volume = round(v + volume, 3)
+        return (float(self.history.opens[a]), float(self.highs[a:b].max()), float(self.lows[a:b].min()),
+                float(self.history.closes[b - 1]), volume, self.history.date(a))
+
+    def true_open(self, t: Optional[int]) -> Optional[PriceDate]:
+        i = self.last if t is None else self._index(t)
+        if i >= self.last or self.epochs[i] != t:  # the last candle is never checked for true opens
+            return None
+        return float(self.history.opens[i]), self.history.date(i)
+
+    def quarter_liqs(self, ranges: List[Tuple[any, int, int]]) -> List[Tuple[any, QuarterLiq]]:
+        # in populate's set order: later quarter starts first, so the earliest start of a quarter is kept
+        last_t, walk_from = int(self.epochs[-1]), ranges[0][1]
+        res = []
+        for i in sorted(range(len(ranges)), key=lambda x: (-ranges[x][1], x)):
+            quarter, from_, to = ranges[i]
+            start, end = self._index(from_), self._index(to)
+            if from_ < walk_from or start >= self.last or self.epochs[start] != from_:
+                continue  # populate sets a quarter on its first candle only, never on the last one
+            high, low = float(self.highs[start:end].max()), float(self.lows[start:end].min())
+            half = (high + low) / 2
+
+            if from_ <= last_t < to:
+                sweeps = None
+            else:  # frozen on the first walked candle after the quarter end
+                i_sweep = min(max(self._index(to, "right"), self._index(walk_from)), self.last)
+                sweeps = float(self.highs_after[i_sweep]), float(self.lows_after[i_sweep])
+            res.append((quarter, (
+                epoch_time_core.format(from_), epoch_time_core.format(to), to < self.snapshot_t,
+                (high, False if not sweeps else high < sweeps[0]),
+                (half, False if not sweeps else sweeps[1] <= half <= sweeps[0]),
+                (low, False if not sweeps else low > sweeps[1])
+            )))
+        return res
+
+
+def _get_trends(asset: Asset) -> Trends:
+    if asset.stale_trends:
+        asset.recalc_trends(asset.stale_trends)
+    return asset._trends
+
+
+def _set_trends(asset: Asset, trends: Trends):
+    asset._trends, asset.stale_trends = trends, set()
+
+
+# replaces the trends field (see Asset): asdict, json and == see up to date trends, plus_15m only marks them stale
+Asset.trends = property(_get_trends, _set_trends)
+
 
 def new_empty_trends() -> Trends:
     return Trends(
@@ -988,10 +1008,10 @@ def new_empty_asset(symbol: str) -> Asset:
     return Asset(
         symbol=symbol,
         snapshot_date_readable="",
-        candles_15m=deque(),
-        candles_1h=[],
-        candles_4h=[],
-        candles_1d=[],
+        candles_15m=new_empty_candle_series(),
+        candles_1h=new_empty_candle_series(),
+        candles_4h=new_empty_candle_series(),
+        candles_1d=new_empty_candle_series(),
         trends=new_empty_trends(),
         prev_year=None,
         year_q4=None,
@@ -1046,6 +1066,41 @@ def new_empty_asset(symbol: str) -> Asset:
     )
 
 
+def _as_tuples(value):  # json arrays back to the QuarterLiq/PriceDate/InnerCandle tuples
+    return tuple(_as_tuples(x) for x in value) if isinstance(value, list) else value
+
+
+def dict_from_asset(asset: Asset, with_candles: bool = True) -> Dict[str, any]:
+    # asdict(asset) without deep copies of the candle buffers, candles as lists of InnerCandle
+    result = {}
+    for f in fields(Asset):
+        value = getattr(asset, f.name)
+        if f.name in ASSET_CANDLE_FIELDS:
+            if not with_candles:
+                continue
+            value = list(value)
+        elif f.name == "trends":
+            value = asdict(value)
+        result[f.name] = value
+    return result
+
+
+def asset_from_dict(d: Dict[str, any]) -> Asset:  # dict_from_asset or its json, fields it doesn't have stay empty
+    asset = new_empty_asset(d["symbol"])
+    for f in fields(Asset):
+        if f.name not in d:
+            continue
+        value = d[f.name]
+        if f.name in ASSET_CANDLE_FIELDS:
+            value = candle_series(value if isinstance(value, CandleSeries) else [tuple(c) for c in value])
+        elif f.name == "trends":
+            value = value if isinstance(value, Trends) else Trends.from_dict(value)
+        else:
+            value = _as_tuples(value)
+        setattr(asset, f.name, value)
+    return asset
+
+
 def example_generator(symbol) -> Candles15mGenerator:
     candles = select_multiyear_candles_15m(symbol, "2024-01-01 00:00", "2025-09-14 00:00")
 
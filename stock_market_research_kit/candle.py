@@ -1,7 +1,10 @@
-from typing import TypeAlias, Tuple, List, Callable
+from typing import TypeAlias, Tuple, List, Callable, Iterator, Union, Optional, Dict
+
+import numpy as np
 
 from utils.date_utils import to_utc_datetime, get_current_30m_from_to, get_current_1h_from_to, get_current_2h_from_to, \
-    get_current_4h_from_to, get_current_1d_from_to, get_current_1w_from_to
+    get_current_4h_from_to, get_current_1d_from_to, get_current_1w_from_to, to_epoch, epoch_to_date_str, \
+    ny_quarter_buckets
 
 InnerCandle: TypeAlias = Tuple[float, float, float, float, float, str]
 
@@ -10,10 +13,427 @@ PriceDate: TypeAlias = Tuple[float, str]
 AsCandles: TypeAlias = Callable[[List[InnerCandle]], List[InnerCandle]]
 
 
+class CandleSeries:
+    # List[InnerCandle] stored column-wise: float64 (open, high, low, close, volume) rows and int64 epoch,
+    # growable from both ends; items are InnerCandle tuples, slices are zero-copy views
+    __slots__ = ("_cols", "_epochs", "_start", "_end", "_own", "_resamplers")
+
+    def __init__(self, cols: np.ndarray, epochs: np.ndarray, start: int, end: int, own: bool,
+                 resamplers: Optional[Dict[Tuple[int, str], "CandleResampler"]] = None):
+        self._cols = cols  # shape (5, capacity)
+        self._epochs = epochs
+        self._start = start
+        self._end = end
+        self._own = own  # views never write into the buffer they share, they copy on first write
+        # streaming as_*_candles per (window start epoch, timeframe), shared by the owner and its views
+        self._resamplers = {} if resamplers is None else resamplers
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += self._end - self._start
+        if i < 0 or i >= self._end - self._start:
+            raise IndexError("CandleSeries index out of range")
+        return self._start + i
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[InnerCandle, "CandleSeries", List[InnerCandle]]:
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._end - self._start)
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return CandleSeries(self._cols, self._epochs, self._start + start, self._start + max(start, stop), False,
+                                self._resamplers)
+        j = self._index(i)
+        o, h, l, c, v = self._cols[:, j].tolist()
+        return o, h, l, c, v, epoch_to_date_str(int(self._epochs[j]))
+
+    def __setitem__(self, i: int, candle: InnerCandle):
+        if not self._own:
+            self._grow(0, 0)
+        self._write(self._index(i), candle)
+        self._resamplers.clear()
+
+    def __iter__(self) -> Iterator[InnerCandle]:
+        s, e = self._start, self._end
+        return zip(*self._cols[:, s:e].tolist(), map(epoch_to_date_str, self._epochs[s:e].tolist()))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (CandleSeries, list, tuple)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CandleSeries({list(self)!r})"
+
+    def __reduce__(self):
+        s, e = self._start, self._end
+        return CandleSeries, (self._cols[:, s:e].copy(), self._epochs[s:e].copy(), 0, e - s, True)
+
+    def _write(self, j: int, candle: InnerCandle):
+        cols = self._cols  # scalar stores are ~2x faster than assigning the tuple to a column
+        cols[0, j], cols[1, j], cols[2, j], cols[3, j], cols[4, j] = candle[0], candle[1], candle[2], candle[3], candle[4]
+        self._epochs[j] = to_epoch(candle[5])
+
+    def _grow(self, left: int, right: int):
+        n = self._end - self._start
+        cols = np.empty((5, left + n + right), dtype=np.float64)
+        epochs = np.empty(left + n + right, dtype=np.int64)
+        cols[:, left:left + n] = self._cols[:, self._start:self._end]
+        epochs[left:left + n] = self._epochs[self._start:self._end]
+        if not self._own:
+            self._resamplers = {}
+        self._cols, self._epochs, self._start, self._end, self._own = cols, epochs, left, left + n, True
+
+    def append(self, candle: InnerCandle):
+        if not self._own or self._end == len(self._epochs):
+            self._grow(self._start if self._own else 0, max(self._end - self._start, 16))
+        self._write(self._end, candle)
+        self._end += 1
+
+    def appendleft(self, candle: InnerCandle):
+        if not self._own or self._start == 0:
+            self._grow(max(self._end - self._start, 16), len(self._epochs) - self._end if self._own else 0)
+        self._start -= 1
+        self._write(self._start, candle)
+
+    def epoch(self, i: int) -> int:
+        return int(self._epochs[self._index(i)])
+
+    def date(self, i: int) -> str:
+        return epoch_to_date_str(int(self._epochs[self._index(i)]))
+
+    def resampled(self, timeframe: str) -> List[InnerCandle]:
+        # same as as_<timeframe>_candles(self), but only 15m candles added since the last call are aggregated
+        n = self._end - self._start
+        if n == 0:
+            return []
+        key = (int(self._epochs[self._start]), timeframe)
+        resampler = self._resamplers.get(key)
+        if resampler is None or resampler.consumed > n \
+                or (resampler.consumed > 0 and resampler.last_epoch != self._epochs[self._start + resampler.consumed - 1]):
+            fresh = CandleResampler(timeframe)
+            if resampler is None or resampler.consumed <= n:
+                if len(self._resamplers) >= MAX_CACHED_RESAMPLERS:
+                    del self._resamplers[next(iter(self._resamplers))]
+                self._resamplers[key] = fresh
+            resampler = fresh
+        tail = self[resampler.consumed:]
+        for candle, epoch in zip(tail, tail.epochs.tolist()):
+            resampler.plus_15m(candle, epoch)
+        return list(resampler.candles)
+
+    @property
+    def columns(self) -> np.ndarray:  # (5, n) open, high, low, close, volume
+        return self._cols[:, self._start:self._end]
+
+    @property
+    def opens(self) -> np.ndarray:
+        return self._cols[0, self._start:self._end]
+
+    @property
+    def highs(self) -> np.ndarray:
+        return self._cols[1, self._start:self._end]
+
+    @property
+    def lows(self) -> np.ndarray:
+        return self._cols[2, self._start:self._end]
+
+    @property
+    def closes(self) -> np.ndarray:
+        return self._cols[3, self._start:self._end]
+
+    @property
+    def volumes(self) -> np.ndarray:
+        return self._cols[4, self._start:self._end]
+
+    @property
+    def epochs(self) -> np.ndarray:
+        return self._epochs[self._start:self._end]
+
+
+def new_empty_candle_series() -> CandleSeries:
+    return CandleSeries(np.empty((5, 0), dtype=np.float64), np.empty(0, dtype=np.int64), 0, 0, True)
+
+
+def candle_series_from_columns(columns: np.ndarray, epochs: np.ndarray) -> CandleSeries:  # as CandleSeries.columns
+    return CandleSeries(np.ascontiguousarray(columns, dtype=np.float64), np.ascontiguousarray(epochs, dtype=np.int64),
+                        0, len(epochs), True)
+
+
+def candle_series(candles: List[InnerCandle]) -> CandleSeries:
+    if isinstance(candles, CandleSeries):
+        return candles
+    if len(candles) == 0:
+        return new_empty_candle_series()
+    cols = np.array([c[:5] for c in candles], dtype=np.float64).T.copy()
+    # "%Y-%m-%d %H:%M" utc dates parsed in one pass, to_epoch per candle is most of the time for long histories
+    epochs = np.array([c[5] for c in candles], dtype="datetime64[m]").astype(np.int64) * 60
+    return CandleSeries(cols, epochs, 0, len(candles), True)
+
+
+MAX_CACHED_RESAMPLERS = 512
+RESAMPLE_PERIODS = {"30m": 30 * 60, "1h": 60 * 60, "2h": 2 * 60 * 60, "4h": 4 * 60 * 60, "1d": 24 * 60 * 60}
+
+
+class CandleResampler:
+    # as_<timeframe>_candles of a 15m window that only grows to the right: each new 15m candle updates
+    # the last HTF candle or starts a new one, partial-first-candle rules included
+    __slots__ = ("timeframe", "consumed", "last_epoch", "candles",
+                 "_size", "_aligned", "_count", "_group", "_days", "_scanned", "_group_start", "_months", "_fold")
+
+    def __init__(self, timeframe: str):
+        self.timeframe = timeframe
+        self.consumed = 0  # 15m candles fed
+        self.last_epoch: Optional[int] = None
+        self.candles: List[InnerCandle] = []
+
+        # 30m..1d: fixed-size groups of 15m candles from the first aligned one, preceded by one partial group
+        self._size = RESAMPLE_PERIODS[timeframe] // (15 * 60) if timeframe in RESAMPLE_PERIODS else 0
+        self._aligned = False
+        self._count = 0
+        self._group = [0.0, 0.0, 0.0, 0.0, 0.0, ""]  # open, high, low, close, not rounded volume, date
+
+        # 1w and 1month: regrouped as_1d_candles, as the list functions do
+        self._days = None if self._size else CandleResampler("1d")
+        self._scanned = 0  # days checked for week alignment / folded into months
+        self._group_start: Optional[int] = None  # first day of the open week
+        self._months: List[InnerCandle] = []  # closed months
+        self._fold: Optional[InnerCandle] = None  # closed days of the last month folded with as_1_candle
+
+    def plus_15m(self, candle: InnerCandle, epoch: Optional[int] = None):
+        if epoch is None:
+            epoch = to_epoch(candle[5])
+        self.consumed += 1
+        self.last_epoch = epoch
+
+        match self.timeframe:
+            case "1w":
+                self._days.plus_15m(candle, epoch)
+                self._update_weeks(self._days.candles)
+            case "1month":
+                self._days.plus_15m(candle, epoch)
+                self._update_months(self._days.candles)
+            case _:
+                self._update_group(candle, epoch % RESAMPLE_PERIODS[self.timeframe] == 0)
+
+    def _group_candle(self) -> InnerCandle:
+        g = self._group
+        return g[0], g[1], g[2], g[3], round(g[4], 3), g[5]
+
+    def _add(self, candle: InnerCandle):  # as_1_candle, step by step
+        g = self._group
+        if self._count == 0:
+            g[0], g[1], g[2], g[3], g[4], g[5] = candle[0], candle[1], candle[2], candle[3], 0 + candle[4], candle[5]
+        else:
+            if candle[1] >= g[1]:
+                g[1] = candle[1]
+            if candle[2] <= g[2]:
+                g[2] = candle[2]
+            g[3] = candle[3]
+            g[4] += candle[4]
+        self._count += 1
+
+    def _update_group(self, candle: InnerCandle, is_aligned: bool):
+        if not self._aligned:
+            if not is_aligned:
+                self._add(candle)  # list functions return [] until the first aligned candle
+                return
+            self._aligned = True
+            if self._count > 0:
+                self.candles.append(self._group_candle())
+            self._count = 0
+            self._add(candle)
+            self.candles.append(self._group_candle())
+            return
+
+        if self._count == self._size:
+            self._count = 0
+            self._add(candle)
+            self.candles.append(self._group_candle())
+        else:
+            self._add(candle)
+            self.candles[-1] = self._group_candle()
+
+    def _update_weeks(self, days: List[InnerCandle]):
+        if self._group_start is None:
+            while self._scanned < len(days):  # day dates never change once added
+                if (to_epoch(days[self._scanned][5]) - 4 * 24 * 60 * 60) % (7 * 24 * 60 * 60) == 0:  # monday 00:00
+                    self._group_start = self._scanned
+                    if self._scanned > 0:
+                        self.candles.append(as_1_candle(days[0:self._scanned]))
+                    self.candles.append(days[-1])
+                    break
+                self._scanned += 1
+            if self._group_start is None:
+                return
+
+        while len(days) - self._group_start > 7:
+            self.candles[-1] = as_1_candle(days[self._group_start:self._group_start + 7])
+            self._group_start += 7
+            self.candles.append(days[-1])
+        self.candles[-1] = as_1_candle(days[self._group_start:])
+
+    def _update_months(self, days: List[InnerCandle]):
+        if len(days) == 0:
+            return
+        while self._scanned < len(days) - 1:  # every day except the last one is closed
+            day = days[self._scanned]
+            if self._fold and self._fold[5][0:7] == day[5][0:7]:
+                self._fold = as_1_candle([self._fold, day])
+            else:
+                if self._fold:
+                    self._months.append(self._fold)
+                self._fold = day
+            self._scanned += 1
+
+        day = days[-1]
+        if self._fold and self._fold[5][0:7] == day[5][0:7]:
+            self.candles = [*self._months, as_1_candle([self._fold, day])]
+        elif self._fold:
+            self.candles = [*self._months, self._fold, day]
+        else:
+            self.candles = [*self._months, day]
+
+
+def _round_like_python(values: np.ndarray, ndigits: int) -> np.ndarray:
+    # np.round scales first and can fall on the other side of a half, python round works on the exact value
+    res = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= np.abs(scaled) * 1e-15
+    for i in np.flatnonzero(near_half | (np.abs(scaled) >= 2 ** 52)).tolist():
+        res[i] = round(float(values[i]), ndigits)
+    return res
+
+
+def _sequential_sums(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # left to right sums like the as_1_candle loop (np.add.reduceat sums pairwise, last bits may differ)
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.float64)
+    if len(starts) >= int(lengths.max()):  # many short groups, one vector step per position in group
+        sums = np.zeros(len(starts), dtype=np.float64)
+        for k in range(int(lengths.max())):
+            in_group = lengths > k
+            sums[in_group] += values[starts[in_group] + k]
+        return sums
+    return np.array([np.cumsum(values[s:s + n])[-1] for s, n in zip(starts.tolist(), lengths.tolist())])
+
+
+def _grouped(candles: CandleSeries, starts: np.ndarray) -> CandleSeries:  # as_1_candle of each group
+    if len(starts) == 0:
+        return new_empty_candle_series()
+    ends = np.append(starts[1:], len(candles))
+    cols = np.empty((5, len(starts)), dtype=np.float64)
+    cols[0] = candles.opens[starts]
+    cols[1] = np.maximum.reduceat(candles.highs, starts)
+    cols[2] = np.minimum.reduceat(candles.lows, starts)
+    cols[3] = candles.closes[ends - 1]
+    cols[4] = _round_like_python(_sequential_sums(candles.volumes, starts, ends - starts), 3)
+    return CandleSeries(cols, candles.epochs[starts].copy(), 0, len(starts), True)
+
+
+def _first_aligned(epochs: np.ndarray, period: int, shift: int = 0) -> Optional[int]:
+    for chunk in range(0, len(epochs), 1024):  # the aligned candle is near the start, no need to scan everything
+        aligned = np.flatnonzero((epochs[chunk:chunk + 1024] - shift) % period == 0)
+        if len(aligned):
+            return chunk + int(aligned[0])
+    return None
+
+
+def _chunked(candles: CandleSeries, first: Optional[int], size: int) -> CandleSeries:
+    # partial group before first, then groups of size candles counted from first, like as_1h_candles etc.
+    if first is None:
+        return new_empty_candle_series()
+    n = len(candles)
+    n_full = (n - first) // size
+    full_end = first + n_full * size
+
+    body = np.empty((5, n_full + 2), dtype=np.float64)  # room for the partial prefix and tail groups
+    rows = [col[first:full_end].reshape(n_full, size) for col in
+            (candles.opens, candles.highs, candles.lows, candles.closes, candles.volumes)]
+    body[0, 1:-1] = rows[0][:, 0]
+    body[3, 1:-1] = rows[3][:, -1]
+    if size >= 64:  # long rows: reduce down the columns of a transposed copy, axis 0 sums are left to right too
+        body[1, 1:-1] = rows[1].T.max(axis=0)
+        body[2, 1:-1] = rows[2].T.min(axis=0)
+        volumes = np.ascontiguousarray(rows[4].T).sum(axis=0)
+    else:  # column by column: faster than axis=1 reductions of short rows, sums left to right
+        body[1, 1:-1] = rows[1][:, 0]
+        body[2, 1:-1] = rows[2][:, 0]
+        volumes = rows[4][:, 0].copy()
+        for k in range(1, size):
+            np.maximum(body[1, 1:-1], rows[1][:, k], out=body[1, 1:-1])
+            np.minimum(body[2, 1:-1], rows[2][:, k], out=body[2, 1:-1])
+            volumes += rows[4][:, k]
+    body[4, 1:-1] = _round_like_python(volumes, 3)
+
+    epochs = np.empty(n_full + 2, dtype=np.int64)
+    epochs[1:-1] = candles.epochs[first:full_end:size]
+    if first > 0:
+        body[:, 0], epochs[0] = _one_candle_col(candles, 0, first), candles.epoch(0)
+    if full_end < n:
+        body[:, -1], epochs[-1] = _one_candle_col(candles, full_end, n), candles.epoch(full_end)
+    a, b = (0 if first > 0 else 1), (n_full + 2 if full_end < n else n_full + 1)
+    return CandleSeries(body, epochs, a, b, True)
+
+
+def _one_candle_col(candles: CandleSeries, a: int, b: int) -> List[float]:  # as_1_candle(candles[a:b]) column
+    return [candles.opens[a], candles.highs[a:b].max(), candles.lows[a:b].min(), candles.closes[b - 1],
+            round(float(np.cumsum(candles.volumes[a:b])[-1]), 3)]
+
+
+def _as_months(days: CandleSeries) -> CandleSeries:  # as_1month_candles folds days pairwise with as_1_candle
+    months = days.epochs.astype("datetime64[s]").astype("datetime64[M]")
+    starts = np.flatnonzero(np.append(True, months[1:] != months[:-1]))
+    res = _grouped(days, starts)
+    lengths = np.append(starts[1:], len(days)) - starts
+    volumes = days.volumes[starts].copy()
+    for k in range(1, int(lengths.max()) if len(starts) else 0):
+        in_group = lengths > k
+        volumes[in_group] = _round_like_python(volumes[in_group] + days.volumes[starts[in_group] + k], 3)
+    res.volumes[:] = volumes
+    return res
+
+
+def resample_batch(candles: CandleSeries, timeframe: str) -> CandleSeries:
+    # as_<timeframe>_candles(candles) in one vectorised pass, for whole histories
+    candles = candle_series(candles)
+    if len(candles) == 0:
+        return new_empty_candle_series()
+    match timeframe:
+        case "1w":
+            days = resample_batch(candles, "1d")
+            return _chunked(days, _first_aligned(days.epochs, 7 * 24 * 60 * 60, 4 * 24 * 60 * 60), 7)  # monday
+        case "1month":
+            days = resample_batch(candles, "1d")
+            return _as_months(days) if len(days) else days
+        case _:
+            period = RESAMPLE_PERIODS[timeframe]
+            return _chunked(candles, _first_aligned(candles.epochs, period), period // (15 * 60))
+
+
+NY_QUARTER_KINDS = {"yq": 0, "mw": 1, "wd": 2, "dq": 3, "q90m": 4}
+
+
+def resample_by_ny_quarters(candles: CandleSeries, kind: str) -> CandleSeries:
+    # one as_1_candle per NY year/month week/week day/day quarter (session)/90m quarter, first one may be partial
+    candles = candle_series(candles)
+    if len(candles) == 0:
+        return new_empty_candle_series()
+    buckets = ny_quarter_buckets(candles.epochs, NY_QUARTER_KINDS[kind])
+    return _grouped(candles, np.flatnonzero(np.append(True, buckets[1:] != buckets[:-1])))
+
+
 def as_1_candle(candles: List[InnerCandle]) -> InnerCandle:
     if len(candles) == 0:
         return -1, -1, -1, -1, 0, ""
 
+    if isinstance(candles, CandleSeries):
+        # cumsum adds left to right like the loop below, so volume rounds the same
+        return (float(candles.opens[0]), float(candles.highs.max()), float(candles.lows.min()),
+                float(candles.closes[-1]), round(float(np.cumsum(candles.volumes)[-1]), 3), candles.date(0))
+
     open_, high, low, close, volume, date = candles[0][0], -1, -1, candles[-1][3], 0, candles[0][5]
 
     for _, h, l, _, v, _ in candles:
@@ -29,6 +449,8 @@ def as_1_candle(candles: List[InnerCandle]) -> InnerCandle:
 def as_30m_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("30m")
 
     result = []
     idx_start_of_30m = next(
@@ -62,6 +484,8 @@ def as_30m_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
 def as_1h_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("1h")
 
     result = []
     idx_start_of_1h = next(
@@ -95,6 +519,8 @@ def as_1h_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
 def as_2h_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("2h")
 
     result = []
     idx_start_of_2h = next(
@@ -128,6 +554,8 @@ def as_2h_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
 def as_4h_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("4h")
 
     result = []
     idx_start_of_4h = next(
@@ -161,6 +589,8 @@ def as_4h_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
 def as_1d_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("1d")
 
     result = []
     idx_start_of_day = next(
@@ -194,6 +624,8 @@ def as_1d_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
 def as_1w_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("1w")
 
     candles_1d = as_1d_candles(candles_15m)
 
@@ -229,6 +661,8 @@ def as_1w_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
 def as_1month_candles(candles_15m: List[InnerCandle]) -> List[InnerCandle]:
     if len(candles_15m) == 0:
         return []
+    if isinstance(candles_15m, CandleSeries):
+        return candles_15m.resampled("1month")
 
     candles_1d = as_1d_candles(candles_15m)
 
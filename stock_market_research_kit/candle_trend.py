@@ -1,7 +1,7 @@
 import random
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict
 
 import mplfinance as mpf
 import matplotlib.pyplot as plt
@@ -11,12 +11,12 @@ import pandas
 import pandas as pd
 from scipy.signal import find_peaks
 
-from stock_market_research_kit.candle import as_1d_candles, InnerCandle, as_4h_candles
+from stock_market_research_kit.candle import as_1d_candles, InnerCandle, as_4h_candles, CandleSeries
 from stock_market_research_kit.db_layer import select_multiyear_candles_15m
 from utils.date_utils import random_date, to_date_str, to_utc_datetime
 
 
-@dataclass
+@dataclass(frozen=True)  # shared by TrendTracker windows, Trends snapshots and trades
 class Trend:
     trend: str  # "uptrend"|"downtrend"
     date_from: str
@@ -124,18 +124,22 @@ def _find_trends(
     return res
 
 
-def _peaks(candles: List[InnerCandle]) -> Tuple[List[int], List[int]]:  # highs_idxs, lows_idxs
-    highs = [x[1] for x in candles]
-    lows = [x[2] for x in candles]
+def _peaks(candles: List[InnerCandle] | CandleSeries) -> Tuple[List[int], List[int]]:  # highs_idxs, lows_idxs
+    if isinstance(candles, CandleSeries):
+        highs, lows = candles.highs, candles.lows
+    else:
+        highs = np.array([x[1] for x in candles], dtype=np.float64)
+        lows = np.array([x[2] for x in candles], dtype=np.float64)
 
     highs_idxs, _ = find_peaks(highs, distance=2, prominence=0.3, plateau_size=1)
-    lows_idxs, _ = find_peaks([-x for x in lows], distance=2, prominence=0, plateau_size=1)
+    lows_idxs, _ = find_peaks(-lows, distance=2, prominence=0, plateau_size=1)
 
     return highs_idxs, lows_idxs
 
 
-def find_last_trend(candles: List[InnerCandle]) -> Optional[Trend]:
+def find_last_trend(candles: List[InnerCandle] | CandleSeries) -> Optional[Trend]:
     highs_idxs, lows_idxs = _peaks(candles)
+    candles = list(candles) if isinstance(candles, CandleSeries) else candles  # one pass instead of item by item
     trends = _find_trends([candles[i] for i in highs_idxs], [candles[i] for i in lows_idxs], candles)
 
     last_bos_type, last_bos_date = None, None
@@ -143,23 +147,39 @@ def find_last_trend(candles: List[InnerCandle]) -> Optional[Trend]:
         if trend in ["high_bos", "low_bos"]:
             last_bos_type, last_bos_date = trend, date
         if trend in ["uptrend", "downtrend"]:
-            c_idx = next((i for i in range(len(candles) - 1, -1, -1) if candles[i][5] == date), -1)
-            bos_idx = next((i for i in range(len(candles) - 1, -1, -1) if candles[i][5] == date), -1)
-            t = Trend(
+            date_idxs = {c[5]: i for i, c in enumerate(candles)}  # last index of each date
+            return Trend(
                 trend=trend,
                 date_from=date,
-                length=len(candles) - c_idx - 1,
-                bos_type=None,
-                bos_date=None,
-                bos_ago=None,
+                length=len(candles) - date_idxs.get(date, -1) - 1,
+                bos_type=last_bos_type if last_bos_date else None,
+                bos_date=last_bos_date if last_bos_date else None,
+                bos_ago=len(candles) - date_idxs.get(last_bos_date, -1) - 1 if last_bos_date else None,
             )
-            if last_bos_date:
-                bos_idx = next((i for i in range(len(candles) - 1, -1, -1) if candles[i][5] == last_bos_date), -1)
-                t.bos_type, t.bos_date, t.bos_ago = last_bos_type, last_bos_date, len(candles) - bos_idx - 1
-            return t
     return None
 
 
+class TrendTracker:
+    # find_last_trend of a window sliding over one growing candles list/series. Only the last candle of the series
+    # is ever rewritten (while it is forming), so a window is identified by its first date, length and last candle,
+    # and the trend is recomputed only when the window moved or its forming candle changed
+    MAX_WINDOWS = 2  # closed candles window and the one with the forming candle, they alternate on some ticks
+
+    def __init__(self):
+        self._candles = None
+        self._trends: Dict[Tuple[str, int, InnerCandle], Optional[Trend]] = {}
+
+    def update(self, candles: List[InnerCandle] | CandleSeries, start: int, end: int) -> Optional[Trend]:
+        if candles is not self._candles:
+            self._candles, self._trends = candles, {}
+        key = (candles[start][5], end - start, candles[end - 1])
+        if key not in self._trends:
+            if len(self._trends) >= TrendTracker.MAX_WINDOWS:
+                del self._trends[next(iter(self._trends))]
+            self._trends[key] = find_last_trend(candles[start:end])
+        return self._trends[key]
+
+
 def _show_trends_chart(candles: List[InnerCandle]):
     highs_idxs, lows_idxs = _peaks(candles)
     trends = _find_trends([candles[i] for i in highs_idxs], [candles[i] for i in lows_idxs], candles)
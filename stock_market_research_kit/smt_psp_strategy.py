@@ -1,15 +1,19 @@
-import copy
+import bisect
+import heapq
+import itertools
+import math
+import time
 from dataclasses import dataclass
 from types import MethodType
-from typing import TypeAlias, Callable, List, Tuple, Optional, Dict
+from typing import TypeAlias, Callable, List, Tuple, Optional, Dict, Set, Iterable, Any
 
 from stock_market_research_kit.asset import Asset, new_empty_trends
-from stock_market_research_kit.candle import as_1_candle
+from stock_market_research_kit.candle import as_1_candle, InnerCandle
 from stock_market_research_kit.quarter import DayQuarter
 from stock_market_research_kit.smt_psp_trade import SmtPspTrade, ONE_RR_IN_USD, MAX_ENTRY, MARKET_ORDER_FEE_PERCENT, \
     LIMIT_ORDER_FEE_PERCENT
 from stock_market_research_kit.triad import Triad, SMTLevels, SMT, Target, TrueOpen, to_smt_flags, percent_from_current
-from utils.date_utils import to_utc_datetime, to_ny_datetime, to_date_str, to_ny_date_str, quarters_by_time
+from utils.date_utils import to_ny_datetime, to_date_str, to_ny_date_str, time_core
 
 TrueOpens: TypeAlias = Tuple[List[TrueOpen], List[TrueOpen], List[TrueOpen]]
 SmtPspChange: TypeAlias = Tuple[
@@ -33,10 +37,19 @@ TargetChange: TypeAlias = Tuple[
     List[Target],  # only new short targets
 ]
 
-TOpener: TypeAlias = Callable[[Triad, TrueOpens, SmtPspChange, TargetChange], List[SmtPspTrade]]
+PspChange: TypeAlias = Tuple[int, str, str, str, str, str, str, str]  # an SmtPspChange psp change, see above
+Candidate: TypeAlias = Tuple[
+    PspChange,  # trigger psp change
+    Target,  # target
+    Tuple[float, float, float],  # stops: psp extremums of a1, a2, a3
+    Tuple[Tuple[float, float, float], Tuple[float, float, float], Tuple[float, float, float]],  # a1-a3 rr and pos size
+    Tuple[float, float, float]  # stops in percents from current
+]
+
+TOpener: TypeAlias = Callable[[Triad, TrueOpens, SmtPspChange, TargetChange, "TickSignals"], List[SmtPspTrade]]
 TsHandler: TypeAlias = Callable[
-    [str, List[SmtPspTrade], Triad, TrueOpens, SmtPspChange, TargetChange],
-    Tuple[List[SmtPspTrade], List[SmtPspTrade]]  # active_trades, closed_trades
+    [str, "TradeBook", Triad, TrueOpens, SmtPspChange, TargetChange],
+    Tuple["TradeBook", List[SmtPspTrade]]  # active_trades, closed_trades
 ]
 
 
@@ -55,6 +68,11 @@ smt_types_is_long = {
 }
 
 
+def _day_quarter(date_str: str) -> DayQuarter:
+    tc = time_core()
+    return tc.quarters_by_time(tc.parse(date_str))[3]
+
+
 def _psp_extremums(
         smt_lvls: SMTLevels, smt_type: str, psp_key: str, psp_date: str
 ) -> Tuple[float, float, float]:
@@ -105,7 +123,7 @@ def _close_trade(trade: SmtPspTrade, asset: Asset, close_price: float, reason: s
     part_to_close = percent_to_close / 100
     trade.closes.append((
         percent_to_close, close_price,
-        asset.snapshot_date_readable, to_ny_date_str(asset.snapshot_date_readable), reason, copy.deepcopy(asset.trends)
+        asset.snapshot_date_readable, to_ny_date_str(asset.snapshot_date_readable), reason, asset.trends
     ))
     trade.close_position_fee += part_to_close * (close_price * trade.entry_position_assets *
                                                  MARKET_ORDER_FEE_PERCENT / 100)
@@ -123,7 +141,7 @@ def _cancel_order(alo: SmtPspTrade, asset: Asset, close_price: float, reason: st
     alo.limit_status = "CANCELLED"
     alo.closes.append((
         100, close_price,
-        asset.snapshot_date_readable, to_ny_date_str(asset.snapshot_date_readable), reason, copy.deepcopy(asset.trends)
+        asset.snapshot_date_readable, to_ny_date_str(asset.snapshot_date_readable), reason, asset.trends
     ))
 
     return alo
@@ -305,6 +323,79 @@ def _filter_by_tos(
     return result
 
 
+def _memo(cache: dict, key, fn: Callable):
+    if key not in cache:
+        cache[key] = fn()
+    return cache[key]
+
+
+class TickSignals:
+    # candidate signals of one tick shared by all strategies: every distinct psp change/target filter runs once
+    # per tick, the openers get memoized views of it. cpu_time is what computing them took
+    def __init__(self, tr: Triad, spc: SmtPspChange, tc: TargetChange):
+        self.tr, self.spc, self.tc = tr, spc, tc
+        self.cpu_time = 0.0
+        self._psp_changes: Dict[tuple, Optional[PspChange]] = {}
+        self._targets: Dict[tuple, Optional[Target]] = {}
+        self._stops: Dict[PspChange, Tuple[float, float, float]] = {}
+        self._candidates: Dict[tuple, Optional[Candidate]] = {}
+
+    def candidate(
+            self, smt_lvl_filter: int, psp_change_filter: str, psp_keys_filter: List[str],
+            target_lvl_filter: List[int], allow_half_target: bool, tsg: Callable[[bool], TargetSorter]
+    ) -> Optional[Candidate]:
+        key = (smt_lvl_filter, psp_change_filter, tuple(psp_keys_filter), tuple(target_lvl_filter),
+               allow_half_target, tsg)
+        if key not in self._candidates:
+            started = time.process_time()
+            self._candidates[key] = self._candidate(*key)
+            self.cpu_time += time.process_time() - started
+        return self._candidates[key]
+
+    def _candidate(
+            self, smt_lvl_filter: int, psp_change_filter: str, psp_keys_filter: Tuple[str, ...],
+            target_lvl_filter: Tuple[int, ...], allow_half_target: bool, tsg: Callable[[bool], TargetSorter]
+    ) -> Optional[Candidate]:
+        my_psp_change = _memo(self._psp_changes, (smt_lvl_filter, psp_change_filter, psp_keys_filter),
+                              lambda: _filter_by_psp_change(
+                                  smt_lvl_filter, ['high', 'half_high', 'low', 'half_low'], self.spc[4],
+                                  [psp_change_filter], list(psp_keys_filter)
+                              ))
+        if not my_psp_change:
+            return None
+        smt_level, smt_label, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, change = my_psp_change
+        is_long = smt_types_is_long[smt_type]
+
+        my_target = _memo(self._targets, (is_long, allow_half_target, target_lvl_filter, tsg),
+                          lambda: _filter_by_target(
+                              is_long, allow_half_target, self.tc, list(target_lvl_filter), tsg(is_long)
+                          ))
+        if not my_target:
+            return None
+
+        stop_a1, stop_a2, stop_a3 = _memo(self._stops, my_psp_change, lambda: _psp_extremums(
+            [x for x in self.spc[1] if x[0] == smt_level and x[1] == smt_label][0][2],
+            smt_type, psp_key, psp_date))
+
+        tr = self.tr
+        if (tr.a1.prev_15m_candle[3] in [my_target[4][0], stop_a1] or
+                tr.a2.prev_15m_candle[3] in [my_target[5][0], stop_a2] or
+                tr.a3.prev_15m_candle[3] in [my_target[6][0], stop_a3]):
+            return None
+
+        return (
+            my_psp_change,
+            my_target,
+            (stop_a1, stop_a2, stop_a3),
+            (_rr_and_pos_size(tr.a1.prev_15m_candle[3], my_target[4][0], stop_a1),
+             _rr_and_pos_size(tr.a2.prev_15m_candle[3], my_target[5][0], stop_a2),
+             _rr_and_pos_size(tr.a3.prev_15m_candle[3], my_target[6][0], stop_a3)),
+            (percent_from_current(tr.a1.prev_15m_candle[3], stop_a1),
+             percent_from_current(tr.a2.prev_15m_candle[3], stop_a2),
+             percent_from_current(tr.a3.prev_15m_candle[3], stop_a3)),
+        )
+
+
 def _open_market_trade(
         trade_asset: Asset, rr_pos: Tuple[float, float, float], my_target: Target,
         my_psp_change: Tuple[int, str, str, str, str, str, str, str],
@@ -313,7 +404,7 @@ def _open_market_trade(
 ) -> SmtPspTrade:
     smt_level, smt_label, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, change = my_psp_change
 
-    trends = copy.deepcopy(trade_asset.trends)
+    trends = trade_asset.trends
 
     reason = f"{psp_key} psp for {smt_type} {smt_label} -> {my_target[1]} {my_target[2]}"
     return SmtPspTrade(
@@ -380,7 +471,7 @@ def _open_market_trade(
 def _open_limit_trade(
         alo: SmtPspTrade, trade_asset: Asset, tos: List[TrueOpen]
 ) -> SmtPspTrade:
-    trends = copy.deepcopy(trade_asset.trends)
+    trends = trade_asset.trends
 
     alo.limit_status = "FILLED"
     alo.entry_order_type = "LIMIT"
@@ -493,7 +584,7 @@ def _open_limit_orders(
             reason: str, price: Optional[float], pos_assets: Optional[float], pos_usd: Optional[float],
             chase_rr: Optional[float], chase_to_label: Optional[str]
     ) -> SmtPspTrade:
-        trends = copy.deepcopy(trade_asset.trends)
+        trends = trade_asset.trends
         empty_trends = new_empty_trends()
         return SmtPspTrade(
             asset=trade_asset.symbol,
@@ -597,32 +688,17 @@ def strategy01_to_constructor(
         smt_lvl_filter: int, psp_change_filter: str, psp_keys_filter: List[str],
         target_lvl_filter: List[int], allow_half_target: bool, tsg: Callable[[bool], TargetSorter]
 ) -> TOpener:
-    def strategy01_to(tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange) -> List[SmtPspTrade]:
-        my_psp_change = _filter_by_psp_change(
-            smt_lvl_filter, ['high', 'half_high', 'low', 'half_low'], spc[4], [psp_change_filter], psp_keys_filter
-        )
-        if not my_psp_change:
-            return []
-        smt_level, smt_label, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, change = my_psp_change
-
-        my_target = _filter_by_target(
-            smt_types_is_long[smt_type], allow_half_target, tc, target_lvl_filter, tsg(smt_types_is_long[smt_type])
+    def strategy01_to(
+            tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange, signals: TickSignals
+    ) -> List[SmtPspTrade]:
+        candidate = signals.candidate(
+            smt_lvl_filter, psp_change_filter, psp_keys_filter, target_lvl_filter, allow_half_target, tsg
         )
-        if not my_target:
+        if not candidate:
             return []
-
-        stop_a1, stop_a2, stop_a3 = _psp_extremums(
-            [x for x in spc[1] if x[0] == smt_level and x[1] == smt_label][0][2],
-            smt_type, psp_key, psp_date)
-
-        if (tr.a1.prev_15m_candle[3] in [my_target[4][0], stop_a1] or
-                tr.a2.prev_15m_candle[3] in [my_target[5][0], stop_a2] or
-                tr.a3.prev_15m_candle[3] in [my_target[6][0], stop_a3]):
-            return []
-
-        rr_pos_a1, rr_pos_a2, rr_pos_a3 = (_rr_and_pos_size(tr.a1.prev_15m_candle[3], my_target[4][0], stop_a1),
-                                           _rr_and_pos_size(tr.a2.prev_15m_candle[3], my_target[5][0], stop_a2),
-                                           _rr_and_pos_size(tr.a3.prev_15m_candle[3], my_target[6][0], stop_a3))
+        my_psp_change, my_target, (stop_a1, stop_a2, stop_a3), (rr_pos_a1, rr_pos_a2, rr_pos_a3), stop_percents = \
+            candidate
+        smt_type = my_psp_change[2]
 
         smb_to_trade = _filter_by_tos_ratio_and_rr(
             tos, (tr.a1.symbol, tr.a2.symbol, tr.a3.symbol),
@@ -633,12 +709,6 @@ def strategy01_to_constructor(
         if smb_to_trade == "":
             return []
 
-        stop_percents = (
-            percent_from_current(tr.a1.prev_15m_candle[3], stop_a1),
-            percent_from_current(tr.a2.prev_15m_candle[3], stop_a2),
-            percent_from_current(tr.a3.prev_15m_candle[3], stop_a3),
-        )
-
         trade_asset = tr.a1
         rr_pos = rr_pos_a1
         stop = stop_a1
@@ -675,32 +745,17 @@ def strategy03_to_constructor(
         smt_lvl_filter: int, psp_change_filter: str, psp_keys_filter: List[str],
         target_lvl_filter: List[int], allow_half_target: bool, tsg: Callable[[bool], TargetSorter]
 ) -> TOpener:
-    def strategy03_to(tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange) -> List[SmtPspTrade]:
-        my_psp_change = _filter_by_psp_change(
-            smt_lvl_filter, ['high', 'half_high', 'low', 'half_low'], spc[4], [psp_change_filter], psp_keys_filter
+    def strategy03_to(
+            tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange, signals: TickSignals
+    ) -> List[SmtPspTrade]:
+        candidate = signals.candidate(
+            smt_lvl_filter, psp_change_filter, psp_keys_filter, target_lvl_filter, allow_half_target, tsg
         )
-        if not my_psp_change:
+        if not candidate:
             return []
-        smt_level, smt_label, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, change = my_psp_change
-
-        my_target = _filter_by_target(
-            smt_types_is_long[smt_type], allow_half_target, tc, target_lvl_filter, tsg(smt_types_is_long[smt_type])
-        )
-        if not my_target:
-            return []
-
-        stop_a1, stop_a2, stop_a3 = _psp_extremums(
-            [x for x in spc[1] if x[0] == smt_level and x[1] == smt_label][0][2],
-            smt_type, psp_key, psp_date)
-
-        if (tr.a1.prev_15m_candle[3] in [my_target[4][0], stop_a1] or
-                tr.a2.prev_15m_candle[3] in [my_target[5][0], stop_a2] or
-                tr.a3.prev_15m_candle[3] in [my_target[6][0], stop_a3]):
-            return []
-
-        rr_pos_a1, rr_pos_a2, rr_pos_a3 = (_rr_and_pos_size(tr.a1.prev_15m_candle[3], my_target[4][0], stop_a1),
-                                           _rr_and_pos_size(tr.a2.prev_15m_candle[3], my_target[5][0], stop_a2),
-                                           _rr_and_pos_size(tr.a3.prev_15m_candle[3], my_target[6][0], stop_a3))
+        my_psp_change, my_target, (stop_a1, stop_a2, stop_a3), (rr_pos_a1, rr_pos_a2, rr_pos_a3), stop_percents = \
+            candidate
+        smt_type = my_psp_change[2]
 
         smb_to_trade = _filter_by_tos_ratio_and_rr(
             tos, (tr.a1.symbol, tr.a2.symbol, tr.a3.symbol),
@@ -711,12 +766,6 @@ def strategy03_to_constructor(
         if smb_to_trade == "":
             return []
 
-        stop_percents = (
-            percent_from_current(tr.a1.prev_15m_candle[3], stop_a1),
-            percent_from_current(tr.a2.prev_15m_candle[3], stop_a2),
-            percent_from_current(tr.a3.prev_15m_candle[3], stop_a3),
-        )
-
         trade_asset = tr.a1
         rr_pos = rr_pos_a1
         stop = stop_a1
@@ -759,32 +808,17 @@ def strategy04_to_constructor(
         target_lvl_filter: List[int], allow_half_target: bool, tsg: Callable[[bool], TargetSorter],
         tos_aside_filter_all: List[str], tos_aside_filter_my: List[str], rr_all_min: float, rr_all_max: float
 ) -> TOpener:
-    def strategy04_to(tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange) -> List[SmtPspTrade]:
-        my_psp_change = _filter_by_psp_change(
-            smt_lvl_filter, ['high', 'half_high', 'low', 'half_low'], spc[4], [psp_change_filter], psp_keys_filter
+    def strategy04_to(
+            tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange, signals: TickSignals
+    ) -> List[SmtPspTrade]:
+        candidate = signals.candidate(
+            smt_lvl_filter, psp_change_filter, psp_keys_filter, target_lvl_filter, allow_half_target, tsg
         )
-        if not my_psp_change:
+        if not candidate:
             return []
-        smt_level, smt_label, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, change = my_psp_change
-
-        my_target = _filter_by_target(
-            smt_types_is_long[smt_type], allow_half_target, tc, target_lvl_filter, tsg(smt_types_is_long[smt_type])
-        )
-        if not my_target:
-            return []
-
-        stop_a1, stop_a2, stop_a3 = _psp_extremums(
-            [x for x in spc[1] if x[0] == smt_level and x[1] == smt_label][0][2],
-            smt_type, psp_key, psp_date)
-
-        if (tr.a1.prev_15m_candle[3] in [my_target[4][0], stop_a1] or
-                tr.a2.prev_15m_candle[3] in [my_target[5][0], stop_a2] or
-                tr.a3.prev_15m_candle[3] in [my_target[6][0], stop_a3]):
-            return []
-
-        rr_pos_a1, rr_pos_a2, rr_pos_a3 = (_rr_and_pos_size(tr.a1.prev_15m_candle[3], my_target[4][0], stop_a1),
-                                           _rr_and_pos_size(tr.a2.prev_15m_candle[3], my_target[5][0], stop_a2),
-                                           _rr_and_pos_size(tr.a3.prev_15m_candle[3], my_target[6][0], stop_a3))
+        my_psp_change, my_target, (stop_a1, stop_a2, stop_a3), (rr_pos_a1, rr_pos_a2, rr_pos_a3), stop_percents = \
+            candidate
+        smt_type = my_psp_change[2]
 
         symbols_to_trade_d = _filter_by_tos(
             tos, (tr.a1.symbol, tr.a2.symbol, tr.a3.symbol),
@@ -806,12 +840,6 @@ def strategy04_to_constructor(
         if symbol_max_rr == "" or symbol_max_rr not in symbols_to_trade_d:
             return []
 
-        stop_percents = (
-            percent_from_current(tr.a1.prev_15m_candle[3], stop_a1),
-            percent_from_current(tr.a2.prev_15m_candle[3], stop_a2),
-            percent_from_current(tr.a3.prev_15m_candle[3], stop_a3),
-        )
-
         trade_asset = tr.a1
         rr_pos = rr_pos_a1
         stop = stop_a1
@@ -850,43 +878,21 @@ def strategy07_to_constructor(
         target_lvl_filter: List[int], allow_half_target: bool, tsg: Callable[[bool], TargetSorter],
         post_filterer: Callable[[List[SmtPspTrade]], List[SmtPspTrade]]
 ) -> TOpener:
-    def strategy07_to(tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange) -> List[SmtPspTrade]:
-        my_psp_change = _filter_by_psp_change(
-            smt_lvl_filter, ['high', 'half_high', 'low', 'half_low'], spc[4], [psp_change_filter], psp_keys_filter
+    def strategy07_to(
+            tr: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange, signals: TickSignals
+    ) -> List[SmtPspTrade]:
+        candidate = signals.candidate(
+            smt_lvl_filter, psp_change_filter, psp_keys_filter, target_lvl_filter, allow_half_target, tsg
         )
-        if not my_psp_change:
+        if not candidate:
             return []
-
-        smt_level, smt_label, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, change = my_psp_change
+        my_psp_change, my_target, (stop_a1, stop_a2, stop_a3), (rr_pos_a1, rr_pos_a2, rr_pos_a3), stop_percents = \
+            candidate
+        smt_type = my_psp_change[2]
         if (direction_filter == "UP" and not smt_types_is_long[smt_type] or
                 direction_filter == "DOWN" and smt_types_is_long[smt_type]):
             return []
 
-        my_target = _filter_by_target(
-            smt_types_is_long[smt_type], allow_half_target, tc, target_lvl_filter, tsg(smt_types_is_long[smt_type])
-        )
-        if not my_target:
-            return []
-
-        stop_a1, stop_a2, stop_a3 = _psp_extremums(
-            [x for x in spc[1] if x[0] == smt_level and x[1] == smt_label][0][2],
-            smt_type, psp_key, psp_date)
-
-        if (tr.a1.prev_15m_candle[3] in [my_target[4][0], stop_a1] or
-                tr.a2.prev_15m_candle[3] in [my_target[5][0], stop_a2] or
-                tr.a3.prev_15m_candle[3] in [my_target[6][0], stop_a3]):
-            return []
-
-        rr_pos_a1, rr_pos_a2, rr_pos_a3 = (_rr_and_pos_size(tr.a1.prev_15m_candle[3], my_target[4][0], stop_a1),
-                                           _rr_and_pos_size(tr.a2.prev_15m_candle[3], my_target[5][0], stop_a2),
-                                           _rr_and_pos_size(tr.a3.prev_15m_candle[3], my_target[6][0], stop_a3))
-
-        stop_percents = (
-            percent_from_current(tr.a1.prev_15m_candle[3], stop_a1),
-            percent_from_current(tr.a2.prev_15m_candle[3], stop_a2),
-            percent_from_current(tr.a3.prev_15m_candle[3], stop_a3),
-        )
-
         trade_asset = tr.a1
         rr_pos = rr_pos_a1
         stop = stop_a1
@@ -944,14 +950,14 @@ def strategy_10_to_pf(trades: List[SmtPspTrade]) -> List[SmtPspTrade]:
             return False
         if self.asset == "ETHUSDT":  # TODO hardcode
             return False
-        return (quarters_by_time(self.signal_time)[3] in [DayQuarter.DQ1_Asia, DayQuarter.DQ2_London] and
-                quarters_by_time(entry_time)[3] in [DayQuarter.DQ1_Asia])
+        return (_day_quarter(self.signal_time) in [DayQuarter.DQ1_Asia, DayQuarter.DQ2_London] and
+                _day_quarter(entry_time) in [DayQuarter.DQ1_Asia])
 
     def median_rr_4h_checker(self: SmtPspTrade, entry_time: str) -> bool:
         if not 5 < self.limit_rr < 11:
             return False
-        return (quarters_by_time(entry_time)[3] in [DayQuarter.DQ2_London] and
-                quarters_by_time(self.signal_time)[3] in [DayQuarter.DQ2_London])
+        return (_day_quarter(entry_time) in [DayQuarter.DQ2_London] and
+                _day_quarter(self.signal_time) in [DayQuarter.DQ2_London])
 
     for t in trades:
         limit_reason = t.entry_reason.split()[0]
@@ -997,12 +1003,12 @@ def strategy_12_to_pf(trades: List[SmtPspTrade]) -> List[SmtPspTrade]:
     def t90mo_1h_checker(self: SmtPspTrade, entry_time: str) -> bool:
         if not 0.5 < self.limit_rr < 2.45:
             return False
-        return quarters_by_time(self.signal_time)[3] in [DayQuarter.DQ1_Asia]
+        return _day_quarter(self.signal_time) in [DayQuarter.DQ1_Asia]
 
     def median_rr_1h_checker(self: SmtPspTrade, _: str) -> bool:
         if not 6 < self.limit_rr < 85:
             return False
-        return quarters_by_time(self.signal_time)[3] in [DayQuarter.DQ1_Asia]
+        return _day_quarter(self.signal_time) in [DayQuarter.DQ1_Asia]
 
     def absent_two_2h_checker(self: SmtPspTrade, _: str) -> bool:
         return 0.3 < self.limit_rr < 50
@@ -1010,7 +1016,7 @@ def strategy_12_to_pf(trades: List[SmtPspTrade]) -> List[SmtPspTrade]:
     def t90mo_2h_checker(self: SmtPspTrade, entry_time: str) -> bool:
         if not 4 < self.limit_rr < 9:
             return False
-        return quarters_by_time(self.signal_time)[3] in [DayQuarter.DQ1_Asia, DayQuarter.DQ3_NYAM]
+        return _day_quarter(self.signal_time) in [DayQuarter.DQ1_Asia, DayQuarter.DQ3_NYAM]
 
     def absent_tdo_4h_checker(self: SmtPspTrade, _: str) -> bool:
         return 0.3 < self.limit_rr < 3.6
@@ -1023,7 +1029,7 @@ def strategy_12_to_pf(trades: List[SmtPspTrade]) -> List[SmtPspTrade]:
         if t.psp_key_used == '1h':
             if t.entry_order_type == "MARKET":
                 if (4 < t.entry_rr < 11 and t.target_level == 4 and
-                        quarters_by_time(t.signal_time)[3] in [DayQuarter.DQ1_Asia]):
+                        _day_quarter(t.signal_time) in [DayQuarter.DQ1_Asia]):
                     res.append(t)
                     continue
             match limit_reason:
@@ -1330,7 +1336,9 @@ def strategy_32_to_pf(trades: List[SmtPspTrade]) -> List[SmtPspTrade]:
     return res
 
 
-def _close_by_tp_sl_deadlines(at: SmtPspTrade, trade_asset: Asset, stop_after: str) -> Optional[SmtPspTrade]:
+def _close_by_tp_sl_deadlines(
+        at: SmtPspTrade, trade_asset: Asset, strategy_stop: bool, deadline_reached: bool
+) -> Optional[SmtPspTrade]:
     if at.direction == 'UP':
         if trade_asset.prev_15m_candle[2] <= at.stop:
             return _close_trade(at, trade_asset, at.stop, "stop", False)
@@ -1341,19 +1349,19 @@ def _close_by_tp_sl_deadlines(at: SmtPspTrade, trade_asset: Asset, stop_after: s
             return _close_trade(at, trade_asset, at.stop, "stop", False)
         if trade_asset.prev_15m_candle[2] <= at.take_profit:
             return _close_trade(at, trade_asset, at.take_profit, "take_profit", False)
-    if to_utc_datetime(trade_asset.snapshot_date_readable) >= to_utc_datetime(stop_after):
+    if strategy_stop:
         return _close_trade(at, trade_asset, trade_asset.prev_15m_candle[3], "strategy_stop", False)
-    if (at.deadline_close and
-            to_utc_datetime(trade_asset.snapshot_date_readable) >= to_utc_datetime(at.deadline_close)):
+    if deadline_reached:
         return _close_trade(at, trade_asset, trade_asset.prev_15m_candle[3], "deadline", False)
     return None
 
 
-def _cancel_by_tp_sl_deadlines(alo: SmtPspTrade, trade_asset: Asset, stop_after: str) -> Optional[SmtPspTrade]:
-    if to_utc_datetime(trade_asset.snapshot_date_readable) >= to_utc_datetime(stop_after):
+def _cancel_by_tp_sl_deadlines(
+        alo: SmtPspTrade, trade_asset: Asset, strategy_stop: bool, deadline_reached: bool
+) -> Optional[SmtPspTrade]:
+    if strategy_stop:
         return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "strategy_stop")
-    if (alo.deadline_close and
-            to_utc_datetime(trade_asset.snapshot_date_readable) >= to_utc_datetime(alo.deadline_close)):
+    if deadline_reached:
         return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "deadline")
     if alo.direction == 'UP':
         if trade_asset.prev_15m_candle[2] <= alo.limit_stop:
@@ -1368,51 +1376,178 @@ def _cancel_by_tp_sl_deadlines(alo: SmtPspTrade, trade_asset: Asset, stop_after:
     return None
 
 
-def _cancel_by_other_reached_target(alo: SmtPspTrade, trade_asset: Asset, tc: TargetChange) -> Optional[SmtPspTrade]:
+ANTAGONIST_SMT_TYPES = {
+    'high': ['low', 'half_low'],
+    'half_high': ['low', 'half_low'],
+    'low': ['high', 'half_high'],
+    'half_low': ['high', 'half_high'],
+}
+
+
+@dataclass
+class TradeEvents:  # a tick's spc/tc events keyed the way trades match them, a lookup per trade instead of a loop
+    new_smt_max_levels: Dict[str, int]  # smt type -> the highest level of the new smts of this type
+    cancelled_smts: Set[Tuple[str, str]]  # smt_label, smt_type
+    swept_psps: Set[Tuple[str, str]]  # psp_key, psp_date
+    reached_targets: Dict[Tuple[int, str, str], Set[str]]  # (level, direction, label) -> ql_starts, long and short
+
+
+def new_trade_events(spc: SmtPspChange, tc: TargetChange) -> TradeEvents:
+    events = TradeEvents(new_smt_max_levels={}, cancelled_smts=set(), swept_psps=set(), reached_targets={})
+    for new_smt_level, _, new_smt in spc[2]:
+        max_levels = events.new_smt_max_levels
+        max_levels[new_smt.type] = max(new_smt_level, max_levels.get(new_smt.type, new_smt_level))
+    for _, old_smt_label, old_smt in spc[3]:
+        events.cancelled_smts.add((old_smt_label, old_smt.type))
+    for _, _, _, _, _, psp_key, psp_date, psp_change in spc[4]:  # possible|closed|confirmed|swept
+        if psp_change == 'swept':
+            events.swept_psps.add((psp_key, psp_date))
     for target_level, target_direction, target_label, ql_start, _, _ in tc[4] + tc[5]:
-        if (target_level == alo.target_level and target_direction == alo.target_direction
-                and target_label == alo.target_label):
-            return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_someone_reached_target")
+        events.reached_targets.setdefault((target_level, target_direction, target_label), set()).add(ql_start)
+    return events
+
+
+def _limit_order_keys(alo: SmtPspTrade) -> List[tuple]:  # the keys of the events that may cancel a limit order
+    return [('psp', alo.psp_key_used, alo.psp_date), ('smt', alo.smt_label, alo.smt_type),
+            ('target', alo.target_level, alo.target_direction, alo.target_label), ('smt_type', alo.smt_type)]
+
+
+class TradeBook:
+    # active trades of a strategy, limit orders and opened trades each in the order they came. A limit order not
+    # chasing a true open only changes when the candle reaches its price levels, its deadline passes or an event
+    # hits its keys, so it is indexed by those: per asset sorted price levels (bisect), event keys, a deadline heap.
+    # Opened trades are visited on every tick anyway (in-trade range, best pnl), only their deadlines are pre-parsed
+    def __init__(self, trades: Iterable[SmtPspTrade] = ()):
+        self._seq = 0
+        self.limit_orders: Dict[int, SmtPspTrade] = {}
+        self.opened: Dict[int, SmtPspTrade] = {}
+        self._chasing: Set[int] = set()
+        self._levels: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}  # (symbol, fill|below|above) -> sorted
+        self._level_keys: Dict[int, List[Tuple[Tuple[str, str], Tuple[float, int]]]] = {}
+        self._keys: Dict[tuple, Set[int]] = {}  # event key -> limit orders
+        self._deadlines: List[Tuple[Any, int]] = []  # heap of limit orders deadlines, time_core() times
+        self._deadline_ts: Dict[int, Any] = {}
+        self.extend(trades)
+
+    def __len__(self):
+        return len(self.limit_orders) + len(self.opened)
+
+    def extend(self, trades: Iterable[SmtPspTrade]):
+        for t in trades:
+            if t.entry_time != "":
+                self.add_opened(t)
+            elif t.limit_status == "ACTIVE":
+                self._add_limit_order(t)
+
+    def add_opened(self, at: SmtPspTrade):
+        self._seq += 1
+        self.opened[self._seq] = at
+        if at.deadline_close:
+            self._deadline_ts[self._seq] = time_core().parse(at.deadline_close)
+
+    def deadline_reached(self, seq: int, now_t) -> bool:
+        return seq in self._deadline_ts and now_t >= self._deadline_ts[seq]
+
+    def _add_limit_order(self, alo: SmtPspTrade):
+        self._seq += 1
+        seq = self._seq
+        self.limit_orders[seq] = alo
+        if alo.deadline_close:
+            self._deadline_ts[seq] = time_core().parse(alo.deadline_close)
+            heapq.heappush(self._deadlines, (self._deadline_ts[seq], seq))
+        for key in _limit_order_keys(alo):
+            self._keys.setdefault(key, set()).add(seq)
+
+        if alo.limit_chase_to_label is not None:  # its price follows a true open, checked on every tick
+            self._chasing.add(seq)
+            return
+        # below: reached when the candle low <= level, above: when the high >= level
+        stop_kind, take_kind = ("below", "above") if alo.direction == "UP" else ("above", "below")
+        self._level_keys[seq] = []
+        for kind, price in [("fill", alo.limit_price_history[-1]), (stop_kind, alo.limit_stop),
+                            (take_kind, alo.limit_take_profit)]:
+            level = (price, seq)
+            bisect.insort(self._levels.setdefault((alo.asset, kind), []), level)
+            self._level_keys[seq].append(((alo.asset, kind), level))
+
+    def remove_limit_order(self, seq: int) -> SmtPspTrade:
+        alo = self.limit_orders.pop(seq)
+        self._chasing.discard(seq)
+        self._deadline_ts.pop(seq, None)  # its heap entry is skipped when popped
+        for key in _limit_order_keys(alo):
+            self._keys[key].discard(seq)
+        for levels_key, level in self._level_keys.pop(seq, []):
+            levels = self._levels[levels_key]
+            del levels[bisect.bisect_left(levels, level)]
+        return alo
+
+    def remove_opened(self, seq: int):
+        del self.opened[seq]
+        self._deadline_ts.pop(seq, None)
+
+    def limit_orders_to_check(
+            self, candles: Dict[str, InnerCandle], events: "TradeEvents", now_t, strategy_stop: bool
+    ) -> List[int]:  # the limit orders this tick may change, in the order they came
+        if strategy_stop:
+            return list(self.limit_orders)
+        res = set(self._chasing)
+        for symbol, candle in candles.items():
+            low, high = candle[2], candle[1]
+            levels = self._levels.get((symbol, "fill"), [])
+            res.update(x[1] for x in levels[bisect.bisect_right(levels, (low, math.inf)):
+                                            bisect.bisect_left(levels, (high, -math.inf))])
+            levels = self._levels.get((symbol, "below"), [])
+            res.update(x[1] for x in levels[bisect.bisect_left(levels, (low, -math.inf)):])
+            levels = self._levels.get((symbol, "above"), [])
+            res.update(x[1] for x in levels[:bisect.bisect_right(levels, (high, math.inf))])
+
+        while self._deadlines and self._deadlines[0][0] <= now_t:
+            res.add(heapq.heappop(self._deadlines)[1])
+
+        keys = [('psp', *x) for x in events.swept_psps] + [('smt', *x) for x in events.cancelled_smts] + \
+               [('target', *x) for x in events.reached_targets] + \
+               [('smt_type', x) for smt_type in events.new_smt_max_levels for x in ANTAGONIST_SMT_TYPES[smt_type]]
+        for key in keys:
+            res.update(self._keys.get(key, ()))
+        return sorted(x for x in res if x in self.limit_orders)
+
+
+def _cancel_by_other_reached_target(
+        alo: SmtPspTrade, trade_asset: Asset, events: TradeEvents
+) -> Optional[SmtPspTrade]:
+    if (alo.target_level, alo.target_direction, alo.target_label) in events.reached_targets:
+        return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_someone_reached_target")
 
     return None
 
 
-def _cancel_by_smt_psp_change(alo: SmtPspTrade, trade_asset: Asset, spc: SmtPspChange) -> Optional[SmtPspTrade]:
-    antagonist_smt_types = {
-        'high': ['low', 'half_low'],
-        'half_high': ['low', 'half_low'],
-        'low': ['high', 'half_high'],
-        'half_low': ['high', 'half_high'],
-    }
-    for new_smt_level, new_smt_label, new_smt in spc[2]:
-        if new_smt_level >= alo.smt_level and new_smt.type in antagonist_smt_types[alo.smt_type]:
+def _cancel_by_smt_psp_change(alo: SmtPspTrade, trade_asset: Asset, events: TradeEvents) -> Optional[SmtPspTrade]:
+    for smt_type in ANTAGONIST_SMT_TYPES[alo.smt_type]:
+        if smt_type in events.new_smt_max_levels and events.new_smt_max_levels[smt_type] >= alo.smt_level:
             return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_antagonist_smt")
 
-    for old_smt_level, old_smt_label, old_smt in spc[3]:
-        if old_smt_label == alo.smt_label and old_smt.type == alo.smt_type:
-            return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_smt_cancelled")
+    if (alo.smt_label, alo.smt_type) in events.cancelled_smts:
+        return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_smt_cancelled")
 
-    for _, _, _, _, _, psp_key, psp_date, psp_change in spc[4]:  # possible|closed|confirmed|swept
-        if psp_change == 'swept' and psp_date == alo.psp_date and psp_key == alo.psp_key_used:
-            return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_psp_swept")
+    if (alo.psp_key_used, alo.psp_date) in events.swept_psps:
+        return _cancel_order(alo, trade_asset, trade_asset.prev_15m_candle[3], "limit_psp_swept")
     return None
 
 
-def _close_by_other_swept_psp(at: SmtPspTrade, trade_asset: Asset, spc: SmtPspChange) -> Optional[SmtPspTrade]:
-    for _, _, _, _, _, psp_key, psp_date, psp_change in spc[4]:  # possible|closed|confirmed|swept
-        if psp_change == 'swept' and psp_date == at.psp_date and psp_key == at.psp_key_used:
-            return _close_trade(
-                at, trade_asset, trade_asset.prev_15m_candle[3], "someone_psp_swept", True
-            )
+def _close_by_other_swept_psp(at: SmtPspTrade, trade_asset: Asset, events: TradeEvents) -> Optional[SmtPspTrade]:
+    if (at.psp_key_used, at.psp_date) in events.swept_psps:
+        return _close_trade(
+            at, trade_asset, trade_asset.prev_15m_candle[3], "someone_psp_swept", True
+        )
 
 
-def _close_by_other_reached_target(at: SmtPspTrade, trade_asset: Asset, tc: TargetChange) -> Optional[SmtPspTrade]:
-    for target_level, target_direction, target_label, ql_start, _, _ in tc[4] + tc[5]:
-        if (target_level == at.target_level and target_direction == at.target_direction
-                and target_label == at.target_label and ql_start == at.target_ql_start):
-            return _close_trade(
-                at, trade_asset, trade_asset.prev_15m_candle[3], "someone_reached_target", True
-            )
+def _close_by_other_reached_target(
+        at: SmtPspTrade, trade_asset: Asset, events: TradeEvents
+) -> Optional[SmtPspTrade]:
+    if at.target_ql_start in events.reached_targets.get((at.target_level, at.target_direction, at.target_label), ()):
+        return _close_trade(
+            at, trade_asset, trade_asset.prev_15m_candle[3], "someone_reached_target", True
+        )
 
 
 def _with_best(at: SmtPspTrade, tr: Triad, tos: TrueOpens) -> SmtPspTrade:
@@ -1427,7 +1562,7 @@ def _with_best(at: SmtPspTrade, tr: Triad, tos: TrueOpens) -> SmtPspTrade:
         [at.in_trade_range, asset.prev_15m_candle]
     )
 
-    trends = copy.deepcopy(asset.trends)
+    trends = asset.trends
 
     if at.direction == 'UP':
         candle_max_pnl = at.entry_position_usd / at.entry_price * (asset.prev_15m_candle[1] - at.entry_price)
@@ -1488,76 +1623,86 @@ def _with_best(at: SmtPspTrade, tr: Triad, tos: TrueOpens) -> SmtPspTrade:
 
 
 def strategy01_th(
-        stop_after: str, active_trades: List[SmtPspTrade], tr: Triad,
+        stop_after: str, active_trades: TradeBook, tr: Triad,
         tos: TrueOpens, spc: SmtPspChange, tc: TargetChange
-) -> Tuple[List[SmtPspTrade], List[SmtPspTrade]]:
+) -> Tuple[TradeBook, List[SmtPspTrade]]:
     closed_trades = []
-    new_active_trades = []
     assets = [tr.a1, tr.a2, tr.a3]
     assets_d = {asset.symbol: asset for asset in assets}
 
-    opened_trades = [x for x in active_trades if x.entry_time != ""]
-    active_limit_orders = [x for x in active_trades if x.limit_status == "ACTIVE"]
+    events = new_trade_events(spc, tc)
+    now_t = time_core().parse(tr.a1.snapshot_date_readable)
+    strategy_stop = now_t >= time_core().parse(stop_after)
+    alo_seqs = active_trades.limit_orders_to_check(
+        {a.symbol: a.prev_15m_candle for a in assets}, events, now_t, strategy_stop)
 
-    for alo in active_limit_orders:
+    for seq in alo_seqs:
+        alo = active_trades.limit_orders[seq]
         trade_asset = assets_d[alo.asset]
 
         opened_trade, updated_alo = _limit_trade_from_alo(alo, trade_asset, assets, tos)
         if opened_trade:
-            opened_trades.append(opened_trade)
+            active_trades.remove_limit_order(seq)
+            active_trades.add_opened(opened_trade)
             continue
 
         if updated_alo:
             alo = updated_alo
 
-        by_tp_sp_deadline = _cancel_by_tp_sl_deadlines(alo, trade_asset, stop_after)
+        by_tp_sp_deadline = _cancel_by_tp_sl_deadlines(
+            alo, trade_asset, strategy_stop, active_trades.deadline_reached(seq, now_t))
         if by_tp_sp_deadline:
+            active_trades.remove_limit_order(seq)
             closed_trades.append(by_tp_sp_deadline)
             continue
 
-        by_smt_psp_change = _cancel_by_smt_psp_change(alo, trade_asset, spc)
+        by_smt_psp_change = _cancel_by_smt_psp_change(alo, trade_asset, events)
         if by_smt_psp_change:
+            active_trades.remove_limit_order(seq)
             closed_trades.append(by_smt_psp_change)
             continue
 
-        by_other_reached_target = _cancel_by_other_reached_target(alo, trade_asset, tc)
+        by_other_reached_target = _cancel_by_other_reached_target(alo, trade_asset, events)
         if by_other_reached_target:
+            active_trades.remove_limit_order(seq)
             closed_trades.append(by_other_reached_target)
             continue
 
-        new_active_trades.append(alo)
-
-    for at in opened_trades:
+    for seq, at in list(active_trades.opened.items()):
         trade_asset = assets_d[at.asset]
 
-        by_tp_sp_deadline = _close_by_tp_sl_deadlines(at, trade_asset, stop_after)
+        by_tp_sp_deadline = _close_by_tp_sl_deadlines(
+            at, trade_asset, strategy_stop, active_trades.deadline_reached(seq, now_t))
         if by_tp_sp_deadline:
             if by_tp_sp_deadline.percent_closed() == 100:
+                active_trades.remove_opened(seq)
                 closed_trades.append(by_tp_sp_deadline)
                 continue
             else:
                 at = by_tp_sp_deadline
 
-        by_other_swept_psp = _close_by_other_swept_psp(at, trade_asset, spc)
+        by_other_swept_psp = _close_by_other_swept_psp(at, trade_asset, events)
         if by_other_swept_psp:
             if by_other_swept_psp.percent_closed() == 100:
+                active_trades.remove_opened(seq)
                 closed_trades.append(by_other_swept_psp)
                 continue
             else:
                 at = by_other_swept_psp
 
-        by_other_reached_target = _close_by_other_reached_target(at, trade_asset, tc)
+        by_other_reached_target = _close_by_other_reached_target(at, trade_asset, events)
         if by_other_reached_target:
             if by_other_reached_target.percent_closed() == 100:
+                active_trades.remove_opened(seq)
                 closed_trades.append(by_other_reached_target)
                 continue
             else:
                 at = by_other_reached_target
 
-        new_active_trades.append(_with_best(at, tr, tos))
+        active_trades.opened[seq] = _with_best(at, tr, tos)
 
     return (
-        new_active_trades,
+        active_trades,
         closed_trades
     )
 
@@ -1904,3 +2049,54 @@ strategy32 = SmtPspStrategy(
     ),
     trades_handler=strategy01_th
 )
+
+
+SweepParams: TypeAlias = Tuple[  # strategy07_to_constructor arguments
+    str,  # direction filter: UP|DOWN|"" for both
+    int,  # smt level
+    str,  # psp change: closed|confirmed etc
+    Tuple[str, ...],  # psp keys
+    Tuple[int, ...],  # target levels
+    bool,  # allow half target
+    Callable[[bool], TargetSorter],  # targets sorter generator
+    Callable[[List[SmtPspTrade]], List[SmtPspTrade]]  # post filterer
+]
+
+
+def no_post_filter(trades: List[SmtPspTrade]) -> List[SmtPspTrade]:
+    return trades
+
+
+SWEEP_GRID = (  # SweepParams values to combine, in SweepParams order
+    [""],
+    [3, 4],
+    ['closed', 'confirmed'],
+    [('1h', '2h', '4h'), ('4h', '1d')],
+    [(3,), (4,), (5,), (3, 4), (4, 5)],
+    [False, True],
+    [_closest_targets_sorter, _furthest_targets_sorter],
+    [no_post_filter],
+)
+
+
+def sweep_grid_params(grid: Tuple[List, ...]) -> List[SweepParams]:
+    return list(itertools.product(*grid))
+
+
+def sweep_params_readable(params: SweepParams) -> str:
+    direction, smt_level, psp_change, psp_keys, target_levels, allow_half, tsg, post_filterer = params
+    return (f"{direction or 'UP/DOWN'} {psp_change} {'/'.join(psp_keys)} psp in {smt_level} smt - "
+            f"{tsg.__name__.split('_')[1]} {'/'.join([str(x) for x in target_levels])} "
+            f"{'' if allow_half else 'no-half '}target - post-filter {post_filterer.__name__}")
+
+
+def sweep_strategies(params_list: List[SweepParams]) -> List[SmtPspStrategy]:
+    # strategy07-like variants, one fronttest runs them all: the triad ticks once for all of them, and the
+    # TickSignals of a tick are shared by variants with the same psp change and target filters
+    return [SmtPspStrategy(
+        name=f"{i:03d}. Sweep {sweep_params_readable(params)}",
+        trade_opener=strategy07_to_constructor(
+            params[0], params[1], params[2], list(params[3]), list(params[4]), params[5], params[6], params[7]
+        ),
+        trades_handler=strategy01_th
+    ) for i, params in enumerate(params_list)]
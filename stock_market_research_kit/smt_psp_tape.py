@@ -0,0 +1,105 @@
+import os
+import pickle
+from dataclasses import dataclass, replace
+from typing import Tuple, TypeAlias, Iterator, BinaryIO, Optional, Set
+
+from stock_market_research_kit.asset import Trends
+from stock_market_research_kit.candle import InnerCandle, new_empty_candle_series
+from stock_market_research_kit.smt_psp_strategy import TrueOpens, SmtPspChange, TargetChange
+from stock_market_research_kit.triad import Triad, SMT, SMTLevels, PSP_CHANGE_TIMEFRAMES
+
+SMT_PSP_TAPES_FOLDER = "./data/tapes/"
+SMT_PSP_TAPE_VERSION = 1  # bump when triad smt/psp/targets code changes, old tapes are recorded again
+
+TapeTick: TypeAlias = Tuple[
+    str,  # snapshot_date_readable
+    Tuple[InnerCandle, InnerCandle, InnerCandle],  # prev_15m_candle of a1, a2, a3
+    Tuple[Trends, Trends, Trends],  # trends of a1, a2, a3
+    TrueOpens,
+    SmtPspChange,  # without the old smt levels, the new ones are tape_smt_levels of the smts with psp changes
+    TargetChange,  # without the old targets
+]
+
+
+@dataclass
+class TapeAsset:  # the part of an Asset the strategies read
+    symbol: str
+    snapshot_date_readable: str
+    prev_15m_candle: InnerCandle
+    trends: Trends
+
+
+@dataclass
+class TapeTriad:
+    a1: TapeAsset
+    a2: TapeAsset
+    a3: TapeAsset
+
+
+def _tape_smt(smt: Optional[SMT], changed_psps: Set[Tuple[str, str]]) -> Optional[SMT]:
+    if smt is None:
+        return None
+    return replace(
+        smt,
+        a1_sweep_candles_15m=new_empty_candle_series(),
+        a2_sweep_candles_15m=new_empty_candle_series(),
+        a3_sweep_candles_15m=new_empty_candle_series(),
+        psps_1_month=None,  # has no psp changes
+        **{field: None if getattr(smt, field) is None else [
+            x for x in getattr(smt, field) if (key, x.a1_candle[5]) in changed_psps
+        ] for key, field in PSP_CHANGE_TIMEFRAMES}
+    )
+
+
+def tape_smt_levels(smt_lvls: SMTLevels, changed_psps: Set[Tuple[str, str]]) -> SMTLevels:
+    # strategies only look up the extremums of the changed psps, the rest of an SMT is ~50KB per tick
+    return _tape_smt(smt_lvls[0], changed_psps), _tape_smt(smt_lvls[1], changed_psps), \
+        _tape_smt(smt_lvls[2], changed_psps)
+
+
+def tape_tick(triad: Triad, tos: TrueOpens, spc: SmtPspChange, tc: TargetChange) -> TapeTick:
+    changed_psps = {}  # (level, label) -> {(psp_key, psp_date)}
+    for smt_level, smt_label, _, _, _, psp_key, psp_date, _ in spc[4]:
+        changed_psps.setdefault((smt_level, smt_label), set()).add((psp_key, psp_date))
+    smt_psp = [(lvl, label, tape_smt_levels(smt_lvls, changed_psps[(lvl, label)]))
+               for lvl, label, smt_lvls in spc[1] if (lvl, label) in changed_psps]
+    return (
+        triad.a1.snapshot_date_readable,
+        (triad.a1.prev_15m_candle, triad.a2.prev_15m_candle, triad.a3.prev_15m_candle),
+        (triad.a1.trends, triad.a2.trends, triad.a3.trends),
+        tos,
+        ([], smt_psp, spc[2], spc[3], spc[4]),
+        ([], [], *tc[2:]),
+    )
+
+
+def tape_triad(symbols: Tuple[str, str, str], tick: TapeTick) -> TapeTriad:
+    date, candles, trends = tick[0], tick[1], tick[2]
+    return TapeTriad(*[TapeAsset(symbols[i], date, candles[i], trends[i]) for i in range(3)])
+
+
+def smt_psp_tape_path(symbols: Tuple[str, str, str], from_: str, to_: str) -> str:
+    file_name = f"tape_v{SMT_PSP_TAPE_VERSION}_{'-'.join(symbols)}_{from_}_{to_}.pickle"
+    return os.path.join(SMT_PSP_TAPES_FOLDER, file_name.replace(" ", "_").replace(":", ""))
+
+
+def write_tape_header(f: BinaryIO, symbols: Tuple[str, str, str]):
+    pickle.dump((SMT_PSP_TAPE_VERSION, symbols), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_tape_tick(f: BinaryIO, tick: TapeTick):
+    pickle.dump(tick, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_tape(path: str) -> Iterator[Tuple[TapeTriad, TrueOpens, SmtPspChange, TargetChange]]:
+    # pickles, only for the tapes recorded here by fronttest
+    with open(path, "rb") as f:
+        version, symbols = pickle.load(f)
+        if version != SMT_PSP_TAPE_VERSION:
+            raise ValueError(f"unsupported smt psp tape version {version}")
+        while True:
+            try:
+                tick = pickle.load(f)
+            except EOFError:
+                return
+            yield tape_triad(symbols, tick), tick[3], tick[4], tick[5]
@@ -0,0 +1,113 @@
+import copy
+import pickle
+import random
+from typing import List
+
+from stock_market_research_kit.candle import InnerCandle, as_1_candle, as_1h_candles, candle_series, \
+    new_empty_candle_series, as_30m_candles, as_2h_candles, as_4h_candles, as_1d_candles, as_1w_candles, \
+    as_1month_candles, CandleResampler, resample_batch, resample_by_ny_quarters
+from stock_market_research_kit.candle_trend import find_last_trend, TrendTracker
+from utils.date_utils import epoch_to_date_str, to_epoch, quarters_by_epoch
+
+
+def _candles(n: int, seed: int = 7) -> List[InnerCandle]:
+    rnd = random.Random(seed)
+    price, start, res = 100.0, to_epoch("2025-03-07 21:15"), []
+    for i in range(n):
+        close = max(1.0, price + rnd.gauss(0, 0.6))
+        res.append((price, max(price, close) + rnd.random(), min(price, close) - rnd.random(), close,
+                    round(rnd.random() * 100, 3), epoch_to_date_str(start + i * 15 * 60)))
+        price = close
+    return res
+
+
+def test_candle_series_behaves_like_list():
+    candles = _candles(300)
+    series = new_empty_candle_series()
+    for c in reversed(candles[:150]):
+        series.appendleft(c)
+    for c in candles[150:]:
+        series.append(c)
+
+    assert len(series) == len(candles)
+    assert series == candles and series == candle_series(candles)
+    assert list(series) == candles
+    assert series[0] == candles[0] and series[-1] == candles[-1]
+    assert list(series[10:130]) == candles[10:130]
+    assert list(series[-15:]) == candles[-15:]
+    assert len(series[500:600]) == 0
+    assert series.date(5) == candles[5][5] and series.epoch(5) == to_epoch(candles[5][5])
+
+    view = series[20:40]
+    assert view.highs.base is not None  # zero-copy
+    view.append(candles[0])  # copies on write, the parent is untouched
+    assert series[40] == candles[40] and view[-1] == candles[0]
+
+    series[-1] = candles[0]
+    assert series[-1] == candles[0]
+
+    assert list(pickle.loads(pickle.dumps(series))) == list(series)
+    assert list(copy.deepcopy(series[5:25])) == list(series)[5:25]
+
+
+def test_candle_series_matches_list_helpers():
+    candles = _candles(500, seed=11)
+    series = candle_series(candles)
+
+    for a, b in [(0, 1), (0, 4), (13, 77), (100, 500)]:
+        assert as_1_candle(series[a:b]) == as_1_candle(candles[a:b])
+    assert as_1h_candles(series) == as_1h_candles(candles)
+    for a, b in [(0, 15), (100, 140), (380, 500)]:
+        assert find_last_trend(series[a:b]) == find_last_trend(candles[a:b])
+
+
+def test_resampled_windows_match_list_helpers():
+    candles = _candles(96 * 45, seed=3)  # friday 21:15 of a DST switch week, over a month end
+    series = candle_series(candles)
+    as_candles = {"30m": as_30m_candles, "1h": as_1h_candles, "2h": as_2h_candles, "4h": as_4h_candles,
+                  "1d": as_1d_candles, "1w": as_1w_candles, "1month": as_1month_candles}
+
+    for start in [0, 3, 96 * 2 + 11]:
+        for timeframe, fn in as_candles.items():
+            for end in list(range(start + 1, start + 200)) + list(range(start + 200, len(candles) + 1, 47)):
+                assert series[start:end].resampled(timeframe) == fn(candles[start:end]), (timeframe, start, end)
+
+    resampler = CandleResampler("1w")
+    for c in candles:
+        resampler.plus_15m(c)
+    assert resampler.candles == as_1w_candles(candles)
+
+
+def test_resample_batch_matches_list_helpers():
+    candles = _candles(96 * 75, seed=5)
+    gappy = candles[:500] + candles[531:2000] + candles[2100:]
+    as_candles = {"30m": as_30m_candles, "1h": as_1h_candles, "2h": as_2h_candles, "4h": as_4h_candles,
+                  "1d": as_1d_candles, "1w": as_1w_candles, "1month": as_1month_candles}
+
+    for part in [candles, candles[3:], candles[:5], candles[1:2], gappy, []]:
+        for timeframe, fn in as_candles.items():
+            assert resample_batch(candle_series(part), timeframe) == fn(part), timeframe
+
+    for i, kind in enumerate(["yq", "mw", "wd", "dq", "q90m"]):
+        groups = []
+        for c in candles:
+            quarter = quarters_by_epoch(to_epoch(c[5]))[i]
+            if not groups or groups[-1][0] != quarter:
+                groups.append((quarter, []))
+            groups[-1][1].append(c)
+        assert resample_by_ny_quarters(candle_series(candles), kind) == [as_1_candle(g) for _, g in groups], kind
+
+
+def test_trend_tracker_matches_find_last_trend():
+    candles = _candles(600, seed=13)
+    series, hours = new_empty_candle_series(), []
+    closed_1h, forming_1h = TrendTracker(), TrendTracker()
+    for c in candles:  # like Asset.recalc_htf_candles/recalc_trends: the last 1h candle is forming
+        if c[5].endswith("00") or len(series) == 0:
+            series.append(c)
+            hours.append(c)
+        else:
+            series[-1] = hours[-1] = as_1_candle([hours[-1], c])
+        if len(series) > 15:
+            assert closed_1h.update(series, len(series) - 16, len(series) - 1) == find_last_trend(hours[-16:-1])
+            assert forming_1h.update(series, len(series) - 15, len(series)) == find_last_trend(hours[-15:])
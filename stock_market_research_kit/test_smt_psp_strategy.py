@@ -0,0 +1,250 @@
+import copy
+import random
+from dataclasses import replace
+
+from stock_market_research_kit.asset import new_empty_trends
+from stock_market_research_kit.smt_psp_strategy import new_trade_events, _open_market_trade, _open_limit_orders, \
+    _cancel_by_smt_psp_change, _cancel_by_other_reached_target, _close_by_other_swept_psp, \
+    _close_by_other_reached_target, _limit_trade_from_alo, _cancel_by_tp_sl_deadlines, _close_by_tp_sl_deadlines, \
+    _with_best, strategy01_th, TradeBook
+from stock_market_research_kit.smt_psp_tape import TapeAsset, TapeTriad
+from stock_market_research_kit.triad import new_empty_smt
+from utils.date_utils import time_core, epoch_to_date_str, to_epoch
+
+
+def _asset(candle=(100.0, 101.0, 99.0, 100.0, 1.0, "2025-03-03 23:45")):
+    return TapeAsset("A", "2025-03-04 00:00", candle, new_empty_trends())
+
+
+def _trade(smt_type="low", smt_level=2, ql_start="2025-03-02 00:00"):  # long to 1 high prev_1d, 1h psp of a 1d smt
+    psp_change = (smt_level, "1d", smt_type, "", "2025-03-03 10:00", "1h", "2025-03-03 20:00", "confirmed")
+    target = (1, "high", "prev_1d", ql_start, (110.0, 10.0), (55.0, 10.0), (22.0, 10.0))
+    return _open_market_trade(_asset(), (2.0, 1.0, 100.0), target, psp_change, 95.0, (95.0, 47.0, 19.0), 110.0, [])
+
+
+def _smt(smt_type):
+    smt = new_empty_smt(None, None, None)
+    smt.type = smt_type
+    return smt
+
+
+def _spc(new_smts=(), cancelled_smts=(), psp_changed=()):
+    return [], [], list(new_smts), list(cancelled_smts), list(psp_changed)
+
+
+def _tc(reached_long=(), reached_short=()):
+    return [], [], [], [], list(reached_long), list(reached_short), [], []
+
+
+def _psp_changed(psp_key, psp_date, change):
+    return 2, "1d", "low", "", "2025-03-03 10:00", psp_key, psp_date, change
+
+
+def _reached(ql_start, direction="high"):
+    return 1, direction, "prev_1d", ql_start, 0, 110.0
+
+
+def test_new_trade_events():
+    events = new_trade_events(
+        _spc([(1, "1h", _smt("high")), (3, "1d", _smt("high")), (2, "4h", _smt("half_low"))],
+             [(2, "1d", _smt("low"))],
+             [_psp_changed("1h", "2025-03-03 20:00", "swept"), _psp_changed("4h", "2025-03-03 16:00", "confirmed")]),
+        _tc([_reached("2025-03-01 00:00"), _reached("2025-03-02 00:00")], [_reached("2025-03-02 00:00", "low")]))
+    assert events.new_smt_max_levels == {"high": 3, "half_low": 2}
+    assert events.cancelled_smts == {("1d", "low")}
+    assert events.swept_psps == {("1h", "2025-03-03 20:00")}
+    assert events.reached_targets == {(1, "high", "prev_1d"): {"2025-03-01 00:00", "2025-03-02 00:00"},
+                                      (1, "low", "prev_1d"): {"2025-03-02 00:00"}}
+
+
+def test_cancel_by_smt_psp_change():
+    for spc, reason in [
+        (_spc(), None),
+        (_spc([(1, "1h", _smt("high"))]), None),  # an antagonist smt below the trade's level
+        (_spc([(5, "1month", _smt("low")), (5, "1month", _smt("half_low"))]), None),  # not antagonists
+        (_spc([(2, "4h", _smt("half_high"))]), "limit_antagonist_smt"),
+        (_spc([(1, "1h", _smt("high")), (3, "1w", _smt("high"))]), "limit_antagonist_smt"),
+        (_spc(cancelled_smts=[(2, "1d", _smt("half_low"))]), None),
+        (_spc(cancelled_smts=[(2, "4h", _smt("low"))]), None),
+        (_spc(cancelled_smts=[(2, "1d", _smt("low"))]), "limit_smt_cancelled"),
+        (_spc(psp_changed=[_psp_changed("1h", "2025-03-03 20:00", "confirmed")]), None),
+        (_spc(psp_changed=[_psp_changed("1h", "2025-03-03 19:00", "swept")]), None),
+        (_spc(psp_changed=[_psp_changed("4h", "2025-03-03 20:00", "swept")]), None),
+        (_spc(psp_changed=[_psp_changed("1h", "2025-03-03 20:00", "swept")]), "limit_psp_swept"),
+    ]:
+        res = _cancel_by_smt_psp_change(_trade(), _asset(), new_trade_events(spc, _tc()))
+        assert (res and res.closes[-1][4]) == reason
+        if res:
+            assert res.limit_status == "CANCELLED" and res.closes[-1][:3] == (100, 100.0, "2025-03-04 00:00")
+
+
+def test_close_by_other_swept_psp():
+    for psp_changed, reason in [
+        ([], None),
+        ([_psp_changed("1h", "2025-03-03 20:00", "confirmed")], None),
+        ([_psp_changed("1h", "2025-03-03 19:00", "swept")], None),
+        ([_psp_changed("1h", "2025-03-03 20:00", "swept")], "someone_psp_swept"),
+    ]:
+        res = _close_by_other_swept_psp(_trade(), _asset(), new_trade_events(_spc(psp_changed=psp_changed), _tc()))
+        assert (res and res.closes[-1][4]) == reason
+        if res:
+            assert res.percent_closed() == 50 and res.closes[-1][1] == 100.0
+
+
+def test_other_reached_target_cancels_any_ql_start_closes_the_same():
+    # the same target (level, direction, label) reached from two quarters: a limit order is cancelled whichever
+    # quarter it is, an opened trade is only closed when it is the quarter the trade targets
+    trade_ql, other_ql = "2025-03-02 00:00", "2025-03-01 00:00"
+    for tc, cancel_reason, close_reason in [
+        (_tc(), None, None),
+        (_tc([(2, "high", "prev_1d", trade_ql, 0, 110.0)]), None, None),
+        (_tc([(1, "high", "prev_1w", trade_ql, 0, 110.0)]), None, None),
+        (_tc(reached_short=[_reached(trade_ql, "low")]), None, None),
+        (_tc([_reached(other_ql)]), "limit_someone_reached_target", None),
+        (_tc([_reached(trade_ql)]), "limit_someone_reached_target", "someone_reached_target"),
+        (_tc([_reached(other_ql), _reached(trade_ql)]), "limit_someone_reached_target", "someone_reached_target"),
+        (_tc(reached_short=[_reached(trade_ql)]), "limit_someone_reached_target", "someone_reached_target"),
+    ]:
+        events = new_trade_events(_spc(), tc)
+        cancelled = _cancel_by_other_reached_target(_trade(), _asset(), events)
+        closed = _close_by_other_reached_target(_trade(), _asset(), events)
+        assert (cancelled and cancelled.closes[-1][4]) == cancel_reason
+        assert (closed and closed.closes[-1][4]) == close_reason
+        if closed:
+            assert closed.percent_closed() == 50
+
+    other_trade = _trade(ql_start=other_ql)
+    closed = _close_by_other_reached_target(other_trade, _asset(), new_trade_events(_spc(), _tc([_reached(other_ql)])))
+    assert closed is other_trade and closed.closes[-1][4] == "someone_reached_target"
+
+
+def _list_scan_th(stop_after, active_trades, tr, tos, spc, tc):  # strategy01_th visiting every trade on every tick
+    closed_trades, new_active_trades = [], []
+    assets = [tr.a1, tr.a2, tr.a3]
+    assets_d = {asset.symbol: asset for asset in assets}
+    events = new_trade_events(spc, tc)
+    now_t = time_core().parse(tr.a1.snapshot_date_readable)
+    strategy_stop = now_t >= time_core().parse(stop_after)
+
+    def deadline_reached(t):
+        return t.deadline_close != "" and now_t >= time_core().parse(t.deadline_close)
+
+    opened_trades = [x for x in active_trades if x.entry_time != ""]
+    for alo in [x for x in active_trades if x.limit_status == "ACTIVE"]:
+        trade_asset = assets_d[alo.asset]
+        opened_trade, updated_alo = _limit_trade_from_alo(alo, trade_asset, assets, tos)
+        if opened_trade:
+            opened_trades.append(opened_trade)
+            continue
+        alo = updated_alo or alo
+        cancelled = _cancel_by_tp_sl_deadlines(alo, trade_asset, strategy_stop, deadline_reached(alo)) or \
+            _cancel_by_smt_psp_change(alo, trade_asset, events) or \
+            _cancel_by_other_reached_target(alo, trade_asset, events)
+        if cancelled:
+            closed_trades.append(cancelled)
+            continue
+        new_active_trades.append(alo)
+
+    for at in opened_trades:
+        trade_asset = assets_d[at.asset]
+        for close in [lambda x: _close_by_tp_sl_deadlines(x, trade_asset, strategy_stop, deadline_reached(x)),
+                      lambda x: _close_by_other_swept_psp(x, trade_asset, events),
+                      lambda x: _close_by_other_reached_target(x, trade_asset, events)]:
+            at = close(at) or at
+            if at.percent_closed() == 100:
+                closed_trades.append(at)
+                break
+        else:
+            new_active_trades.append(_with_best(at, tr, tos))
+    return new_active_trades, closed_trades
+
+
+_SMT_TYPES, _SMT_LABELS = ["high", "half_high", "low", "half_low"], ["1h", "4h", "1d"]
+_PSPS = [("1h", "2025-03-03 19:00"), ("1h", "2025-03-03 20:00"), ("4h", "2025-03-03 16:00")]
+_TARGETS = [(lvl, direction, label) for lvl in [1, 2] for direction in ["high", "low"]
+            for label in ["prev_1d", "prev_1w"]]
+_QL_STARTS = ["2025-03-01 00:00", "2025-03-02 00:00"]
+
+
+def _grid_candles(rnd, n, start):  # prices on a 0.5 grid, so orders sit exactly on candle lows and highs
+    res = [[], [], []]
+    for a, price in enumerate([100.0, 50.0, 20.0]):
+        for i in range(n):
+            close = max(5.0, price + rnd.choice([-1.0, -0.5, 0, 0.5, 1.0]))
+            res[a].append((price, max(price, close) + rnd.choice([0, 0.5]), min(price, close) - rnd.choice([0, 0.5]),
+                           close, 1.0, epoch_to_date_str(to_epoch(start) + i * 15 * 60)))
+            price = close
+    return res
+
+
+def _random_trades(rnd, asset, deadlines):  # limit orders around the price, some chasing a tdo, a market trade
+    res = []
+    for _ in range(rnd.randint(0, 5)):
+        target = (*rnd.choice(_TARGETS), rnd.choice(_QL_STARTS), (0, 0), (0, 0), (0, 0))
+        psp_change = (rnd.randint(1, 3), rnd.choice(_SMT_LABELS), rnd.choice(_SMT_TYPES), "", "", *rnd.choice(_PSPS),
+                      "confirmed")
+        sign = 1 if target[1] == "high" else -1
+        price = asset.prev_15m_candle[3] + rnd.randint(-3, 3) * 0.5
+        stop, take = price - sign * rnd.randint(1, 4) * 0.5, price + sign * rnd.randint(1, 6) * 0.5
+        if rnd.random() < 0.2:
+            res.append(replace(_open_market_trade(
+                replace(asset, prev_15m_candle=(*asset.prev_15m_candle[:3], price, *asset.prev_15m_candle[4:])),
+                (2.0, 1.0, 100.0), target, psp_change, stop, (stop, stop, stop), take, []
+            ), deadline_close=rnd.choice(deadlines)))
+            continue
+        alo = _open_limit_orders(asset, (2.0, 1.0, 100.0), target, psp_change, stop, (stop, stop, stop), take,
+                                 [(asset.symbol, price, 0)])[0]
+        chase = rnd.random() < 0.15
+        res.append(replace(alo, limit_price_history=[] if chase else [price], closes=[],
+                           limit_chase_to_label="tdo" if chase else None, deadline_close=rnd.choice(deadlines)))
+    return res
+
+
+def _random_events(rnd):
+    new_smts = [(rnd.randint(1, 3), rnd.choice(_SMT_LABELS), _smt(rnd.choice(_SMT_TYPES)))
+                for _ in range(rnd.random() < 0.15)]
+    cancelled_smts = [(1, rnd.choice(_SMT_LABELS), _smt(rnd.choice(_SMT_TYPES))) for _ in range(rnd.random() < 0.15)]
+    psp_changed = [(1, "1d", "low", "", "", *rnd.choice(_PSPS), rnd.choice(["swept", "confirmed"]))
+                   for _ in range(rnd.random() < 0.2)]
+    reached = [(*rnd.choice(_TARGETS), rnd.choice(_QL_STARTS), 0, 0.0) for _ in range(rnd.random() < 0.2)]
+    return _spc(new_smts, cancelled_smts, psp_changed), _tc(reached)
+
+
+def test_trade_book_matches_list_scan():
+    rnd = random.Random(7)
+    candles = _grid_candles(rnd, 600, "2025-03-04 00:00")
+    snapshots = [epoch_to_date_str(to_epoch(c[5]) + 15 * 60) for c in candles[0]]
+    stop_after = snapshots[-1]
+    book, scanned = TradeBook(), []
+    closed_by_reason = {}
+    for i in range(len(snapshots)):
+        tr = TapeTriad(*[TapeAsset(symbol, snapshots[i], candles[a][i], new_empty_trends())
+                         for a, symbol in enumerate(["A", "B", "C"])])
+        tos = tuple([("tdo", candles[a][i - i % 32][0], 0)] if i % 64 < 48 else [] for a in range(3))
+        spc, tc = _random_events(rnd)
+
+        book, closed = strategy01_th(stop_after, book, tr, tos, spc, tc)
+        scanned, scanned_closed = _list_scan_th(stop_after, scanned, tr, tos, spc, tc)
+        assert closed == scanned_closed
+        assert list(book.limit_orders.values()) == [x for x in scanned if x.entry_time == ""]
+        assert list(book.opened.values()) == [x for x in scanned if x.entry_time != ""]
+        for t in closed:
+            closed_by_reason[t.closes[-1][4]] = closed_by_reason.get(t.closes[-1][4], 0) + 1
+            if t.entry_order_type == "LIMIT":
+                closed_by_reason["filled"] = closed_by_reason.get("filled", 0) + 1
+        if i == len(snapshots) - 1:
+            break
+
+        # orders cancelled this tick come back at the same levels and keys, next to new ones and new market trades
+        deadlines = [""] * 4 + snapshots[max(0, i - 1):i + 8]
+        new_trades = [replace(copy.deepcopy(t), limit_status="ACTIVE", closes=[])
+                      for t in closed if t.limit_status == "CANCELLED" and rnd.random() < 0.5]
+        new_trades += _random_trades(rnd, tr.a1, deadlines) + _random_trades(rnd, tr.a2, deadlines)
+        book.extend(copy.deepcopy(new_trades))
+        scanned.extend(copy.deepcopy(new_trades))
+
+    assert len(book) == 0 and scanned == []  # all closed by strategy_stop on the last tick
+    for reason in ["limit_stop", "limit_take_profit", "deadline", "limit_antagonist_smt", "limit_smt_cancelled",
+                   "limit_psp_swept", "limit_someone_reached_target", "stop", "take_profit", "strategy_stop"]:
+        assert closed_by_reason.get(reason, 0) > 0, reason
+    assert closed_by_reason.get("filled", 0) > 0
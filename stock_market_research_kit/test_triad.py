@@ -1,10 +1,20 @@
 import copy
+import random
+from dataclasses import asdict
 from datetime import timedelta
 
+from scripts.run_smt_psp_fronttester import fronttest, replay
+from stock_market_research_kit.asset import new_empty_asset
+from stock_market_research_kit.candle import as_1_candle, as_1h_candles, as_4h_candles, as_1d_candles, as_1w_candles, \
+    candle_series
 from stock_market_research_kit.db_layer import select_full_days_candles_15m, select_candles_15m
+from stock_market_research_kit.smt_psp_strategy import strategy01, strategy03, strategy05, strategy07
+from stock_market_research_kit.smt_psp_trade import json_from_smt_psp_trades
 from stock_market_research_kit.triad import Candles15mGenerator, new_triad, triad_from_json, json_from_triad, Triad, \
-    smt_dict_readable
-from utils.date_utils import to_utc_datetime
+    smt_dict_readable, PSP, new_empty_smt, smt_psp_changes, new_smt_found, smt_dict_old_smt_cancelled, \
+    calc_psp_changed, checkpoint_from_triad, triad_from_checkpoint, save_triad_checkpoint, load_triad_checkpoint, \
+    catch_up_triad, new_triad_from_history
+from utils.date_utils import to_utc_datetime, time_core, epoch_to_date_str, to_epoch
 
 snapshot_triad_23_15 = open("stock_market_research_kit/test_snapshots/triad_btc-eth-sol_08_08_2025_23_15.json", "r",
                             encoding="utf-8").read()
@@ -164,6 +174,271 @@ def test_09_aug_2025():
     assert json_from_triad(triad) + '\n' == snapshot_triad_00_15
 
 
+def loop_psps(triad: Triad, prev_candle_range, current_candle_range_getter, as_candles, smt, timeframe=''):
+    # Triad.calculate_psps before psp_kernel: candle by candle, every earlier PSP rescanned for sweeps
+    tc = time_core()
+    psps = []
+    a1_prev_candle, a2_prev_candle, a3_prev_candle = [as_1_candle(a.get_15m_candles_range(
+        tc.format(prev_candle_range[0]), tc.format(prev_candle_range[1])
+    )) for a in (triad.a1, triad.a2, triad.a3)]
+    a1_candles = as_candles(smt.a1_sweep_candles_15m)
+    a2_candles = as_candles(smt.a2_sweep_candles_15m)
+    a3_candles = as_candles(smt.a3_sweep_candles_15m)
+    if len(a1_candles) == 0:
+        return []
+
+    a1_min, a1_max = a1_candles[0][2], a1_candles[0][1]
+    a2_min, a2_max = a2_candles[0][2], a2_candles[0][1]
+    a3_min, a3_max = a3_candles[0][2], a3_candles[0][1]
+    snapshot_t = tc.parse(triad.a1.snapshot_date_readable)
+    snap_end = snapshot_t - tc.seconds(1)
+    for i in range(len(a1_candles)):
+        c_end = current_candle_range_getter(tc.parse(a1_candles[i][5]))[1]
+        for psp in psps:
+            if not psp.swept_from_to:
+                if smt.type in ['high', 'half_high']:
+                    if psp.a1_candle[1] < a1_candles[i][1] or psp.a2_candle[1] < a2_candles[i][1] \
+                            or psp.a3_candle[1] < a3_candles[i][1]:
+                        psp.swept_from_to = (a1_candles[i][5], tc.format(min(c_end, snap_end)))
+                elif smt.type in ['low', 'half_low']:
+                    if psp.a1_candle[2] > a1_candles[i][2] or psp.a2_candle[2] > a2_candles[i][2] \
+                            or psp.a3_candle[2] > a3_candles[i][2]:
+                        psp.swept_from_to = (a1_candles[i][5], tc.format(min(c_end, snap_end)))
+        try:
+            if len([x for x in [a1_candles[i], a2_candles[i], a3_candles[i]] if x[0] > x[3]]) in [0, 3]:
+                continue
+
+            q, is_high = {'high': (3, True), 'low': (5, False), 'half_high': (4, True), 'half_low': (4, False)}[smt.type]
+            if is_high and a1_candles[i][1] < smt.a1q[q][0] and a2_candles[i][1] < smt.a2q[q][0] \
+                    and a3_candles[i][1] < smt.a3q[q][0]:
+                continue
+            if not is_high and a1_candles[i][2] > smt.a1q[q][0] and a2_candles[i][2] > smt.a2q[q][0] \
+                    and a3_candles[i][2] > smt.a3q[q][0]:
+                continue
+
+            if i == 0:
+                if is_high and a1_candles[i][1] < a1_prev_candle[1] and a2_candles[i][1] < a2_prev_candle[1] \
+                        and a3_candles[i][1] < a3_prev_candle[1]:
+                    continue
+                if not is_high and a1_candles[i][2] > a1_prev_candle[2] and a2_candles[i][2] > a2_prev_candle[2] \
+                        and a3_candles[i][2] > a3_prev_candle[2]:
+                    continue
+            else:
+                if is_high and a1_candles[i][1] <= a1_max and a2_candles[i][1] <= a2_max \
+                        and a3_candles[i][1] <= a3_max:
+                    continue
+                if not is_high and a1_candles[i][2] >= a1_min and a2_candles[i][2] >= a2_min \
+                        and a3_candles[i][2] >= a3_min:
+                    continue
+
+            confirmed = False
+            if i != len(a1_candles) - 1 and current_candle_range_getter(tc.parse(a1_candles[i + 1][5]))[1] < snapshot_t:
+                if is_high:
+                    confirmed = a1_candles[i][1] > a1_candles[i + 1][1] or a2_candles[i][1] > a2_candles[i + 1][1] \
+                                or a3_candles[i][1] > a3_candles[i + 1][1]
+                else:
+                    confirmed = a1_candles[i][2] < a1_candles[i + 1][2] or a2_candles[i][2] < a2_candles[i + 1][2] \
+                                or a3_candles[i][2] < a3_candles[i + 1][2]
+
+            psps.append(PSP(a1_candles[i], a2_candles[i], a3_candles[i], confirmed, c_end <= snap_end, None))
+        finally:
+            a1_min, a1_max = min(a1_min, a1_candles[i][2]), max(a1_max, a1_candles[i][1])
+            a2_min, a2_max = min(a2_min, a2_candles[i][2]), max(a2_max, a2_candles[i][1])
+            a3_min, a3_max = min(a3_min, a3_candles[i][2]), max(a3_max, a3_candles[i][1])
+
+    return psps
+
+
+def _correlated_candles(n: int, start: str):  # three random walks sharing most of their moves
+    rnd = random.Random(5)
+    prices, res = [100.0, 50.0, 20.0], [[], [], []]
+    for i in range(n):
+        common = rnd.gauss(0, 0.5)
+        for a in range(3):
+            close = max(1.0, prices[a] + (common + rnd.gauss(0, 0.3)) * prices[a] / 100)
+            res[a].append((prices[a], max(prices[a], close) + rnd.random() * prices[a] / 300,
+                           min(prices[a], close) - rnd.random() * prices[a] / 300, close, 1.0,
+                           epoch_to_date_str(to_epoch(start) + i * 15 * 60)))
+            prices[a] = close
+    return res
+
+
+def _tick_psps(candles, ticks):  # psps of crafted SMTs on every tick, the triad is fed like in a fronttest
+    tc = time_core()
+    triad = Triad(new_empty_asset("A"), new_empty_asset("B"), new_empty_asset("C"))
+    timeframes = [(tc.get_prev_1h_from_to, tc.get_current_1h_from_to, as_1h_candles, '1h'),
+                  (tc.get_prev_4h_from_to, tc.get_current_4h_from_to, as_4h_candles, '4h'),
+                  (tc.get_prev_1d_from_to, tc.get_current_1d_from_to, as_1d_candles, '1d'),
+                  (tc.get_prev_1w_from_to, tc.get_current_1w_from_to, as_1w_candles, '1w')]
+    res = []
+    for i in range(len(candles[0]) - ticks, len(candles[0]) + 1):
+        for asset, asset_candles in zip((triad.a1, triad.a2, triad.a3), candles):
+            while len(asset.candles_15m) < i:
+                asset.candles_15m.append(asset_candles[len(asset.candles_15m)])
+            asset.snapshot_date_readable = epoch_to_date_str(to_epoch(asset_candles[i - 1][5]) + 15 * 60)
+        for next_tick_i in [len(candles[0]) - ticks - 96 * 9 - 30, len(candles[0]) - ticks - 41]:
+            next_tick = candles[0][next_tick_i][5]
+            levels = [(c[next_tick_i][0] * 1.004, c[next_tick_i][0], c[next_tick_i][0] * 0.996) for c in candles]
+            for smt_type in ['high', 'half_high', 'low', 'half_low']:
+                smt = new_empty_smt(*[("", "", True, (h, False), (m, False), (l, False)) for h, m, l in levels])
+                smt.type = smt_type
+                smt.a1_sweep_candles_15m, smt.a2_sweep_candles_15m, smt.a3_sweep_candles_15m = [
+                    a.get_15m_candles_range(next_tick, a.snapshot_date_readable) for a in (triad.a1, triad.a2, triad.a3)
+                ]
+                for prev_range, candle_range, as_candles, timeframe in timeframes:
+                    res.append(triad.calculate_psps(
+                        prev_range(tc.parse(next_tick)), candle_range, as_candles, smt, timeframe
+                    ))
+    return res
+
+
+def test_calculate_psps_matches_loop(monkeypatch):
+    candles = _correlated_candles(96 * 16, "2025-03-01 00:00")
+    psps = _tick_psps(candles, 96 * 2)
+    assert sum(len(x) for x in psps) > 100
+
+    monkeypatch.setattr(Triad, "calculate_psps", loop_psps)
+    assert _tick_psps(candles, 96 * 2) == psps
+
+
+def test_09_aug_2025_psps_match_loop(monkeypatch):
+    smt_psp = triad_from_snapshot(snapshot_triad_00_15).actual_smt_psp()
+
+    monkeypatch.setattr(Triad, "calculate_psps", loop_psps)
+    assert triad_from_snapshot(snapshot_triad_00_15).actual_smt_psp() == smt_psp
+
+
+def test_smt_psp_changes_match_diff_functions():
+    ql = ("", "", True, (2.0, True), (1.5, False), (1.0, False))
+    candle = lambda date: (1.0, 2.0, 0.5, 1.5, 1.0, date)
+
+    def smt(smt_type, psps):
+        res = new_empty_smt(ql, ql, ql)
+        res.type, res.first_appeared = smt_type, "2025-08-08 10:00"
+        res.psps_1h = [PSP(candle(d), candle(d), candle(d), confirmed, closed, swept) for d, confirmed, closed, swept
+                       in psps]
+        return res
+
+    old_high = smt('high', [("2025-08-08 11:00", False, True, None), ("2025-08-08 12:00", False, False, None)])
+    new_high = smt('high', [("2025-08-08 11:00", True, True, None), ("2025-08-08 12:00", False, True, None),
+                            ("2025-08-08 13:00", False, False, None)])
+    old_low, new_half = smt('low', []), smt('half_high', [])
+    l_old = [(1, '1d', (old_high, None, old_low)), (2, '1w', None), (3, '1month', (None, None, old_low))]
+    l_new = [(1, '1d', (new_high, new_half, None)), (2, '1w', (None, new_half, None)), (3, '1month', None)]
+
+    expected = (new_smt_found(l_old, l_new), smt_dict_old_smt_cancelled(l_old, l_new),
+                calc_psp_changed(("A", "B", "C"), l_old, l_new))
+    assert smt_psp_changes(("A", "B", "C"), l_old, l_new) == expected
+    assert [x[-1] for x in expected[2]] == ['confirmed', 'closed', 'possible']
+    assert smt_psp_changes(("A", "B", "C"), list(reversed(l_old)), l_new) == (
+        expected[0], list(reversed(expected[1])), expected[2])
+
+
+def test_triad_checkpoint_round_trip():
+    triad = Triad(new_empty_asset("A"), new_empty_asset("B"), new_empty_asset("C"))
+    for asset, candles in zip((triad.a1, triad.a2, triad.a3), _correlated_candles(96 * 3, "2025-03-01 00:00")):
+        asset.candles_15m, asset.candles_1h = candle_series(candles), candle_series(as_1h_candles(candles))
+        asset.snapshot_date_readable, asset.prev_15m_candle = "2025-03-04 00:00", candles[-1]
+        asset.current_1d_candle = as_1_candle(candles[-96:])
+        asset.asia = ("2025-03-02 23:00", "2025-03-03 04:59", True, (candles[5][1], True), (candles[5][3], False),
+                      (candles[5][2], False))
+        asset.true_do = (candles[20][0], candles[20][5])
+        asset.recalc_trends()
+
+    restored = triad_from_checkpoint(checkpoint_from_triad(triad))
+    assert restored == triad and json_from_triad(restored) == json_from_triad(triad)
+    assert triad_from_json(json_from_triad(triad)) == triad
+
+    restored.a1.candles_15m.append(triad.a1.candles_15m[-1])
+    assert len(restored.a1.candles_15m) == len(triad.a1.candles_15m) + 1
+
+
+def test_warm_start_from_checkpoint(tmp_path):
+    candles = _correlated_candles(96 * 400 + 8, "2023-12-20 00:00")  # history back to the previous year
+    history, live = [c[:-8] for c in candles], [c[-8:] for c in candles]
+    triad = new_triad(("A", "B", "C"), tuple(reversed(c) for c in history))
+    path = str(tmp_path / "triad.npz")
+    save_triad_checkpoint(triad, path)
+
+    assert load_triad_checkpoint(path, ("A", "B", "X")) is None
+    warm = load_triad_checkpoint(path, ("A", "B", "C"))
+    assert not catch_up_triad(warm, (live[0][1:], live[1][1:], live[2][1:]))  # a gap
+    assert catch_up_triad(warm, tuple(live))
+    for c1, c2, c3 in zip(*live):
+        triad.a1.plus_15m(c1)
+        triad.a2.plus_15m(c2)
+        triad.a3.plus_15m(c3)
+    assert warm == triad and warm.actual_smt_psp() == triad.actual_smt_psp()
+
+
+def test_truncated_checkpoint_is_not_loaded(tmp_path):
+    triad = Triad(new_empty_asset("A"), new_empty_asset("B"), new_empty_asset("C"))
+    for asset, candles in zip((triad.a1, triad.a2, triad.a3), _correlated_candles(96 * 3, "2025-03-01 00:00")):
+        asset.candles_15m, asset.candles_1h = candle_series(candles), candle_series(as_1h_candles(candles))
+    checkpoint = checkpoint_from_triad(triad)
+    for i, broken in enumerate([checkpoint[:len(checkpoint) // 2], checkpoint[:10], b""]):
+        path = tmp_path / f"triad_{i}.npz"
+        path.write_bytes(broken)
+        assert load_triad_checkpoint(str(path), ("A", "B", "C")) is None
+
+
+def test_populate_from_history_matches_populate():
+    candles = _correlated_candles(96 * 480, "2023-12-20 00:00")
+    gappy = [c[:96 * 400] + c[96 * 400 + 5:96 * 410] + c[96 * 410 + 61:] for c in candles]
+    for history in [candles, [c[:96 * 380 + 37] for c in candles], [c[:96 * 398 + 7] for c in candles], gappy]:
+        triad = new_triad(("A", "B", "C"), tuple(reversed(c) for c in history))
+        batch = new_triad_from_history(("A", "B", "C"), tuple(history))
+        assert batch == triad and json_from_triad(batch) == json_from_triad(triad)
+
+
+def test_trends_snapshots_are_not_mutated():
+    candles = _correlated_candles(96 * 400 + 96 * 2, "2023-12-20 00:00")
+    triad = new_triad_from_history(("A", "B", "C"), tuple(c[:96 * 400] for c in candles))
+    snapshots = []
+    for c1, c2, c3 in zip(*[c[96 * 400:] for c in candles]):
+        triad.a1.plus_15m(c1)
+        triad.a2.plus_15m(c2)
+        triad.a3.plus_15m(c3)
+        snapshots.append((triad.a1.trends, asdict(triad.a1.trends)))
+    assert len({id(x[0]) for x in snapshots}) > 1
+    assert all(asdict(trends) == d for trends, d in snapshots)
+    assert triad.a1.trends is triad.a1.trends
+
+
+def test_targets_book_is_kept_without_sweeps():
+    candles = _correlated_candles(96 * 400 + 5, "2023-12-20 00:00")
+    triad = new_triad_from_history(("A", "B", "C"), tuple(candles))
+    for tick in range(2):  # flat candles at the closes sweep nothing, the 1:15 and 1:30 ones close no quarter
+        long_targets, short_targets = triad.booked_targets('long'), triad.booked_targets('short')
+        for asset, asset_candles in zip((triad.a1, triad.a2, triad.a3), candles):
+            close = asset_candles[-1][3]
+            asset.plus_15m((close, close, close, close, 1.0,
+                            epoch_to_date_str(to_epoch(asset_candles[-1][5]) + (tick + 1) * 15 * 60)))
+        assert triad.booked_targets('long') is long_targets and triad.booked_targets('short') is short_targets
+
+
+def test_replay_matches_fronttest(tmp_path):
+    candles = _correlated_candles(96 * 400 + 96 * 3, "2023-12-20 00:00")
+    history, live = [c[:96 * 400] for c in candles], [c[96 * 400:] for c in candles]
+    strategies, stop_after = [strategy01, strategy03, strategy05, strategy07], live[0][-2][5]
+    tape_path = str(tmp_path / "tapes" / "tape.pickle")
+
+    trades = fronttest(new_triad_from_history(("A", "B", "C"), tuple(history)), strategies, zip(*live), stop_after,
+                       tape_path)
+    replayed = replay(tape_path, strategies, stop_after)
+    assert sum(len(x) for x in trades.values()) > 0
+    assert {k: json_from_smt_psp_trades(v) for k, v in replayed.items()} == \
+           {k: json_from_smt_psp_trades(v) for k, v in trades.items()}
+
+
+def test_fronttest_candles_ending_before_stop_after():
+    candles = _correlated_candles(96 * 400 + 8, "2023-12-20 00:00")
+    history, live = [c[:96 * 400] for c in candles], [c[96 * 400:] for c in candles]
+    trades = fronttest(new_triad_from_history(("A", "B", "C"), tuple(history)), [strategy07], iter(zip(*live)),
+                       "2025-02-01 00:00")
+    assert list(trades) == [strategy07.name]
+
+
 if __name__ == "__main__":
     try:
         test_09_aug_2025()
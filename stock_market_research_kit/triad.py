@@ -1,27 +1,35 @@
+import io
 import json
+import os
 import time
-from dataclasses import dataclass, asdict
-from datetime import timedelta, datetime
-from typing import Tuple, Optional, List, Dict, TypeAlias
+import zipfile
+from dataclasses import dataclass
+from typing import Tuple, Optional, List, Dict, TypeAlias, Callable
 
-from stock_market_research_kit.asset import QuarterLiq, Asset, new_empty_asset, Candles15mGenerator, TargetPercent
+import numpy as np
+
+from stock_market_research_kit.asset import QuarterLiq, Asset, new_empty_asset, Candles15mGenerator, TargetPercent, \
+    ASSET_CANDLE_FIELDS, dict_from_asset, asset_from_dict
 from stock_market_research_kit.candle import InnerCandle, as_1_candle, as_1month_candles, as_1w_candles, \
-    as_1d_candles, as_4h_candles, as_2h_candles, as_1h_candles, as_30m_candles, AsCandles, PriceDate
+    as_1d_candles, as_4h_candles, as_2h_candles, as_1h_candles, as_30m_candles, AsCandles, PriceDate, \
+    CandleSeries, new_empty_candle_series, candle_series_from_columns
 from stock_market_research_kit.quarter import MonthWeek, DayQuarter, WeekDay, YearQuarter
-from utils.date_utils import to_utc_datetime, to_date_str, get_prev_30m_from_to, get_current_30m_from_to, \
-    get_prev_1h_from_to, get_current_1h_from_to, get_prev_2h_from_to, get_current_2h_from_to, get_prev_4h_from_to, \
-    get_current_4h_from_to, get_prev_1d_from_to, get_current_1d_from_to, get_prev_1w_from_to, get_current_1w_from_to, \
-    get_prev_1month_from_to, get_current_1month_from_to, GetDateRange, humanize_timedelta, \
-    to_ny_date_str, quarters_by_time, month_week_quarters_ranges, weekday_ranges, day_quarters_ranges, \
-    year_quarters_ranges, log_info_ny, log_warn_ny
+from utils.date_utils import to_utc_datetime, humanize_timedelta, to_ny_date_str, log_info_ny, log_warn_ny, \
+    time_core
 
 Target: TypeAlias = Tuple[
     int, str, str, str, TargetPercent, TargetPercent, TargetPercent
 ]  # level, direction, label, ql_start, tp*3
 TrueOpen: TypeAlias = Tuple[str, float, float]  # label, price, percent_from_current
+PSPFrame: TypeAlias = Tuple[
+    np.ndarray, np.ndarray, Tuple[np.ndarray, np.ndarray], np.ndarray
+]  # idxs of different colors, highs and negated lows (2, n, 3), idxs of those swinging up/down, next one isn't (2, n)
+TRIAD_CHECKPOINT_FOLDER = "./data/checkpoints/"
+TRIAD_CHECKPOINT_VERSION = 1
+MAX_CACHED_SCANS = 1024  # per triad, first_appeared scans and PSP checkpoints of the quarters seen recently
 
 
-@dataclass
+@dataclass(slots=True)  # thousands per tick, the candles are the resampled ones, not copies
 class PSP:
     a1_candle: InnerCandle
     a2_candle: InnerCandle
@@ -32,7 +40,7 @@ class PSP:
     swept_from_to: Optional[List[Tuple[str, str, str]]]  # symbol, from, to_date
 
 
-@dataclass
+@dataclass(slots=True)
 class SMT:
     a1q: QuarterLiq
     a2q: QuarterLiq
@@ -41,9 +49,9 @@ class SMT:
     type: str  # 'high' 'low' 'half_high' or 'half_low'
     first_appeared: str
 
-    a1_sweep_candles_15m: List[InnerCandle]
-    a2_sweep_candles_15m: List[InnerCandle]
-    a3_sweep_candles_15m: List[InnerCandle]
+    a1_sweep_candles_15m: CandleSeries
+    a2_sweep_candles_15m: CandleSeries
+    a3_sweep_candles_15m: CandleSeries
 
     psps_15m: Optional[List[PSP]]
     psps_30m: Optional[List[PSP]]
@@ -56,6 +64,12 @@ class SMT:
 
 
 SMTLevels: TypeAlias = Tuple[Optional[SMT], Optional[SMT], Optional[SMT]]  # high, half, low
+PSPChange: TypeAlias = Tuple[
+    int, str, str, str, str, str, str, str
+]  # smt_level, smt_key, smt_type, smt_flags, smt_first_appeared, psp_key, psp_date, possible|closed|confirmed|swept
+SMTPSPChanges: TypeAlias = Tuple[
+    List[Tuple[int, str, SMT]], List[Tuple[int, str, SMT]], List[PSPChange]
+]  # new smts, cancelled smts, psp changes: (level, label, smt) like new_smt_found/smt_dict_old_smt_cancelled
 
 
 def new_empty_smt(a1q, a2q, a3q) -> SMT:
@@ -65,9 +79,9 @@ def new_empty_smt(a1q, a2q, a3q) -> SMT:
         a3q=a3q,
         type='',
         first_appeared='',
-        a1_sweep_candles_15m=[],
-        a2_sweep_candles_15m=[],
-        a3_sweep_candles_15m=[],
+        a1_sweep_candles_15m=new_empty_candle_series(),
+        a2_sweep_candles_15m=new_empty_candle_series(),
+        a3_sweep_candles_15m=new_empty_candle_series(),
         psps_15m=None,
         psps_30m=None,
         psps_1h=None,
@@ -79,6 +93,74 @@ def new_empty_smt(a1q, a2q, a3q) -> SMT:
     )
 
 
+def _sweep_columns(candles: CandleSeries, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:  # highs, lows
+    if isinstance(candles, CandleSeries):
+        return candles.highs[start:end], candles.lows[start:end]
+    return np.array([c[1] for c in candles[start:end]], dtype=np.float64), \
+        np.array([c[2] for c in candles[start:end]], dtype=np.float64)
+
+
+def psp_rows(
+        candles: Tuple[List[InnerCandle], List[InnerCandle], List[InnerCandle]],
+        current_candle_range_getter: Callable[[any], Tuple[any, any]]
+) -> Tuple[np.ndarray, list]:  # (3, n, 4) open, high, low, close of the assets' candles, end of every candle
+    tc = time_core()
+    if len(candles[0]) == 0:
+        return np.empty((3, 0, 4), dtype=np.float64), []
+    ohlc = np.array([[c[:4] for c in asset_candles] for asset_candles in candles], dtype=np.float64)
+    return ohlc, [current_candle_range_getter(tc.parse(c[5]))[1] for c in candles[0]]
+
+
+def psp_frame(ohlc: np.ndarray) -> PSPFrame:
+    n = ohlc.shape[1]
+    bearish = (ohlc[:, :, 0] > ohlc[:, :, 3]).sum(axis=0)
+    diverges = (bearish != 0) & (bearish != 3)
+
+    ups = np.stack([ohlc[:, :, 1].T, -ohlc[:, :, 2].T])  # (2, n, 3), lows negated to be swept upwards too
+    if not diverges.any():  # no PSP candles, ups only sweep the earlier ones
+        none = np.flatnonzero(diverges)
+        return none, ups, (none, none), np.zeros((2, n), dtype=bool)
+    swings = np.ones((2, n), dtype=bool)  # the first candle is compared to the previous one later
+    swings[:, 1:] = (ups[:, 1:] > np.maximum.accumulate(ups, axis=1)[:, :-1]).any(axis=2)
+    next_beyond = np.zeros((2, n), dtype=bool)
+    next_beyond[:, :-1] = (ups[:, :-1] > ups[:, 1:]).any(axis=2)
+    return np.flatnonzero(diverges), ups, (np.flatnonzero(diverges & swings[0]), np.flatnonzero(diverges & swings[1])), \
+        next_beyond
+
+
+def psp_kernel(
+        frame: PSPFrame, smt_type: str, levels: Tuple[float, float, float],
+        prev_candles: Callable[[], Tuple[InnerCandle, InnerCandle, InnerCandle]]  # only the first candle needs them
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:  # PSP candle idxs, next candle confirms, idx of the first sweep or -1
+    diverging, ups, candidates, next_beyond = frame
+    if smt_type not in ['high', 'half_high', 'low', 'half_low']:  # no level, swing or confirmation rules
+        idxs = diverging
+        return idxs, np.zeros(len(idxs), dtype=bool), np.full(len(idxs), -1)
+
+    d, sign = (0, 1) if smt_type in ['high', 'half_high'] else (1, -1)
+    ups, idxs = ups[d], candidates[d]
+    if len(idxs) == 0:
+        return idxs, idxs.astype(bool), idxs
+
+    # candles of different colors beyond all earlier candles, that sweep the level
+    idxs = idxs[(ups[idxs] >= np.array(levels) * sign).any(axis=1)]
+    if len(idxs) and idxs[0] == 0 \
+            and not any(up >= (c[1] if d == 0 else -c[2]) for up, c in zip(ups[0].tolist(), prev_candles())):
+        idxs = idxs[1:]  # the first candle swings beyond the previous one
+    if len(idxs) == 0:
+        return idxs, idxs.astype(bool), idxs
+
+    return idxs, next_beyond[d, idxs], psps_swept_by(ups, ups[idxs], idxs)
+
+
+def psps_swept_by(
+        ups: np.ndarray, psp_ups: np.ndarray, after: np.ndarray
+) -> np.ndarray:  # idx of the first candle after `after` beyond the PSP candle on any asset, or -1
+    beyond = (ups[None, :, :] > psp_ups[:, None, :]).any(axis=2)
+    beyond &= np.arange(len(ups))[None, :] > after[:, None]
+    return np.where(beyond.any(axis=1), beyond.argmax(axis=1), -1)
+
+
 def percent_from_current(current: float, target: float) -> float:
     return round((target - current) / current * 100, 2)
 
@@ -89,6 +171,18 @@ class Triad:
     a2: Asset
     a3: Asset
 
+    def __post_init__(self):
+        # not fields: kept out of asdict/json snapshots, incremental state of actual_smt_psp between ticks
+        self.smt_scans: Dict[Tuple[str, str, Tuple[float, float, float]], list] = {}
+        self.tick_candles: Dict[tuple, tuple] = {}  # HTF and previous candles of the last tick, shared by SMTs
+        self.tick_candles_of: Optional[tuple] = None
+        self.psp_checkpoints: Dict[tuple, tuple] = {}
+        # labels of actual_prev_qls, the same for the whole day quarter: (quarters, dq from, dq to, [(level, label)])
+        self.prev_qls_layout: Optional[Tuple[tuple, any, any, List[Tuple[int, str]]]] = None
+        # target book: the qls the long/short targets were picked from, (level, direction, label, ql_start, prices)
+        # of the unswept ones. Rebuilt only when a quarter closes or a level gets swept, priced on every tick
+        self.target_book: Dict[str, Tuple[list, List[Tuple[int, str, str, str, Tuple[float, float, float]]]]] = {}
+
     def true_opens(
             self
     ) -> Tuple[List[TrueOpen], List[TrueOpen], List[TrueOpen]]:
@@ -192,22 +286,63 @@ class Triad:
         return result
 
     def long_targets(self) -> List[Target]:
-        return sorted(
-            self.ql_long_targets(self.actual_prev_qls()),
-            key=lambda t: t[1][1]
-        )
+        # same as sorted(self.ql_long_targets(self.actual_prev_qls()), key=lambda t: t[1][1]): half_high ones first
+        return self.priced_targets(self.booked_targets('long'), 'half_high', lambda pfc: pfc > 0)
 
     def short_targets(self) -> List[Target]:
-        return sorted(
-            self.ql_short_targets(self.actual_prev_qls()),
-            key=lambda t: t[1][1],
-            reverse=True
-        )
+        # same as sorted(self.ql_short_targets(self.actual_prev_qls()), key=lambda t: t[1][1], reverse=True)
+        return self.priced_targets(self.booked_targets('short'), 'half_low', lambda pfc: pfc < 0)
+
+    def booked_targets(self, side: str) -> List[Tuple[int, str, str, str, Tuple[float, float, float]]]:
+        qls = self.actual_prev_qls()
+        booked_qls, targets = self.target_book.get(side, (None, None))
+        if booked_qls is not None and len(booked_qls) == len(qls) \
+                and all(a is b for old, new in zip(booked_qls, qls) for a, b in zip(old[2:], new[2:])):
+            return targets  # QuarterLiq tuples are replaced on a sweep, the same ones mean the same targets
+
+        half, edge, edge_i = ('half_high', 'high', 3) if side == 'long' else ('half_low', 'low', 5)
+        halves, edges = [], []
+        for level, label, a1_ql, a2_ql, a3_ql in qls:
+            if not a1_ql or not a2_ql or not a3_ql:
+                continue
+            if not a1_ql[4][1] and not a2_ql[4][1] and not a3_ql[4][1]:
+                halves.append((level, half, label, a1_ql[0], (a1_ql[4][0], a2_ql[4][0], a3_ql[4][0])))
+            if not a1_ql[edge_i][1] and not a2_ql[edge_i][1] and not a3_ql[edge_i][1]:
+                edges.append((level, edge, label, a1_ql[0], (a1_ql[edge_i][0], a2_ql[edge_i][0], a3_ql[edge_i][0])))
+        targets = halves + edges if side == 'long' else edges + halves
+        self.target_book[side] = qls, targets
+        return targets
+
+    def priced_targets(
+            self, targets: List[Tuple[int, str, str, str, Tuple[float, float, float]]], half: str,
+            half_pfc_ok: Callable[[float], bool]  # half targets are only those on the target side of the price
+    ) -> List[Target]:
+        closes = (self.a1.prev_15m_candle[3], self.a2.prev_15m_candle[3], self.a3.prev_15m_candle[3])
+        result = []
+        for level, direction, label, ql_start, prices in targets:
+            pfcs = [percent_from_current(close, price) for close, price in zip(closes, prices)]
+            if direction == half and not all(half_pfc_ok(pfc) for pfc in pfcs):
+                continue
+            result.append((level, direction, label, ql_start, *zip(prices, pfcs)))
+        return result
 
     def actual_prev_qls(self) -> List[Tuple[int, str, QuarterLiq, QuarterLiq, QuarterLiq]]:
+        tc = time_core()
+        snapshot_t = tc.parse(self.a1.snapshot_date_readable)
+        quarters = tc.quarters_by_time(snapshot_t)[:4]  # no 90m quarters liq
+        layout = self.prev_qls_layout
+        if not layout or layout[0] != quarters or not layout[1] <= snapshot_t <= layout[2]:  # dq ranges overlap on DST
+            layout = self.prev_qls_layout = self.new_prev_qls_layout(snapshot_t)
+
+        return [(level, label, getattr(self.a1, label), getattr(self.a2, label), getattr(self.a3, label))
+                for level, label in layout[3]]
+
+    def new_prev_qls_layout(self, snapshot_t) -> Tuple[tuple, any, any, List[Tuple[int, str]]]:
         result = []
 
-        curr_yq, curr_mw, curr_wd, curr_dq, curr_q90m = quarters_by_time(self.a1.snapshot_date_readable)
+        tc = time_core()
+        curr_yq, curr_mw, curr_wd, curr_dq, curr_q90m = tc.quarters_by_time(snapshot_t)
+        dq_from, dq_to = snapshot_t, snapshot_t  # out of the calendar, this tick only
 
         # for q90m, _, _ in quarters90m_ranges(self.a1.snapshot_date_readable)[0]:
         #     match q90m:
@@ -220,70 +355,72 @@ class Triad:
         #         case Quarter90m.Q4_90m:
         #             result.append(('q4_90m', self.a1.q4_90m, self.a2.q4_90m, self.a3.q4_90m))
 
-        for dq, _, _ in day_quarters_ranges(self.a1.snapshot_date_readable)[0]:
+        for dq, from_, to in tc.day_quarters_ranges(snapshot_t)[0]:
             if dq == curr_dq:
+                if from_ <= snapshot_t <= to:
+                    dq_from, dq_to = from_, to
                 continue
             match dq:
                 case DayQuarter.DQ1_Asia:
-                    result.append((5, 'asia', self.a1.asia, self.a2.asia, self.a3.asia))
+                    result.append((5, 'asia'))
                 case DayQuarter.DQ2_London:
-                    result.append((5, 'london', self.a1.london, self.a2.london, self.a3.london))
+                    result.append((5, 'london'))
                 case DayQuarter.DQ3_NYAM:
-                    result.append((5, 'nyam', self.a1.nyam, self.a2.nyam, self.a3.nyam))
+                    result.append((5, 'nyam'))
                 case DayQuarter.DQ4_NYPM:
-                    result.append((5, 'nypm', self.a1.nypm, self.a2.nypm, self.a3.nypm))
+                    result.append((5, 'nypm'))
 
-        for wd, _, _ in weekday_ranges(self.a1.snapshot_date_readable)[0]:
+        for wd, _, _ in tc.weekday_ranges(snapshot_t)[0]:
             if wd == curr_wd:
                 continue
             match wd:
                 case WeekDay.Mon:
-                    result.append((4, 'mon', self.a1.mon, self.a2.mon, self.a3.mon))
+                    result.append((4, 'mon'))
                 case WeekDay.Tue:
-                    result.append((4, 'tue', self.a1.tue, self.a2.tue, self.a3.tue))
+                    result.append((4, 'tue'))
                 case WeekDay.Wed:
-                    result.append((4, 'wed', self.a1.wed, self.a2.wed, self.a3.wed))
+                    result.append((4, 'wed'))
                 case WeekDay.Thu:
-                    result.append((4, 'thu', self.a1.thu, self.a2.thu, self.a3.thu))
+                    result.append((4, 'thu'))
                 case WeekDay.MonThu:
-                    result.append((4, 'mon_thu', self.a1.mon_thu, self.a2.mon_thu, self.a3.mon_thu))
+                    result.append((4, 'mon_thu'))
                 case WeekDay.Fri:
-                    result.append((4, 'fri', self.a1.fri, self.a2.fri, self.a3.fri))
+                    result.append((4, 'fri'))
                 case WeekDay.MonFri:
-                    result.append((4, 'mon_fri', self.a1.mon_fri, self.a2.mon_fri, self.a3.mon_fri))
+                    result.append((4, 'mon_fri'))
                 case WeekDay.Sat:
-                    result.append((4, 'sat', self.a1.sat, self.a2.sat, self.a3.sat))
+                    result.append((4, 'sat'))
 
-        for mw, _, _ in month_week_quarters_ranges(self.a1.snapshot_date_readable)[0]:
+        for mw, _, _ in tc.month_week_quarters_ranges(snapshot_t)[0]:
             if mw == curr_mw:
                 continue
             match mw:
                 case MonthWeek.MW1:
-                    result.append((3, 'week1', self.a1.week1, self.a2.week1, self.a3.week1))
+                    result.append((3, 'week1'))
                 case MonthWeek.MW2:
-                    result.append((3, 'week2', self.a1.week2, self.a2.week2, self.a3.week2))
+                    result.append((3, 'week2'))
                 case MonthWeek.MW3:
-                    result.append((3, 'week3', self.a1.week3, self.a2.week3, self.a3.week3))
+                    result.append((3, 'week3'))
                 case MonthWeek.MW4:
-                    result.append((3, 'week4', self.a1.week4, self.a2.week4, self.a3.week4))
+                    result.append((3, 'week4'))
                 case MonthWeek.MW5:
-                    result.append((3, 'week5', self.a1.week5, self.a2.week5, self.a3.week5))
+                    result.append((3, 'week5'))
 
-        for yq, _, _ in year_quarters_ranges(self.a1.snapshot_date_readable)[0]:
+        for yq, _, _ in tc.year_quarters_ranges(snapshot_t)[0]:
             if yq == curr_yq:
                 continue
             match yq:
                 case YearQuarter.YQ1:
-                    result.append((2, 'year_q1', self.a1.year_q1, self.a2.year_q1, self.a3.year_q1))
+                    result.append((2, 'year_q1'))
                 case YearQuarter.YQ2:
-                    result.append((2, 'year_q2', self.a1.year_q2, self.a2.year_q2, self.a3.year_q2))
+                    result.append((2, 'year_q2'))
                 case YearQuarter.YQ3:
-                    result.append((2, 'year_q3', self.a1.year_q3, self.a2.year_q3, self.a3.year_q3))
+                    result.append((2, 'year_q3'))
                 case YearQuarter.YQ4:
-                    result.append((2, 'year_q4', self.a1.year_q4, self.a2.year_q4, self.a3.year_q4))
+                    result.append((2, 'year_q4'))
 
-        result.append((1, 'prev_year', self.a1.prev_year, self.a2.prev_year, self.a3.prev_year))
-        return result
+        result.append((1, 'prev_year'))
+        return (curr_yq, curr_mw, curr_wd, curr_dq), dq_from, dq_to, result
 
     def new_smt(
             self, next_tick: str, a1_ql, a2_ql, a3_ql: QuarterLiq
@@ -309,12 +446,10 @@ class Triad:
             high_smt.a1_sweep_candles_15m = a1_sweep_candles_15m
             high_smt.a2_sweep_candles_15m = a2_sweep_candles_15m
             high_smt.a3_sweep_candles_15m = a3_sweep_candles_15m
-            for i in range(len(high_smt.a1_sweep_candles_15m)):
-                c1, c2, c3 = high_smt.a1_sweep_candles_15m[i], high_smt.a2_sweep_candles_15m[i], \
-                    high_smt.a3_sweep_candles_15m[i]
-                if len([x for x in [c1[1] > a1_high[0], c2[1] > a2_high[0], c3[1] > a3_high[0]] if x]) not in [0, 3]:
-                    high_smt.first_appeared = c1[5]
-                    break
+            high_smt.first_appeared = self.first_appeared(
+                next_tick, 'high', (a1_high[0], a2_high[0], a3_high[0]),
+                (a1_sweep_candles_15m, a2_sweep_candles_15m, a3_sweep_candles_15m)
+            )
 
         is_low = len([x for x in [a1_low[1], a2_low[1], a3_low[1]] if x]) not in [0, 3]
         low_smt = new_empty_smt(a1_ql, a2_ql, a3_ql) if is_low else None
@@ -323,12 +458,10 @@ class Triad:
             low_smt.a1_sweep_candles_15m = a1_sweep_candles_15m
             low_smt.a2_sweep_candles_15m = a2_sweep_candles_15m
             low_smt.a3_sweep_candles_15m = a3_sweep_candles_15m
-            for i in range(len(low_smt.a1_sweep_candles_15m)):
-                c1, c2, c3 = low_smt.a1_sweep_candles_15m[i], low_smt.a2_sweep_candles_15m[i], \
-                    low_smt.a3_sweep_candles_15m[i]
-                if len([x for x in [c1[2] < a1_low[0], c2[2] < a2_low[0], c3[2] < a3_low[0]] if x]) not in [0, 3]:
-                    low_smt.first_appeared = c1[5]
-                    break
+            low_smt.first_appeared = self.first_appeared(
+                next_tick, 'low', (a1_low[0], a2_low[0], a3_low[0]),
+                (a1_sweep_candles_15m, a2_sweep_candles_15m, a3_sweep_candles_15m)
+            )
 
         is_half_swept = len([x for x in [a1_half[1], a2_half[1], a3_half[1]] if x]) not in [0, 3]
         is_half_high = a1_q_close and (a1_low[0] <= a1_q_close < a1_half[0] and
@@ -345,42 +478,106 @@ class Triad:
             half_smt.a1_sweep_candles_15m = a1_sweep_candles_15m
             half_smt.a2_sweep_candles_15m = a2_sweep_candles_15m
             half_smt.a3_sweep_candles_15m = a3_sweep_candles_15m
-            for i in range(len(half_smt.a1_sweep_candles_15m)):
-                c1, c2, c3 = half_smt.a1_sweep_candles_15m[i], half_smt.a2_sweep_candles_15m[i], \
-                    half_smt.a3_sweep_candles_15m[i]
-                if len([x for x in [
-                    c1[1] > a1_half[0] > c1[2],
-                    c2[1] > a2_half[0] > c2[2],
-                    c3[1] > a3_half[0] > c3[2]
-                ] if x]) not in [0, 3]:
-                    half_smt.first_appeared = c1[5]
-                    break
+            half_smt.first_appeared = self.first_appeared(
+                next_tick, 'half', (a1_half[0], a2_half[0], a3_half[0]),
+                (a1_sweep_candles_15m, a2_sweep_candles_15m, a3_sweep_candles_15m)
+            )
 
         return high_smt, half_smt, low_smt
 
+    def first_appeared(
+            self, next_tick: str, kind: str, levels: Tuple[float, float, float],
+            sweep_candles: Tuple[CandleSeries, CandleSeries, CandleSeries]
+    ) -> str:  # date of the first sweep candle where some, but not all, assets take their level
+        # sweep candles of a quarter only grow, so the scan resumes where the previous tick stopped
+        series = (self.a1.candles_15m, self.a2.candles_15m, self.a3.candles_15m)
+        key = (next_tick, kind, levels)
+        scan = self.smt_scans.get(key)
+        if scan is None or any(a is not b for a, b in zip(scan[0], series)) or scan[1] > len(sweep_candles[0]):
+            if len(self.smt_scans) >= MAX_CACHED_SCANS:
+                del self.smt_scans[next(iter(self.smt_scans))]
+            scan = self.smt_scans[key] = [series, 0, '']
+        _, scanned, found = scan
+        end = len(sweep_candles[0])
+        if found or scanned == end:
+            return found
+
+        taken = 0
+        for candles, level in zip(sweep_candles, levels):
+            highs, lows = _sweep_columns(candles, scanned, end)
+            match kind:
+                case 'high':
+                    taken = taken + (highs > level)
+                case 'low':
+                    taken = taken + (lows < level)
+                case 'half':
+                    taken = taken + ((highs > level) & (level > lows))
+        first = np.flatnonzero((taken != 0) & (taken != 3))
+        scan[1], scan[2] = end, '' if len(first) == 0 else sweep_candles[0][scanned + int(first[0])][5]
+        return scan[2]
+
+    def shared_tick_candles(self) -> Dict[tuple, tuple]:
+        tick = (len(self.a1.candles_15m), len(self.a2.candles_15m), len(self.a3.candles_15m))
+        if self.tick_candles_of != tick:  # 15m candles are only appended, a new one makes everything stale
+            self.tick_candles, self.tick_candles_of = {}, tick
+        return self.tick_candles
+
+    def psp_candles(self, smt: SMT, as_candles: AsCandles, timeframe: str) -> Tuple[
+        List[InnerCandle], List[InnerCandle], List[InnerCandle]
+    ]:  # high, half and low SMTs of a quarter share sweep candles: each timeframe is aggregated once per tick
+        sweeps = (smt.a1_sweep_candles_15m, smt.a2_sweep_candles_15m, smt.a3_sweep_candles_15m)
+        if not timeframe:
+            return as_candles(sweeps[0]), as_candles(sweeps[1]), as_candles(sweeps[2])
+        shared = self.shared_tick_candles()
+        key = (timeframe, id(sweeps[0]))
+        hit = shared.get(key)
+        if hit is None or any(a is not b for a, b in zip(hit[0], sweeps)):
+            # the sweeps are kept with the candles, so their ids can't be reused during the tick
+            hit = shared[key] = (sweeps, (as_candles(sweeps[0]), as_candles(sweeps[1]), as_candles(sweeps[2])))
+        return hit[1]
+
+    def prev_psp_candles(self, from_: str, to: str) -> Tuple[InnerCandle, InnerCandle, InnerCandle]:
+        shared = self.shared_tick_candles()
+        key = ('prev', from_, to)
+        hit = shared.get(key)
+        if hit is None:
+            hit = shared[key] = (None, tuple(as_1_candle(a.get_15m_candles_range(from_, to))
+                                             for a in (self.a1, self.a2, self.a3)))
+        return hit[1]
+
+    def psp_rows_frame(
+            self, candles: Tuple[List[InnerCandle], List[InnerCandle], List[InnerCandle]], start: int,
+            min_max: Optional[Tuple[float, float, float, float, float, float]],  # of the candles before start
+            current_candle_range_getter: Callable[[any], Tuple[any, any]], timeframe: str
+    ) -> Tuple[np.ndarray, list, PSPFrame]:  # high, half and low SMTs of a quarter share the frame of their candles
+        shared = self.shared_tick_candles() if timeframe else {}
+        key = ('frame', timeframe, id(candles[0]), start, min_max)
+        hit = shared.get(key)
+        if hit is None or hit[0] is not candles[0]:
+            ohlc, ends = psp_rows((candles[0][start:], candles[1][start:], candles[2][start:]),
+                                  current_candle_range_getter)
+            if min_max is not None:
+                # behind a flat candle of the earlier candles' min/max: it is never a PSP itself, and the candles
+                # after it swing when they are beyond all the earlier ones
+                a1_min, a1_max, a2_min, a2_max, a3_min, a3_max = min_max
+                seed = np.array([[low, high, low, low] for low, high in ((a1_min, a1_max), (a2_min, a2_max),
+                                                                         (a3_min, a3_max))], dtype=np.float64)
+                ohlc, ends = np.concatenate([seed[:, None, :], ohlc], axis=1), [None] + ends
+            hit = shared[key] = (candles[0], (ohlc, ends, psp_frame(ohlc)))
+        return hit[1]
+
     def calculate_psps(
             self,
-            prev_candle_range: Tuple[datetime, datetime],
-            current_candle_range_getter: GetDateRange,
+            prev_candle_range: Tuple[any, any],  # in time_core() times
+            current_candle_range_getter: Callable[[any], Tuple[any, any]],
             as_candles: AsCandles,
-            smt: SMT
+            smt: SMT,
+            timeframe: str = ''  # as_candles timeframe: shares candles between SMTs, resumes from checkpoints
     ) -> List[PSP]:
         _as_1_candle_time = time.perf_counter()
+        tc = time_core()
 
-        psps = []
-        a1_prev_candle = as_1_candle(self.a1.get_15m_candles_range(
-            to_date_str(prev_candle_range[0]), to_date_str(prev_candle_range[1])
-        ))
-        a2_prev_candle = as_1_candle(self.a2.get_15m_candles_range(
-            to_date_str(prev_candle_range[0]), to_date_str(prev_candle_range[1])
-        ))
-        a3_prev_candle = as_1_candle(self.a3.get_15m_candles_range(
-            to_date_str(prev_candle_range[0]), to_date_str(prev_candle_range[1])
-        ))
-
-        a1_candles = as_candles(smt.a1_sweep_candles_15m)
-        a2_candles = as_candles(smt.a2_sweep_candles_15m)
-        a3_candles = as_candles(smt.a3_sweep_candles_15m)
+        a1_candles, a2_candles, a3_candles = self.psp_candles(smt, as_candles, timeframe)
 
         _as_1_candle_took = time.perf_counter() - _as_1_candle_time
         # if _as_1_candle_took > 0.05:
@@ -389,114 +586,74 @@ class Triad:
         if len(a1_candles) == 0:
             return []
 
-        a1_min, a1_max = a1_candles[0][2], a1_candles[0][1]
-        a2_min, a2_max = a2_candles[0][2], a2_candles[0][1]
-        a3_min, a3_max = a3_candles[0][2], a3_candles[0][1]
-
         _psps_calculation_time = time.perf_counter()
-        for i in range(len(a1_candles)):
-            c_end = current_candle_range_getter(a1_candles[i][5])[1]
-            snap_end = to_utc_datetime(self.a1.snapshot_date_readable) - timedelta(seconds=1)
-            for j in range(len(psps)):
-                if not psps[j].swept_from_to:
-                    if smt.type in ['high', 'half_high']:
-                        if psps[j].a1_candle[1] < a1_candles[i][1] \
-                                or psps[j].a2_candle[1] < a2_candles[i][1] \
-                                or psps[j].a3_candle[1] < a3_candles[i][1]:
-                            psps[j].swept_from_to = (
-                                a1_candles[i][5],
-                                to_date_str(min(c_end, snap_end))
-                            )
-                    elif smt.type in ['low', 'half_low']:
-                        if psps[j].a1_candle[2] > a1_candles[i][2] \
-                                or psps[j].a2_candle[2] > a2_candles[i][2] \
-                                or psps[j].a3_candle[2] > a3_candles[i][2]:
-                            psps[j].swept_from_to = (
-                                a1_candles[i][5],
-                                to_date_str(min(c_end, snap_end))
-                            )
-            try:
-                # check if different colors
-                if len([x for x in [a1_candles[i], a2_candles[i], a3_candles[i]] if x[0] > x[3]]) in [0, 3]:
-                    continue
-
-                # check if this candle sweeps
-                if smt.type == 'high':
-                    if a1_candles[i][1] < smt.a1q[3][0] \
-                            and a2_candles[i][1] < smt.a2q[3][0] \
-                            and a3_candles[i][1] < smt.a3q[3][0]:
-                        continue
-
-                if smt.type == 'low':
-                    if a1_candles[i][2] > smt.a1q[5][0] \
-                            and a2_candles[i][2] > smt.a2q[5][0] \
-                            and a3_candles[i][2] > smt.a3q[5][0]:
-                        continue
-
-                if smt.type == 'half_high':
-                    if a1_candles[i][1] < smt.a1q[4][0] \
-                            and a2_candles[i][1] < smt.a2q[4][0] \
-                            and a3_candles[i][1] < smt.a3q[4][0]:
-                        continue
-
-                if smt.type == 'half_low':
-                    if a1_candles[i][2] > smt.a1q[4][0] \
-                            and a2_candles[i][2] > smt.a2q[4][0] \
-                            and a3_candles[i][2] > smt.a3q[4][0]:
-                        continue
-
-                # check if swing
-                if i == 0:
-                    if smt.type in ['high', 'half_high']:
-                        if a1_candles[i][1] < a1_prev_candle[1] \
-                                and a2_candles[i][1] < a2_prev_candle[1] \
-                                and a3_candles[i][1] < a3_prev_candle[1]:
-                            continue
-                    elif smt.type in ['low', 'half_low']:
-                        if a1_candles[i][2] > a1_prev_candle[2] \
-                                and a2_candles[i][2] > a2_prev_candle[2] \
-                                and a3_candles[i][2] > a3_prev_candle[2]:
-                            continue
-                else:
-                    if smt.type in ['high', 'half_high']:
-                        if a1_candles[i][1] <= a1_max \
-                                and a2_candles[i][1] <= a2_max \
-                                and a3_candles[i][1] <= a3_max:
-                            continue
-                    elif smt.type in ['low', 'half_low']:
-                        if a1_candles[i][2] >= a1_min \
-                                and a2_candles[i][2] >= a2_min \
-                                and a3_candles[i][2] >= a3_min:
-                            continue
-
-                confirmed = False
-                if i != len(a1_candles) - 1:
-                    next_c_end = current_candle_range_getter(a1_candles[i + 1][5])[1]
-                    next_c_ended = next_c_end < to_utc_datetime(self.a1.snapshot_date_readable)
-                    if next_c_ended:
-                        if smt.type in ['high', 'half_high']:
-                            if a1_candles[i][1] > a1_candles[i + 1][1] \
-                                    or a2_candles[i][1] > a2_candles[i + 1][1] \
-                                    or a3_candles[i][1] > a3_candles[i + 1][1]:
-                                confirmed = True
-                        elif smt.type in ['low', 'half_low']:
-                            if a1_candles[i][2] < a1_candles[i + 1][2] \
-                                    or a2_candles[i][2] < a2_candles[i + 1][2] \
-                                    or a3_candles[i][2] < a3_candles[i + 1][2]:
-                                confirmed = True
-
-                psps.append(PSP(
-                    a1_candle=a1_candles[i],
-                    a2_candle=a2_candles[i],
-                    a3_candle=a3_candles[i],
-                    confirmed=confirmed,
-                    closed=c_end <= snap_end,
-                    swept_from_to=None
-                ))
-            finally:
-                a1_min, a1_max = min(a1_min, a1_candles[i][2]), max(a1_max, a1_candles[i][1])
-                a2_min, a2_max = min(a2_min, a2_candles[i][2]), max(a2_max, a2_candles[i][1])
-                a3_min, a3_max = min(a3_min, a3_candles[i][2]), max(a3_max, a3_candles[i][1])
+        snapshot_t = tc.parse(self.a1.snapshot_date_readable)
+        snap_end = snapshot_t - tc.seconds(1)
+        last_closed = len(a1_candles) - 3
+
+        # all but the last two candles are closed and followed by a closed one, so PSPs among them are final except
+        # for sweeps by later candles: they are checkpointed and the next tick only goes through the candles after
+        series = (self.a1.candles_15m, self.a2.candles_15m, self.a3.candles_15m)
+        checkpoint_key = (timeframe, smt.type, prev_candle_range, a1_candles[0][5],
+                          tuple(ql[k][0] for ql in (smt.a1q, smt.a2q, smt.a3q) for k in (3, 4, 5)))
+        checkpoint = self.psp_checkpoints.get(checkpoint_key) if timeframe else None
+        if not checkpoint or any(a is not b for a, b in zip(checkpoint[0], series)) \
+                or checkpoint[1] > len(a1_candles) - 2:
+            # the whole window at once
+            first, first_r, checkpoint_psps = 0, 0, []
+            ohlc, ends, frame = self.psp_rows_frame(
+                (a1_candles, a2_candles, a3_candles), 0, None, current_candle_range_getter, timeframe)
+        else:
+            # only the candles after the checkpoint
+            _, start, checkpoint_psps, min_max = checkpoint
+            first, first_r = start - 1, 1
+            ohlc, ends, frame = self.psp_rows_frame(
+                (a1_candles, a2_candles, a3_candles), start, min_max, current_candle_range_getter, timeframe)
+
+        # row r of ohlc is candle first + r
+        levels = tuple(ql[3][0] if smt.type == 'high' else ql[5][0] if smt.type == 'low' else ql[4][0]
+                       for ql in (smt.a1q, smt.a2q, smt.a3q))
+        psp_idxs, next_confirms, swept_by = psp_kernel(
+            frame, smt.type, levels,
+            lambda: self.prev_psp_candles(tc.format(prev_candle_range[0]), tc.format(prev_candle_range[1]))
+        )
+
+        def swept_from_to(swept_r: int) -> Optional[Tuple[str, str]]:
+            return None if swept_r < 0 else (a1_candles[first + swept_r][5], tc.format(min(ends[swept_r], snap_end)))
+
+        # (psp, its row, row of the candle that swept it or -1), checkpointed PSPs are swept by the candles after
+        rows = [(psp, 0, -1) for psp in checkpoint_psps]
+        unswept = [j for j, psp in enumerate(checkpoint_psps) if not psp.swept_from_to]
+        if unswept and smt.type in ['high', 'half_high', 'low', 'half_low']:
+            d, k, sign = (0, 1, 1) if smt.type in ['high', 'half_high'] else (1, 2, -1)
+            psp_ups = np.array([[c[k] * sign for c in (checkpoint_psps[j].a1_candle, checkpoint_psps[j].a2_candle,
+                                                       checkpoint_psps[j].a3_candle)] for j in unswept])
+            for j, swept_r in zip(unswept, psps_swept_by(frame[1][d], psp_ups, np.zeros(len(unswept), dtype=int))):
+                if swept_r >= 0:
+                    psp = checkpoint_psps[j]
+                    rows[j] = (PSP(psp.a1_candle, psp.a2_candle, psp.a3_candle, psp.confirmed, psp.closed,
+                                   swept_from_to(int(swept_r))), 0, int(swept_r))
+        for r, confirms, swept_r in zip(psp_idxs.tolist(), next_confirms.tolist(), swept_by.tolist()):
+            rows.append((PSP(
+                a1_candle=a1_candles[first + r],
+                a2_candle=a2_candles[first + r],
+                a3_candle=a3_candles[first + r],
+                confirmed=confirms and ends[r + 1] < snapshot_t,  # the next candle ended and didn't sweep it
+                closed=ends[r] <= snap_end,
+                swept_from_to=swept_from_to(swept_r)
+            ), r, swept_r))
+        psps = [psp for psp, _, _ in rows]
+
+        last_r = last_closed - first
+        if timeframe and last_r >= first_r:
+            lows, highs = ohlc[:, :last_r + 1, 2].min(axis=1).tolist(), ohlc[:, :last_r + 1, 1].max(axis=1).tolist()
+            self.save_psp_checkpoint(checkpoint_key, (
+                series, last_closed + 1,
+                [psp if swept_r <= last_r else PSP(psp.a1_candle, psp.a2_candle, psp.a3_candle, psp.confirmed,
+                                                    psp.closed, None)
+                 for psp, r, swept_r in rows if r <= last_r],
+                (lows[0], highs[0], lows[1], highs[1], lows[2], highs[2])
+            ))
 
         _psps_calculation_took = time.perf_counter() - _psps_calculation_time
         # if _psps_calculation_took > 0.02:
@@ -505,75 +662,96 @@ class Triad:
 
         return psps
 
+    def save_psp_checkpoint(self, key: tuple, checkpoint: tuple):  # series, next candle idx, psps, min/max values
+        if key not in self.psp_checkpoints and len(self.psp_checkpoints) >= MAX_CACHED_SCANS:
+            del self.psp_checkpoints[next(iter(self.psp_checkpoints))]
+        self.psp_checkpoints[key] = checkpoint
+
     def with_15m_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with 15m PSPs
+        tc = time_core()
         smt.psps_15m = self.calculate_psps(
-            (to_utc_datetime(next_tick) - timedelta(minutes=15), to_utc_datetime(next_tick)),
-            lambda x: (to_utc_datetime(x), to_utc_datetime(x) + timedelta(minutes=14)),
+            (tc.parse(next_tick) - tc.minutes(15), tc.parse(next_tick)),
+            lambda x: (x, x + tc.minutes(14)),
             lambda candles: candles,
-            smt
+            smt,
+            '15m'
         )
         return smt
 
     def with_30m_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with 30m PSPs
+        tc = time_core()
         smt.psps_30m = self.calculate_psps(
-            get_prev_30m_from_to(next_tick),
-            get_current_30m_from_to,
+            tc.get_prev_30m_from_to(tc.parse(next_tick)),
+            tc.get_current_30m_from_to,
             as_30m_candles,
-            smt
+            smt,
+            '30m'
         )
         return smt
 
     def with_1h_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with 1h PSPs
+        tc = time_core()
         smt.psps_1h = self.calculate_psps(
-            get_prev_1h_from_to(next_tick),
-            get_current_1h_from_to,
+            tc.get_prev_1h_from_to(tc.parse(next_tick)),
+            tc.get_current_1h_from_to,
             as_1h_candles,
-            smt
+            smt,
+            '1h'
         )
         return smt
 
     def with_2h_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with 2h PSPs
+        tc = time_core()
         smt.psps_2h = self.calculate_psps(
-            get_prev_2h_from_to(next_tick),
-            get_current_2h_from_to,
+            tc.get_prev_2h_from_to(tc.parse(next_tick)),
+            tc.get_current_2h_from_to,
             as_2h_candles,
-            smt
+            smt,
+            '2h'
         )
         return smt
 
     def with_4h_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with 4h PSPs
+        tc = time_core()
         smt.psps_4h = self.calculate_psps(
-            get_prev_4h_from_to(next_tick),
-            get_current_4h_from_to,
+            tc.get_prev_4h_from_to(tc.parse(next_tick)),
+            tc.get_current_4h_from_to,
             as_4h_candles,
-            smt
+            smt,
+            '4h'
         )
         return smt
 
     def with_day_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with day PSPs
+        tc = time_core()
         smt.psps_1d = self.calculate_psps(
-            get_prev_1d_from_to(next_tick),
-            get_current_1d_from_to,
+            tc.get_prev_1d_from_to(tc.parse(next_tick)),
+            tc.get_current_1d_from_to,
             as_1d_candles,
-            smt
+            smt,
+            '1d'
         )
         return smt
 
     def with_week_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with week PSPs
+        tc = time_core()
         smt.psps_1_week = self.calculate_psps(
-            get_prev_1w_from_to(next_tick),
-            get_current_1w_from_to,
+            tc.get_prev_1w_from_to(tc.parse(next_tick)),
+            tc.get_current_1w_from_to,
             as_1w_candles,
-            smt
+            smt,
+            '1w'
         )
         return smt
 
     def with_month_psps(self, next_tick: str, smt: SMT) -> SMT:  # enriches smt with week PSPs
+        tc = time_core()
         smt.psps_1_month = self.calculate_psps(
-            get_prev_1month_from_to(next_tick),
-            get_current_1month_from_to,
+            tc.get_prev_1month_from_to(tc.parse(next_tick)),
+            tc.get_current_1month_from_to,
             as_1month_candles,
-            smt
+            smt,
+            '1month'
         )
         return smt
 
@@ -582,8 +760,9 @@ class Triad:
         if not self.a1.prev_year:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.prev_year[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.prev_year[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         # _new_smt_time = time.perf_counter()
         high_smt, half_smt, low_smt = self.new_smt(
@@ -614,8 +793,9 @@ class Triad:
         if not self.a1.year_q1:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.year_q1[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.year_q1[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
 
         # _new_smt_time = time.perf_counter()
@@ -646,8 +826,9 @@ class Triad:
         if not self.a1.year_q2:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.year_q2[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.year_q2[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.year_q2, self.a2.year_q2, self.a3.year_q2
@@ -672,8 +853,9 @@ class Triad:
         if not self.a1.year_q3:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.year_q3[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.year_q3[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.year_q3, self.a2.year_q3, self.a3.year_q3
@@ -698,8 +880,9 @@ class Triad:
         if not self.a1.year_q4:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.year_q4[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.year_q4[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.year_q4, self.a2.year_q4, self.a3.year_q4
@@ -724,8 +907,9 @@ class Triad:
         if not self.a1.week1:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.week1[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.week1[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.week1, self.a2.week1, self.a3.week1
@@ -747,8 +931,9 @@ class Triad:
         if not self.a1.week2:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.week2[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.week2[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.week2, self.a2.week2, self.a3.week2
@@ -770,8 +955,9 @@ class Triad:
         if not self.a1.week3:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.week3[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.week3[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.week3, self.a2.week3, self.a3.week3
@@ -793,8 +979,9 @@ class Triad:
         if not self.a1.week4:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.week4[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.week4[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.week4, self.a2.week4, self.a3.week4
@@ -816,8 +1003,9 @@ class Triad:
         if not self.a1.week5:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.week5[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.week5[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.week5, self.a2.week5, self.a3.week5
@@ -838,8 +1026,9 @@ class Triad:
         if not self.a1.mon:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.mon[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.mon[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.mon, self.a2.mon, self.a3.mon
@@ -862,8 +1051,9 @@ class Triad:
         if not self.a1.tue:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.tue[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.tue[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.tue, self.a2.tue, self.a3.tue
@@ -886,8 +1076,9 @@ class Triad:
         if not self.a1.wed:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.wed[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.wed[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.wed, self.a2.wed, self.a3.wed
@@ -910,8 +1101,9 @@ class Triad:
         if not self.a1.thu:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.thu[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.thu[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.thu, self.a2.thu, self.a3.thu
@@ -934,8 +1126,9 @@ class Triad:
         if not self.a1.mon_thu:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.mon_thu[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.mon_thu[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.mon_thu, self.a2.mon_thu, self.a3.mon_thu
@@ -958,8 +1151,9 @@ class Triad:
         if not self.a1.fri:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.fri[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.fri[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.fri, self.a2.fri, self.a3.fri
@@ -982,8 +1176,9 @@ class Triad:
         if not self.a1.mon_fri:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.mon_fri[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.mon_fri[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.mon_fri, self.a2.mon_fri, self.a3.mon_fri
@@ -1006,8 +1201,9 @@ class Triad:
         if not self.a1.sat:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.sat[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.sat[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.sat, self.a2.sat, self.a3.sat
@@ -1031,8 +1227,9 @@ class Triad:
         if not self.a1.asia:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.asia[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.asia[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
 
         _new_smt_time = time.perf_counter()
@@ -1063,8 +1260,9 @@ class Triad:
         if not self.a1.london:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.london[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.london[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.london, self.a2.london, self.a3.london
@@ -1087,8 +1285,9 @@ class Triad:
         if not self.a1.nyam:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.nyam[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.nyam[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.nyam, self.a2.nyam, self.a3.nyam
@@ -1111,8 +1310,9 @@ class Triad:
         if not self.a1.nypm:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.nypm[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.nypm[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.nypm, self.a2.nypm, self.a3.nypm
@@ -1135,8 +1335,9 @@ class Triad:
         if not self.a1.q1_90m:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.q1_90m[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.q1_90m[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.q1_90m, self.a2.q1_90m, self.a3.q1_90m
@@ -1156,8 +1357,9 @@ class Triad:
         if not self.a1.q2_90m:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.q2_90m[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.q2_90m[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.q2_90m, self.a2.q2_90m, self.a3.q2_90m
@@ -1177,8 +1379,9 @@ class Triad:
         if not self.a1.q3_90m:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.q3_90m[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.q3_90m[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.q3_90m, self.a2.q3_90m, self.a3.q3_90m
@@ -1198,8 +1401,9 @@ class Triad:
         if not self.a1.q4_90m:
             return None
 
-        next_tick = to_date_str(to_utc_datetime(self.a1.q4_90m[1]) + timedelta(minutes=1))
-        if to_utc_datetime(self.a1.snapshot_date_readable) <= to_utc_datetime(next_tick):
+        tc = time_core()
+        next_tick = tc.format(tc.parse(self.a1.q4_90m[1]) + tc.minutes(1))
+        if tc.parse(self.a1.snapshot_date_readable) <= tc.parse(next_tick):
             return None
         high_smt, half_smt, low_smt = self.new_smt(
             next_tick, self.a1.q4_90m, self.a2.q4_90m, self.a3.q4_90m
@@ -1314,8 +1518,9 @@ def targets_reached(
     result = []
     if not targets_old:
         return []
+    new_keys = {(x[1], x[2]) for x in targets_new}
     for level, direction, label, ql_start, tp_a1, tp_a2, tp_a3 in targets_old:
-        if not any(f"{direction}_{label}" == f"{x[1]}_{x[2]}" for x in targets_new):
+        if (direction, label) not in new_keys:
             if last_candles[0][2] < tp_a1[0] < last_candles[0][1]:
                 result.append((level, direction, label, ql_start, 0, tp_a1[0]))
             if last_candles[1][2] < tp_a2[0] < last_candles[1][1]:
@@ -1333,8 +1538,9 @@ def targets_new_appeared(
     result = []
     if not targets_new:
         return []
+    old_keys = {(x[1], x[2]) for x in targets_old}
     for level, direction, label, ql_start, tp_a1, tp_a2, tp_a3 in targets_new:
-        if not any(f"{direction}_{label}" == f"{x[1]}_{x[2]}" for x in targets_old):
+        if (direction, label) not in old_keys:
             result.append((level, direction, label, ql_start, tp_a1, tp_a2, tp_a3))
 
     return result
@@ -1453,6 +1659,61 @@ def calc_psp_changed(
     return result
 
 
+PSP_CHANGE_TIMEFRAMES = [
+    ('15m', 'psps_15m'), ('30m', 'psps_30m'), ('1h', 'psps_1h'), ('2h', 'psps_2h'), ('4h', 'psps_4h'), ('1d', 'psps_1d'),
+    ('1_week', 'psps_1_week')
+]  # psp_key, SMT field
+
+
+def smt_psp_changes(
+        symbols: Tuple[str, str, str],
+        l_old: List[Tuple[int, str, Optional[SMTLevels]]],
+        l_new: List[Tuple[int, str, Optional[SMTLevels]]],
+) -> SMTPSPChanges:
+    # new_smt_found, smt_dict_old_smt_cancelled and calc_psp_changed in one pass: actual_smt_psp lists its levels
+    # in the same order every tick, so old and new are paired by position and keyed by label only if they aren't
+    new_smts, cancelled_smts, psp_changes = [], [], []
+
+    old_by_position = len(l_old) == len(l_new) and all(o[:2] == n[:2] for o, n in zip(l_old, l_new))
+    d_old = None if old_by_position else {(level, label): smt_tuple for level, label, smt_tuple in l_old}
+    d_new = None if old_by_position else {(level, label): smt_tuple for level, label, smt_tuple in l_new}
+
+    for level, label, smt_tuple_old in l_old:
+        if smt_tuple_old and not old_by_position and not d_new.get((level, label)):
+            cancelled_smts.extend((level, label, smt) for smt in smt_tuple_old if smt)
+
+    for i, (level, label, smt_tuple_new) in enumerate(l_new):
+        smt_tuple_old = l_old[i][2] if old_by_position else d_old.get((level, label))
+        if not smt_tuple_old:
+            if smt_tuple_new:
+                new_smts.extend((level, label, smt) for smt in smt_tuple_new if smt)
+            continue
+        if not smt_tuple_new:
+            if old_by_position:
+                cancelled_smts.extend((level, label, smt) for smt in smt_tuple_old if smt)
+            continue
+
+        for smt_new, smt_old in zip(smt_tuple_new, smt_tuple_old):
+            if smt_new and not smt_old:
+                new_smts.append((level, label, smt_new))
+            elif smt_old and not smt_new:
+                cancelled_smts.append((level, label, smt_old))
+            elif smt_new and smt_old:
+                smt_flags = None
+                for psp_key, field in PSP_CHANGE_TIMEFRAMES:
+                    changes = psps_changed(getattr(smt_old, field), getattr(smt_new, field))
+                    if changes and smt_flags is None:
+                        smt_flags = to_smt_flags(symbols, smt_new)
+                    psp_changes.extend((
+                        level, label, smt_new.type, smt_flags, smt_new.first_appeared, psp_key, psp_date, change
+                    ) for psp_date, change in changes)
+
+    if not old_by_position:  # cancels are listed in l_old order, like smt_dict_old_smt_cancelled does
+        order = {(level, label): i for i, (level, label, _) in enumerate(l_old)}
+        cancelled_smts.sort(key=lambda x: order[x[:2]])
+    return new_smts, cancelled_smts, psp_changes
+
+
 def psps_changed(
         psps_old: Optional[List[PSP]], psps_new: Optional[List[PSP]]
 ) -> List[Tuple[str, str]]:  # psp_date, possible|closed|confirmed|swept
@@ -1669,11 +1930,24 @@ def new_triad(symbols_tuple: Tuple[str, str, str],
     return res
 
 
+def new_triad_from_history(symbols_tuple: Tuple[str, str, str],
+                           histories_tuple: Tuple[List[InnerCandle], List[InnerCandle], List[InnerCandle]]) -> Triad:
+    # same as new_triad with the reversed histories, without walking them back candle by candle
+    res = new_empty_triad(*symbols_tuple)
+
+    res.a1.populate_from_history(histories_tuple[0])
+    res.a2.populate_from_history(histories_tuple[1])
+    res.a3.populate_from_history(histories_tuple[2])
+
+    return res
+
+
 def triad_decoder(dct):
     if "a1" in dct:
         return Triad(**dct)
     if "snapshot_date_readable" in dct:
-        return Asset(**dct)
+        return asset_from_dict(dct)
+    return dct
 
 
 def triad_from_json(json_str):
@@ -1681,4 +1955,85 @@ def triad_from_json(json_str):
 
 
 def json_from_triad(triad: Triad):
-    return json.dumps(asdict(triad), indent=2)
+    return json.dumps({"a1": dict_from_asset(triad.a1), "a2": dict_from_asset(triad.a2),
+                       "a3": dict_from_asset(triad.a3)}, indent=2)
+
+
+def checkpoint_from_triad(triad: Triad) -> bytes:
+    # npz: float64 ohlcv columns and int64 epochs of the candle buffers, plus the rest of the assets as a json header
+    header, arrays = {"version": TRIAD_CHECKPOINT_VERSION}, {}
+    for name, asset in (("a1", triad.a1), ("a2", triad.a2), ("a3", triad.a3)):
+        header[name] = dict_from_asset(asset, with_candles=False)
+        for field in ASSET_CANDLE_FIELDS:
+            series = getattr(asset, field)
+            arrays[f"{name}.{field}.columns"], arrays[f"{name}.{field}.epochs"] = series.columns, series.epochs
+    arrays["header"] = np.frombuffer(json.dumps(header).encode(), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def triad_from_checkpoint(checkpoint: bytes) -> Triad:
+    with np.load(io.BytesIO(checkpoint), allow_pickle=False) as arrays:
+        header = json.loads(arrays["header"].tobytes())
+        if header["version"] != TRIAD_CHECKPOINT_VERSION:
+            raise ValueError(f"unsupported triad checkpoint version {header['version']}")
+        assets = []
+        for name in ("a1", "a2", "a3"):
+            for field in ASSET_CANDLE_FIELDS:
+                header[name][field] = candle_series_from_columns(
+                    arrays[f"{name}.{field}.columns"], arrays[f"{name}.{field}.epochs"])
+            assets.append(asset_from_dict(header[name]))
+    return Triad(*assets)
+
+
+def triad_checkpoint_path(symbols: Tuple[str, str, str], name: str) -> str:
+    file_name = f"triad_v{TRIAD_CHECKPOINT_VERSION}_{'-'.join(symbols)}_{name}.npz".replace(" ", "_").replace(":", "")
+    return os.path.join(TRIAD_CHECKPOINT_FOLDER, file_name)
+
+
+def save_triad_checkpoint(triad: Triad, path: str):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(checkpoint_from_triad(triad))
+        os.replace(tmp_path, path)  # atomic, a crash mid-write leaves the previous checkpoint
+    except OSError as e:
+        log_warn_ny(f"triad checkpoint is not saved to {path}: {e}")
+
+
+def load_triad_checkpoint(path: str, symbols: Tuple[str, str, str]) -> Optional[Triad]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            triad = triad_from_checkpoint(f.read())
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:  # truncated/corrupt npz as well
+        log_warn_ny(f"triad checkpoint {path} is not loaded: {e}")
+        return None
+    if (triad.a1.symbol, triad.a2.symbol, triad.a3.symbol) != tuple(symbols):
+        log_warn_ny(f"triad checkpoint {path} is for other symbols")
+        return None
+    return triad
+
+
+def catch_up_triad(triad: Triad, candles: Tuple[List[InnerCandle], List[InnerCandle], List[InnerCandle]]) -> bool:
+    # plus_15m of the candles after the triad's snapshot, False (and the triad untouched) if they don't continue it
+    if len(candles[0]) == 0:
+        return True
+    if len(candles[1]) != len(candles[0]) or len(candles[2]) != len(candles[0]):
+        return False
+    tc = time_core()
+    expected_t = tc.parse(triad.a1.snapshot_date_readable)
+    for c1, c2, c3 in zip(*candles):
+        if not tc.parse(c1[5]) == tc.parse(c2[5]) == tc.parse(c3[5]) == expected_t:
+            return False
+        expected_t += tc.minutes(15)
+
+    for c1, c2, c3 in zip(*candles):
+        triad.a1.plus_15m(c1)
+        triad.a2.plus_15m(c2)
+        triad.a3.plus_15m(c3)
+    return True
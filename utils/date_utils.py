@@ -1,16 +1,23 @@
+import calendar
 import math
+import os
 import time
 from contextlib import contextmanager
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date
+from functools import lru_cache
 import random
-from typing import Tuple, List, TypeAlias, Callable
+from typing import Tuple, List, TypeAlias, Callable, Optional, Dict
 from zoneinfo import ZoneInfo
 
+import numpy as np
+
 from stock_market_research_kit.quarter import YearQuarter, MonthWeek, WeekDay, DayQuarter, Quarter90m
 
 utc_zone = ZoneInfo("UTC")
 ny_zone = ZoneInfo("America/New_York")
 STR_DATE_FMT = "%Y-%m-%d %H:%M"
+EPOCH_TIME_CORE = True  # Asset/Triad keep times as int epoch seconds internally, False for legacy utc datetimes
 
 
 # returns -1 if checked time is past, 0 if same day and +1 if future
@@ -1000,6 +1007,614 @@ def get_current_1month_from_to(date_str: str) -> Tuple[datetime, datetime]:
     return from_, to_
 
 
+# epoch core: same ranges as above but in int epoch seconds (range ends are inclusive, like the datetime ones)
+EpochRange: TypeAlias = Tuple[int, int]
+GetEpochRange: TypeAlias = Callable[[int], EpochRange]
+
+_ORDINAL_1970 = 719163  # date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=1 << 17)
+def to_epoch(date_str: str) -> int:
+    return calendar.timegm((int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]),
+                            int(date_str[11:13]), int(date_str[14:16]), 0))
+
+
+@lru_cache(maxsize=1 << 17)
+def epoch_to_date_str(epoch: int) -> str:
+    return time.strftime(STR_DATE_FMT, time.gmtime(epoch))
+
+
+def epoch_to_utc_datetime(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, utc_zone)
+
+
+@lru_cache(maxsize=None)
+def _ny_offset(epoch_hour: int) -> int:  # NY utc offset in seconds for utc hour since epoch
+    return int(datetime.fromtimestamp(epoch_hour * 3600, utc_zone).astimezone(ny_zone).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=None)
+def _ny_wall_offset(wall_hour: int) -> int:  # same for NY wall clock hour, fold=0 like aware datetime arithmetic
+    wall = datetime.fromtimestamp(wall_hour * 3600, utc_zone).replace(tzinfo=ny_zone)
+    return int(wall.utcoffset().total_seconds())
+
+
+def _ny_wall(epoch: int) -> int:  # NY wall clock seconds since epoch
+    return epoch + _ny_offset(epoch // 3600)
+
+
+def _from_ny_wall(wall: int) -> int:
+    return wall - _ny_wall_offset(wall // 3600)
+
+
+def _month_start_epoch(year: int, month: int) -> int:
+    return calendar.timegm((year + (month - 1) // 12, (month - 1) % 12 + 1, 1, 0, 0, 0))
+
+
+def _week_of_month(wall: int) -> MonthWeek:
+    days = wall // 86400
+    monday = date.fromordinal(days - (days + 3) % 7 + _ORDINAL_1970)
+    return MonthWeek(math.ceil(monday.day / 7))
+
+
+@lru_cache(maxsize=1 << 14)
+def quarters_by_epoch(epoch: int) -> Tuple[YearQuarter, MonthWeek, WeekDay, DayQuarter, Quarter90m]:
+    wall = _ny_wall(epoch)
+    days, seconds = divmod(wall, 86400)
+    hour = seconds // 3600
+    month = date.fromordinal(days + _ORDINAL_1970).month
+
+    yq = [YearQuarter.YQ1, YearQuarter.YQ2, YearQuarter.YQ3, YearQuarter.YQ4][(month - 1) // 3]
+    mw = _week_of_month(wall)
+    wd = WeekDay((days + 3) % 7 + 1)
+
+    dq = [DayQuarter.DQ2_London, DayQuarter.DQ3_NYAM, DayQuarter.DQ4_NYPM, DayQuarter.DQ1_Asia][hour // 6]
+    if dq == DayQuarter.DQ1_Asia:
+        wd = WeekDay((wd.value + 1) % 7 or 7)
+        mw = _week_of_month(wall + 6 * 3600)
+
+    q90m = [Quarter90m.Q1_90m, Quarter90m.Q2_90m, Quarter90m.Q3_90m, Quarter90m.Q4_90m][(seconds % 21600) // 5400]
+
+    return yq, mw, wd, dq, q90m
+
+
+@lru_cache(maxsize=1 << 12)
+def quarters90m_ranges_epoch(epoch: int) -> Tuple[List[Tuple[Quarter90m, int, int]], Optional[int]]:  # ranges, t90mo
+    q90m = quarters_by_epoch(epoch)[4]
+    wall = _ny_wall(epoch)
+    start = wall - (wall % 86400) % 5400
+    u, m90 = _from_ny_wall, 5400
+
+    match q90m:
+        case Quarter90m.Q1_90m:
+            return [
+                (Quarter90m.Q4_90m, u(start - m90), u(start - 1)),
+                (Quarter90m.Q1_90m, u(start), u(start + m90 - 1)),
+            ], None
+        case Quarter90m.Q2_90m:
+            t90mo = u(start)
+            return [
+                (Quarter90m.Q1_90m, u(start - m90), t90mo - 1),
+                (Quarter90m.Q2_90m, t90mo, t90mo + m90 - 1),
+            ], t90mo
+        case Quarter90m.Q3_90m:
+            t90mo = u(start - m90)
+            return [
+                (Quarter90m.Q1_90m, u(start - 2 * m90), u(start - m90 - 1)),
+                (Quarter90m.Q2_90m, t90mo, u(start - 1)),
+                (Quarter90m.Q3_90m, u(start), u(start + m90 - 1)),
+            ], t90mo
+        case Quarter90m.Q4_90m:
+            t90mo = u(start - 2 * m90)
+            return [
+                (Quarter90m.Q1_90m, u(start - 3 * m90), u(start - 2 * m90 - 1)),
+                (Quarter90m.Q2_90m, t90mo, u(start - m90 - 1)),
+                (Quarter90m.Q3_90m, u(start - m90), u(start - 1)),
+                (Quarter90m.Q4_90m, u(start), u(start + m90 - 1)),
+            ], t90mo
+
+
+@lru_cache(maxsize=1 << 12)
+def day_quarters_ranges_epoch(epoch: int) -> Tuple[List[Tuple[DayQuarter, int, int]], Optional[int]]:  # ranges, tdo
+    dq = quarters_by_epoch(epoch)[3]
+    wall = _ny_wall(epoch)
+    start = wall - wall % 21600
+    u, h6 = _from_ny_wall, 21600
+
+    match dq:
+        case DayQuarter.DQ1_Asia:
+            return [
+                (DayQuarter.DQ4_NYPM, u(start - h6), u(start - 1)),
+                (DayQuarter.DQ1_Asia, u(start), u(start + h6 - 1)),
+            ], None
+        case DayQuarter.DQ2_London:
+            tdo = u(start)
+            return [
+                (DayQuarter.DQ1_Asia, u(start - h6), tdo - 1),
+                (DayQuarter.DQ2_London, tdo, tdo + h6 - 1),
+            ], tdo
+        case DayQuarter.DQ3_NYAM:
+            tdo = u(start - h6)
+            return [
+                (DayQuarter.DQ1_Asia, u(start - 2 * h6), u(start - h6 - 1)),
+                (DayQuarter.DQ2_London, tdo, u(start - 1)),
+                (DayQuarter.DQ3_NYAM, u(start), u(start + h6 - 1)),
+            ], tdo
+        case DayQuarter.DQ4_NYPM:
+            tdo = u(start - 2 * h6)
+            return [
+                (DayQuarter.DQ1_Asia, u(start - 3 * h6), u(start - 2 * h6 - 1)),
+                (DayQuarter.DQ2_London, tdo, u(start - h6 - 1)),
+                (DayQuarter.DQ3_NYAM, u(start - h6), u(start - 1)),
+                (DayQuarter.DQ4_NYPM, u(start), u(start + h6 - 1)),
+            ], tdo
+
+
+@lru_cache(maxsize=1 << 12)
+def weekday_ranges_epoch(epoch: int) -> Tuple[List[Tuple[WeekDay, int, int]], Optional[int]]:  # ranges, two
+    _, _, wd, dq, _ = quarters_by_epoch(epoch)
+    wall = _ny_wall(epoch)
+    start = wall - wall % 86400 - 21600
+    if dq == DayQuarter.DQ1_Asia:
+        start = wall - wall % 21600
+    u, d = _from_ny_wall, 86400
+
+    match wd:
+        case WeekDay.Mon:
+            return [
+                (WeekDay.Thu, u(start - 4 * d), u(start - 3 * d - 1)),
+                (WeekDay.Fri, u(start - 3 * d), u(start - 2 * d - 1)),
+                (WeekDay.Mon, u(start), u(start + d - 1)),
+            ], None
+        case WeekDay.Tue:
+            return [
+                (WeekDay.Mon, u(start - d), u(start - 1)),
+                (WeekDay.Tue, u(start), u(start + d - 1)),
+            ], u(start)
+        case WeekDay.Wed:
+            return [
+                (WeekDay.Mon, u(start - 2 * d), u(start - d - 1)),
+                (WeekDay.Tue, u(start - d), u(start - 1)),
+                (WeekDay.Wed, u(start), u(start + d - 1)),
+            ], u(start - d)
+        case WeekDay.Thu:
+            return [
+                (WeekDay.Mon, u(start - 3 * d), u(start - 2 * d - 1)),
+                (WeekDay.Tue, u(start - 2 * d), u(start - d - 1)),
+                (WeekDay.Wed, u(start - d), u(start - 1)),
+                (WeekDay.Thu, u(start), u(start + d - 1)),
+            ], u(start - 2 * d)
+        case WeekDay.Fri:
+            return [
+                (WeekDay.Mon, u(start - 4 * d), u(start - 3 * d - 1)),
+                (WeekDay.Tue, u(start - 3 * d), u(start - 2 * d - 1)),
+                (WeekDay.Wed, u(start - 2 * d), u(start - d - 1)),
+                (WeekDay.Thu, u(start - d), u(start - 1)),
+                (WeekDay.MonThu, u(start - 4 * d), u(start - 1)),
+                (WeekDay.Fri, u(start), u(start + d - 1)),
+            ], u(start - 3 * d)
+        case WeekDay.Sat:
+            return [
+                (WeekDay.MonThu, u(start - 5 * d), u(start - d - 1)),
+                (WeekDay.Fri, u(start - d), u(start - 1)),
+                (WeekDay.MonFri, u(start - 5 * d), u(start - 1)),
+                (WeekDay.Sat, u(start), u(start + d - 1)),
+            ], u(start - 4 * d)
+        case WeekDay.Sun:
+            return [
+                (WeekDay.MonThu, u(start - 6 * d), u(start - 2 * d - 1)),
+                (WeekDay.Fri, u(start - 2 * d), u(start - d - 1)),
+                (WeekDay.MonFri, u(start - 6 * d), u(start - d - 1)),
+                (WeekDay.Sat, u(start - d), u(start - 1)),
+                (WeekDay.Sun, u(start), u(start + d - 1)),
+            ], u(start - 5 * d)
+
+
+@lru_cache(maxsize=1 << 12)
+def month_week_quarters_ranges_epoch(epoch: int) -> Tuple[List[Tuple[MonthWeek, int, int]], Optional[int]]:  # tmo
+    mw = quarters_by_epoch(epoch)[1]
+    wall = _ny_wall(epoch)
+    days = wall // 86400
+    start = (days - (days + 3) % 7) * 86400 - 21600
+    u, w = _from_ny_wall, 7 * 86400
+
+    match mw:
+        case MonthWeek.MW1:
+            res = [(MonthWeek.MW4, u(start - w), u(start - 1))]
+            if quarters_by_epoch(u(start - w))[1] == MonthWeek.MW5:
+                res = [
+                    (MonthWeek.MW4, u(start - 2 * w), u(start - w - 1)),
+                    (MonthWeek.MW5, u(start - w), u(start - 1)),
+                ]
+            return res + [(MonthWeek.MW1, u(start), u(start + w - 1))], None
+        case MonthWeek.MW2:
+            return [
+                (MonthWeek.MW1, u(start - w), u(start - 1)),
+                (MonthWeek.MW2, u(start), u(start + w - 1)),
+            ], u(start)
+        case MonthWeek.MW3:
+            return [
+                (MonthWeek.MW1, u(start - 2 * w), u(start - w - 1)),
+                (MonthWeek.MW2, u(start - w), u(start - 1)),
+                (MonthWeek.MW3, u(start), u(start + w - 1)),
+            ], u(start - w)
+        case MonthWeek.MW4:
+            return [
+                (MonthWeek.MW1, u(start - 3 * w), u(start - 2 * w - 1)),
+                (MonthWeek.MW2, u(start - 2 * w), u(start - w - 1)),
+                (MonthWeek.MW3, u(start - w), u(start - 1)),
+                (MonthWeek.MW4, u(start), u(start + w - 1)),
+            ], u(start - 2 * w)
+        case MonthWeek.MW5:
+            return [
+                (MonthWeek.MW4, u(start - w), u(start - 1)),
+                (MonthWeek.MW5, u(start), u(start + w - 1)),
+            ], u(start - 3 * w)
+
+
+@lru_cache(maxsize=1 << 12)
+def year_quarters_ranges_epoch(epoch: int) -> Tuple[List[Tuple[YearQuarter, int, int]], Optional[int]]:  # tyo
+    yq = quarters_by_epoch(epoch)[0]
+    year = time.gmtime(epoch).tm_year
+    ms = _month_start_epoch
+
+    match yq:
+        case YearQuarter.YQ1:
+            return [
+                (YearQuarter.YQ4, ms(year - 1, 10), ms(year, 1) - 1),
+                (YearQuarter.YQ1, ms(year, 1), ms(year, 4) - 1),
+            ], None
+        case YearQuarter.YQ2:
+            return [
+                (YearQuarter.YQ1, ms(year, 1), ms(year, 4) - 1),
+                (YearQuarter.YQ2, ms(year, 4), ms(year, 7) - 1),
+            ], ms(year, 4)
+        case YearQuarter.YQ3:
+            return [
+                (YearQuarter.YQ1, ms(year, 1), ms(year, 4) - 1),
+                (YearQuarter.YQ2, ms(year, 4), ms(year, 7) - 1),
+                (YearQuarter.YQ3, ms(year, 7), ms(year, 10) - 1),
+            ], ms(year, 4)
+        case YearQuarter.YQ4:
+            return [
+                (YearQuarter.YQ1, ms(year, 1), ms(year, 4) - 1),
+                (YearQuarter.YQ2, ms(year, 4), ms(year, 7) - 1),
+                (YearQuarter.YQ3, ms(year, 7), ms(year, 10) - 1),
+                (YearQuarter.YQ4, ms(year, 10), ms(year + 1, 1) - 1),
+            ], ms(year, 4)
+
+
+def prev_year_ranges_epoch(epoch: int) -> EpochRange:
+    year = time.gmtime(epoch).tm_year
+    return _month_start_epoch(year - 1, 1), _month_start_epoch(year, 1) - 1
+
+
+def current_year_ranges_epoch(epoch: int) -> EpochRange:
+    year = time.gmtime(epoch).tm_year
+    return _month_start_epoch(year, 1), _month_start_epoch(year + 1, 1) - 1
+
+
+def _aligned_from_to(epoch: int, length: int, shift: int = 0) -> EpochRange:
+    from_ = epoch - (epoch - shift) % length
+    return from_, from_ + length - 1
+
+
+def get_prev_30m_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch - 1800, 1800)
+
+
+def get_current_30m_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch, 1800)
+
+
+def get_prev_1h_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch - 3600, 3600)
+
+
+def get_current_1h_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch, 3600)
+
+
+def get_prev_2h_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch - 7200, 7200)
+
+
+def get_current_2h_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch, 7200)
+
+
+def get_prev_4h_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch - 14400, 14400)
+
+
+def get_current_4h_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch, 14400)
+
+
+def get_prev_1d_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch - 86400, 86400)
+
+
+def get_current_1d_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch, 86400)
+
+
+def get_prev_1w_from_to_epoch(epoch: int) -> EpochRange:  # 1970-01-05 is the first monday
+    return _aligned_from_to(epoch - 7 * 86400, 7 * 86400, 4 * 86400)
+
+
+def get_current_1w_from_to_epoch(epoch: int) -> EpochRange:
+    return _aligned_from_to(epoch, 7 * 86400, 4 * 86400)
+
+
+def get_prev_1month_from_to_epoch(epoch: int) -> EpochRange:
+    return get_current_1month_from_to_epoch(get_current_1month_from_to_epoch(epoch)[0] - 1)
+
+
+def get_current_1month_from_to_epoch(epoch: int) -> EpochRange:
+    t = time.gmtime(epoch)
+    return _month_start_epoch(t.tm_year, t.tm_mon), _month_start_epoch(t.tm_year, t.tm_mon + 1) - 1
+
+
+# NY session calendar: per utc year table keyed by 15m slot, built once from the *_epoch helpers above and then
+# memory-mapped from CALENDAR_FOLDER. Per slot: enum codes of (yq, mw, wd, dq, q90m) and a row per quarter kind
+# in the rows table, row is (kind, n, codes x6, from x6, to x6, true_open or -1)
+CALENDAR_FOLDER = "./data/calendar/"
+CALENDAR_VERSION = 1
+
+_calendar_enums = (list(YearQuarter), list(MonthWeek), list(WeekDay), list(DayQuarter), list(Quarter90m))
+_calendar_ranges_fns = (year_quarters_ranges_epoch, month_week_quarters_ranges_epoch, weekday_ranges_epoch,
+                        day_quarters_ranges_epoch, quarters90m_ranges_epoch)
+_CAL_MAX_RANGES = 6
+
+
+@dataclass
+class NyCalendar:
+    year: int
+    start: int  # epoch of first slot
+    end: int  # epoch after last slot
+    slots: np.ndarray  # int32 (n_slots, 10), 5 enum codes and 5 row ids
+    rows: np.ndarray  # int64 (n_rows, 20)
+    decoded_slots: Dict[int, Tuple[Tuple[YearQuarter, MonthWeek, WeekDay, DayQuarter, Quarter90m], List[int]]]
+    decoded_rows: Dict[int, Tuple[List[Tuple[any, int, int]], Optional[int]]]
+
+
+def _build_ny_calendar(year: int) -> Tuple[np.ndarray, np.ndarray]:
+    start, end = _month_start_epoch(year, 1), _month_start_epoch(year + 1, 1)
+    slots = np.empty(((end - start) // 900, 10), dtype=np.int32)
+    rows, row_ids = [], {}
+
+    for i in range(len(slots)):
+        epoch = start + i * 900
+        for k, quarter in enumerate(quarters_by_epoch(epoch)):
+            slots[i, k] = _calendar_enums[k].index(quarter)
+
+            ranges, true_open = _calendar_ranges_fns[k](epoch)
+            key = (k, tuple(ranges), true_open)
+            if key not in row_ids:
+                row = [k, len(ranges)] + [-1] * (3 * _CAL_MAX_RANGES) + [-1 if true_open is None else true_open]
+                for j, (q, from_, to) in enumerate(ranges):
+                    row[2 + j] = _calendar_enums[k].index(q)
+                    row[2 + _CAL_MAX_RANGES + j] = from_
+                    row[2 + 2 * _CAL_MAX_RANGES + j] = to
+                row_ids[key] = len(rows)
+                rows.append(row)
+            slots[i, 5 + k] = row_ids[key]
+
+    return slots, np.array(rows, dtype=np.int64)
+
+
+@lru_cache(maxsize=None)
+def ny_calendar(year: int) -> NyCalendar:
+    slots_path = os.path.join(CALENDAR_FOLDER, f"ny_calendar_v{CALENDAR_VERSION}_{year}_slots.npy")
+    rows_path = os.path.join(CALENDAR_FOLDER, f"ny_calendar_v{CALENDAR_VERSION}_{year}_rows.npy")
+
+    if os.path.exists(slots_path) and os.path.exists(rows_path):
+        slots = np.load(slots_path, mmap_mode='r').view(np.ndarray)
+        rows = np.load(rows_path, mmap_mode='r').view(np.ndarray)
+    else:
+        slots, rows = _build_ny_calendar(year)
+        try:
+            os.makedirs(CALENDAR_FOLDER, exist_ok=True)
+            for path, arr in [(slots_path, slots), (rows_path, rows)]:
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, arr)
+                os.replace(tmp_path, path)  # atomic, parallel runs may build the same year
+        except OSError as e:
+            log_warn(f"ny calendar {year} is not saved to {CALENDAR_FOLDER}: {e}")
+
+    return NyCalendar(
+        year=year,
+        start=_month_start_epoch(year, 1),
+        end=_month_start_epoch(year + 1, 1),
+        slots=slots,
+        rows=rows,
+        decoded_slots={},
+        decoded_rows={},
+    )
+
+
+_last_calendar: Optional[NyCalendar] = None
+
+
+def _calendar_slot(epoch: int) -> Tuple[NyCalendar, Tuple[Tuple[YearQuarter, MonthWeek, WeekDay, DayQuarter,
+                                                                Quarter90m], List[int]]]:
+    global _last_calendar
+    cal = _last_calendar
+    if not cal or not cal.start <= epoch < cal.end:
+        cal = _last_calendar = ny_calendar(time.gmtime(epoch).tm_year)
+
+    slot = (epoch - cal.start) // 900
+    if slot not in cal.decoded_slots:
+        codes = cal.slots[slot].tolist()
+        cal.decoded_slots[slot] = tuple(_calendar_enums[k][codes[k]] for k in range(5)), codes[5:]
+    return cal, cal.decoded_slots[slot]
+
+
+def _calendar_ranges(kind: int, epoch: int) -> Tuple[List[Tuple[any, int, int]], Optional[int]]:
+    cal, (_, row_ids) = _calendar_slot(epoch)
+    row_id = row_ids[kind]
+    if row_id not in cal.decoded_rows:
+        row = cal.rows[row_id].tolist()
+        enums, n = _calendar_enums[kind], row[1]
+        cal.decoded_rows[row_id] = [
+            (enums[row[2 + j]], row[2 + _CAL_MAX_RANGES + j], row[2 + 2 * _CAL_MAX_RANGES + j]) for j in range(n)
+        ], None if row[-1] == -1 else row[-1]
+    return cal.decoded_rows[row_id]
+
+
+def ny_quarter_buckets(epochs: np.ndarray, kind: int) -> np.ndarray:
+    # vectorised: id of the (yq, mw, wd, dq, q90m)[kind] quarter holding each epoch, the id changes exactly where
+    # quarters_by_epoch does (it is not monotonic over the repeated hour of a DST fall back)
+    hours, inverse = np.unique(epochs // 3600, return_inverse=True)
+    wall = epochs + np.array([_ny_offset(h) for h in hours.tolist()], dtype=np.int64)[inverse]
+    match kind:
+        case 0:  # NY calendar months, no asia shift
+            return wall.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) // 3
+        case 1:  # weeks from monday, asia belongs to the next day
+            return ((wall + 6 * 3600) // 86400 + 3) // 7
+        case 2:
+            return (wall + 6 * 3600) // 86400
+        case 3:
+            return wall // (6 * 3600)
+        case 4:
+            return wall // (90 * 60)
+    raise ValueError(f"unknown quarter kind {kind}")
+
+
+def calendar_quarters_by_epoch(epoch: int) -> Tuple[YearQuarter, MonthWeek, WeekDay, DayQuarter, Quarter90m]:
+    return _calendar_slot(epoch)[1][0]
+
+
+def calendar_year_quarters_ranges(epoch: int) -> Tuple[List[Tuple[YearQuarter, int, int]], Optional[int]]:
+    return _calendar_ranges(0, epoch)
+
+
+def calendar_month_week_quarters_ranges(epoch: int) -> Tuple[List[Tuple[MonthWeek, int, int]], Optional[int]]:
+    return _calendar_ranges(1, epoch)
+
+
+def calendar_weekday_ranges(epoch: int) -> Tuple[List[Tuple[WeekDay, int, int]], Optional[int]]:
+    return _calendar_ranges(2, epoch)
+
+
+def calendar_day_quarters_ranges(epoch: int) -> Tuple[List[Tuple[DayQuarter, int, int]], Optional[int]]:
+    return _calendar_ranges(3, epoch)
+
+
+def calendar_quarters90m_ranges(epoch: int) -> Tuple[List[Tuple[Quarter90m, int, int]], Optional[int]]:
+    return _calendar_ranges(4, epoch)
+
+
+# Asset and Triad internals go through the time core: they parse candle/quarter dates once into core times, compare
+# and step those, and format back to STR_DATE_FMT only for what is stored or sent (QuarterLiq, PriceDate, json, tg)
+@dataclass(frozen=True)
+class TimeCore:
+    parse: Callable[[str], any]
+    format: Callable[[any], str]
+    minutes: Callable[[int], any]
+    seconds: Callable[[int], any]
+    quarters_by_time: Callable[[any], Tuple[YearQuarter, MonthWeek, WeekDay, DayQuarter, Quarter90m]]
+    quarters90m_ranges: Callable[[any], Tuple[List[Tuple[Quarter90m, any, any]], Optional[any]]]
+    day_quarters_ranges: Callable[[any], Tuple[List[Tuple[DayQuarter, any, any]], Optional[any]]]
+    weekday_ranges: Callable[[any], Tuple[List[Tuple[WeekDay, any, any]], Optional[any]]]
+    month_week_quarters_ranges: Callable[[any], Tuple[List[Tuple[MonthWeek, any, any]], Optional[any]]]
+    year_quarters_ranges: Callable[[any], Tuple[List[Tuple[YearQuarter, any, any]], Optional[any]]]
+    prev_year_ranges: Callable[[any], Tuple[any, any]]
+    current_year_ranges: Callable[[any], Tuple[any, any]]
+    get_prev_30m_from_to: Callable[[any], Tuple[any, any]]
+    get_current_30m_from_to: Callable[[any], Tuple[any, any]]
+    get_prev_1h_from_to: Callable[[any], Tuple[any, any]]
+    get_current_1h_from_to: Callable[[any], Tuple[any, any]]
+    get_prev_2h_from_to: Callable[[any], Tuple[any, any]]
+    get_current_2h_from_to: Callable[[any], Tuple[any, any]]
+    get_prev_4h_from_to: Callable[[any], Tuple[any, any]]
+    get_current_4h_from_to: Callable[[any], Tuple[any, any]]
+    get_prev_1d_from_to: Callable[[any], Tuple[any, any]]
+    get_current_1d_from_to: Callable[[any], Tuple[any, any]]
+    get_prev_1w_from_to: Callable[[any], Tuple[any, any]]
+    get_current_1w_from_to: Callable[[any], Tuple[any, any]]
+    get_prev_1month_from_to: Callable[[any], Tuple[any, any]]
+    get_current_1month_from_to: Callable[[any], Tuple[any, any]]
+
+
+def _with_str_input(fn):  # str based helper -> utc datetime based
+    return lambda date: fn(to_date_str(date))
+
+
+def _with_str_input_and_open(fn):  # same, and "" true open -> None
+    def wrapper(date: datetime):
+        ranges, true_open = fn(to_date_str(date))
+        return ranges, to_utc_datetime(true_open) if true_open else None
+
+    return wrapper
+
+
+datetime_time_core = TimeCore(
+    parse=to_utc_datetime,
+    format=to_date_str,
+    minutes=lambda n: timedelta(minutes=n),
+    seconds=lambda n: timedelta(seconds=n),
+    quarters_by_time=_with_str_input(quarters_by_time),
+    quarters90m_ranges=_with_str_input_and_open(quarters90m_ranges),
+    day_quarters_ranges=_with_str_input_and_open(day_quarters_ranges),
+    weekday_ranges=_with_str_input_and_open(weekday_ranges),
+    month_week_quarters_ranges=_with_str_input_and_open(month_week_quarters_ranges),
+    year_quarters_ranges=_with_str_input_and_open(year_quarters_ranges),
+    prev_year_ranges=_with_str_input(prev_year_ranges),
+    current_year_ranges=_with_str_input(current_year_ranges),
+    get_prev_30m_from_to=_with_str_input(get_prev_30m_from_to),
+    get_current_30m_from_to=_with_str_input(get_current_30m_from_to),
+    get_prev_1h_from_to=_with_str_input(get_prev_1h_from_to),
+    get_current_1h_from_to=_with_str_input(get_current_1h_from_to),
+    get_prev_2h_from_to=_with_str_input(get_prev_2h_from_to),
+    get_current_2h_from_to=_with_str_input(get_current_2h_from_to),
+    get_prev_4h_from_to=_with_str_input(get_prev_4h_from_to),
+    get_current_4h_from_to=_with_str_input(get_current_4h_from_to),
+    get_prev_1d_from_to=_with_str_input(get_prev_1d_from_to),
+    get_current_1d_from_to=_with_str_input(get_current_1d_from_to),
+    get_prev_1w_from_to=_with_str_input(get_prev_1w_from_to),
+    get_current_1w_from_to=_with_str_input(get_current_1w_from_to),
+    get_prev_1month_from_to=_with_str_input(get_prev_1month_from_to),
+    get_current_1month_from_to=_with_str_input(get_current_1month_from_to),
+)
+
+epoch_time_core = TimeCore(
+    parse=to_epoch,
+    format=epoch_to_date_str,
+    minutes=lambda n: n * 60,
+    seconds=lambda n: n,
+    quarters_by_time=calendar_quarters_by_epoch,
+    quarters90m_ranges=calendar_quarters90m_ranges,
+    day_quarters_ranges=calendar_day_quarters_ranges,
+    weekday_ranges=calendar_weekday_ranges,
+    month_week_quarters_ranges=calendar_month_week_quarters_ranges,
+    year_quarters_ranges=calendar_year_quarters_ranges,
+    prev_year_ranges=prev_year_ranges_epoch,
+    current_year_ranges=current_year_ranges_epoch,
+    get_prev_30m_from_to=get_prev_30m_from_to_epoch,
+    get_current_30m_from_to=get_current_30m_from_to_epoch,
+    get_prev_1h_from_to=get_prev_1h_from_to_epoch,
+    get_current_1h_from_to=get_current_1h_from_to_epoch,
+    get_prev_2h_from_to=get_prev_2h_from_to_epoch,
+    get_current_2h_from_to=get_current_2h_from_to_epoch,
+    get_prev_4h_from_to=get_prev_4h_from_to_epoch,
+    get_current_4h_from_to=get_current_4h_from_to_epoch,
+    get_prev_1d_from_to=get_prev_1d_from_to_epoch,
+    get_current_1d_from_to=get_current_1d_from_to_epoch,
+    get_prev_1w_from_to=get_prev_1w_from_to_epoch,
+    get_current_1w_from_to=get_current_1w_from_to_epoch,
+    get_prev_1month_from_to=get_prev_1month_from_to_epoch,
+    get_current_1month_from_to=get_current_1month_from_to_epoch,
+)
+
+
+def time_core() -> TimeCore:
+    return epoch_time_core if EPOCH_TIME_CORE else datetime_time_core
+
+
 def years_between(start: str, end: str) -> List[Tuple[int, str, str]]:
     start_dt = to_utc_datetime(start)
     end_dt = to_utc_datetime(end)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from utils import date_utils
+from utils.date_utils import to_utc_datetime, to_date_str, to_epoch, epoch_to_date_str, quarters_by_time, \
+    quarters_by_epoch, quarters90m_ranges, quarters90m_ranges_epoch, day_quarters_ranges, day_quarters_ranges_epoch, \
+    weekday_ranges, weekday_ranges_epoch, month_week_quarters_ranges, month_week_quarters_ranges_epoch, \
+    year_quarters_ranges, year_quarters_ranges_epoch, prev_year_ranges, prev_year_ranges_epoch, current_year_ranges, \
+    current_year_ranges_epoch, get_prev_1w_from_to, get_prev_1w_from_to_epoch, get_current_1month_from_to, \
+    get_current_1month_from_to_epoch, get_prev_1month_from_to, get_prev_1month_from_to_epoch, get_current_4h_from_to, \
+    get_current_4h_from_to_epoch, ny_calendar, calendar_quarters_by_epoch, calendar_quarters90m_ranges, \
+    calendar_day_quarters_ranges, calendar_weekday_ranges, calendar_month_week_quarters_ranges, \
+    calendar_year_quarters_ranges
+
+# windows around NY DST switches, month/year rollovers and a 5-week month
+test_windows = [
+    ("2024-03-07 00:00", "2024-03-12 00:00"),
+    ("2024-10-30 00:00", "2024-11-05 00:00"),
+    ("2024-12-29 00:00", "2025-01-03 00:00"),
+    ("2025-03-27 00:00", "2025-04-03 00:00"),
+    ("2025-11-01 00:00", "2025-11-04 00:00"),
+]
+
+
+def _slots(from_: str, to: str):
+    date = to_utc_datetime(from_)
+    while date < to_utc_datetime(to):
+        yield to_date_str(date)
+        date += timedelta(minutes=15)
+
+
+def _as_epoch_ranges(ranges):
+    return [(q, int(f.timestamp()), int(t.timestamp())) for q, f, t in ranges]
+
+
+def test_epoch_time_core_matches_datetime_one():
+    for from_, to in test_windows:
+        for date_str in _slots(from_, to):
+            epoch = to_epoch(date_str)
+            assert epoch_to_date_str(epoch) == date_str
+            assert quarters_by_epoch(epoch) == quarters_by_time(date_str), date_str
+
+            for fn, fn_epoch in [
+                (quarters90m_ranges, quarters90m_ranges_epoch),
+                (day_quarters_ranges, day_quarters_ranges_epoch),
+                (weekday_ranges, weekday_ranges_epoch),
+                (month_week_quarters_ranges, month_week_quarters_ranges_epoch),
+                (year_quarters_ranges, year_quarters_ranges_epoch),
+            ]:
+                ranges, true_open = fn(date_str)
+                ranges_epoch, true_open_epoch = fn_epoch(epoch)
+                assert _as_epoch_ranges(ranges) == ranges_epoch, (fn.__name__, date_str)
+                assert true_open == ("" if true_open_epoch is None else epoch_to_date_str(true_open_epoch))
+
+            for fn, fn_epoch in [
+                (prev_year_ranges, prev_year_ranges_epoch),
+                (current_year_ranges, current_year_ranges_epoch),
+                (get_current_4h_from_to, get_current_4h_from_to_epoch),
+                (get_prev_1w_from_to, get_prev_1w_from_to_epoch),
+                (get_current_1month_from_to, get_current_1month_from_to_epoch),
+                (get_prev_1month_from_to, get_prev_1month_from_to_epoch),
+            ]:
+                from_date, to_date = fn(date_str)
+                assert (int(from_date.timestamp()), int(to_date.timestamp())) == fn_epoch(epoch), (fn.__name__, date_str)
+
+
+def test_ny_calendar_matches_datetime_functions(tmp_path, monkeypatch):
+    monkeypatch.setattr(date_utils, "CALENDAR_FOLDER", str(tmp_path))
+    for reload in [False, True]:  # built, then memory-mapped from CALENDAR_FOLDER
+        ny_calendar.cache_clear()
+        monkeypatch.setattr(date_utils, "_last_calendar", None)
+        for from_, to in test_windows:
+            for date_str in _slots(from_, to):
+                epoch = to_epoch(date_str)
+                assert calendar_quarters_by_epoch(epoch) == quarters_by_time(date_str), date_str
+
+                for fn, fn_calendar in [
+                    (quarters90m_ranges, calendar_quarters90m_ranges),
+                    (day_quarters_ranges, calendar_day_quarters_ranges),
+                    (weekday_ranges, calendar_weekday_ranges),
+                    (month_week_quarters_ranges, calendar_month_week_quarters_ranges),
+                    (year_quarters_ranges, calendar_year_quarters_ranges),
+                ]:
+                    ranges, true_open = fn(date_str)
+                    ranges_calendar, true_open_calendar = fn_calendar(epoch)
+                    assert _as_epoch_ranges(ranges) == ranges_calendar, (fn.__name__, date_str)
+                    assert true_open == ("" if true_open_calendar is None else epoch_to_date_str(true_open_calendar))
+    ny_calendar.cache_clear()